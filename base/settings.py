@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Dependencies
     'fontawesomefree',
@@ -144,6 +145,15 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
 
+# collectstatic builds the bundles, hashes the names of the files and writes their gzip and brotli variants, the web
+# server can then serve STATIC_ROOT with far-future cache headers
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'nifleur.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -157,3 +167,19 @@ LOGOUT_REDIRECT_URL = "login/"
 
 # Phone number field
 PHONENUMBER_DEFAULT_REGION = 'FR'
+
+# Avatars: the sidebar of base_site.html renders 55px avatars on every page. Their thumbnail is created at upload with
+# the default size and the rendered tags are cached for each size listed here. A change of avatar only invalidates the
+# cache of the process which saved it, so the others keep the tags for a minute at most while the cache is local.
+AVATAR_AUTO_GENERATE_SIZES = (80, 55)
+AVATAR_CACHE_TIMEOUT = 60
+
+# Uploaded files waiting for the run_import_worker command
+IMPORT_SPOOL_DIR = os.getenv('IMPORT_SPOOL_DIR', os.path.join(BASE_DIR, 'imports'))
+
+# The import files are streamed to IMPORT_SPOOL_DIR with the limits of their field, see nifleur.uploads
+FILE_UPLOAD_HANDLERS = [
+    'nifleur.uploads.ImportUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
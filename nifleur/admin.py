@@ -1,72 +1,260 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
 
+from nifleur.merge import merge_companies, merge_speakers
 from nifleur.models import School, CompanyType, Company, Speaker, Performance, RateType, SchoolYear, \
-    Discipline, Status, Unit, RecruitmentType, ContractRequest
+    Discipline, Status, Unit, RecruitmentType, ContractRequest, LegalStructure, ContractStatusEvent, StatusTransition, \
+    ImportJob, ImportRun
+from nifleur.workflow import ACTIONS, Transition, bulk_transition, create_position_transitions, get_workflow, \
+    record_transitions
+
+# Under this number of rows, tables are counted exactly
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Paginator using the planner estimation of the table size instead of a COUNT(*) when the list is not filtered """
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [query.model._meta.db_table])
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """ Admin of the tables which can contain a lot of rows: no full count and an estimated count when not filtered """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
     list_display = ('label', 'full_name')
+    search_fields = ('label', 'full_name')
 
 
 @admin.register(CompanyType)
 class CompanyTypeAdmin(admin.ModelAdmin):
     list_display = ('label',)
+    search_fields = ('label',)
 
 
 @admin.register(Company)
-class CompanyAdmin(admin.ModelAdmin):
+class CompanyAdmin(LargeTableAdmin):
     list_display = ('label', 'company_type', 'relation_mail', 'relation_phone_number')
+    list_select_related = ('company_type',)
+    list_filter = ('company_type',)
+    search_fields = ('label', 'relation_mail')
+    autocomplete_fields = ('company_type',)
+    actions = ['merge']
+
+    @admin.action(description="Fusionner les sociétés sélectionnées dans la plus ancienne")
+    def merge(self, request, queryset):
+        companies = list(queryset.order_by('id'))
+        if len(companies) < 2:
+            self.message_user(request, "Sélectionnez au moins deux sociétés", messages.ERROR)
+            return
+        total = merge_companies(companies[0], companies[1:])
+        self.message_user(request, f"{total} sociétés ont été fusionnées dans {companies[0]}", messages.SUCCESS)
 
 
 @admin.register(Speaker)
-class SpeakerAdmin(admin.ModelAdmin):
+class SpeakerAdmin(LargeTableAdmin):
     list_display = (
         'first_name', 'last_name', 'civility', 'company', 'mail', 'phone_number', 'highest_degree',
         'main_area_of_expertise', 'second_area_of_expertise', 'third_area_of_expertise',
         'teaching_expertise_level', 'professional_expertise_level'
     )
+    list_select_related = ('company__company_type',)
+    list_filter = ('civility', 'teaching_expertise_level', 'professional_expertise_level')
+    search_fields = ('last_name', 'first_name', 'mail')
+    autocomplete_fields = ('company',)
+    actions = ['merge']
+
+    @admin.action(description="Fusionner les intervenants sélectionnés dans le plus ancien")
+    def merge(self, request, queryset):
+        speakers = list(queryset.order_by('id'))
+        if len(speakers) < 2:
+            self.message_user(request, "Sélectionnez au moins deux intervenants", messages.ERROR)
+            return
+        total = merge_speakers(speakers[0], speakers[1:])
+        self.message_user(request, f"{total} intervenants ont été fusionnés dans {speakers[0]}", messages.SUCCESS)
 
 
 @admin.register(Performance)
 class PerformanceAdmin(admin.ModelAdmin):
     list_display = ('label',)
+    search_fields = ('label',)
 
 
 @admin.register(RateType)
 class RateTypeAdmin(admin.ModelAdmin):
     list_display = ('label',)
+    search_fields = ('label',)
 
 
 @admin.register(SchoolYear)
 class SchoolYearAdmin(admin.ModelAdmin):
     list_display = ('school', 'year', 'label', 'initial', 'alternating')
+    list_select_related = ('school',)
+    list_filter = ('school', 'initial', 'alternating')
+    search_fields = ('year', 'label', 'school__label')
+    autocomplete_fields = ('school',)
 
 
 @admin.register(Discipline)
-class DisciplineAdmin(admin.ModelAdmin):
+class DisciplineAdmin(LargeTableAdmin):
     list_display = ('school_year', 'label', 'speaker')
+    list_select_related = ('school_year__school', 'speaker')
+    list_filter = ('school',)
+    search_fields = ('label', 'school__label', 'school_year__year')
+    autocomplete_fields = ('school', 'school_year', 'speaker')
 
 
 @admin.register(Status)
 class StatusAdmin(admin.ModelAdmin):
     list_display = ('position', 'label', 'color', 'type')
+    search_fields = ('label',)
+    actions = ['create_position_transitions']
+
+    @admin.action(description="Remplacer les transitions par celles données par les positions des statuts")
+    def create_position_transitions(self, request, queryset):
+        total = create_position_transitions()
+        self.message_user(request, f"{total} transitions ont été créées", messages.SUCCESS)
+
+
+@admin.register(StatusTransition)
+class StatusTransitionAdmin(admin.ModelAdmin):
+    list_display = ('from_status', 'action', 'to_status')
+    list_select_related = ('from_status', 'to_status')
+    list_filter = ('action', 'from_status')
+    autocomplete_fields = ('from_status', 'to_status')
 
 
 @admin.register(Unit)
 class UnitAdmin(admin.ModelAdmin):
     list_display = ('label',)
+    search_fields = ('label',)
 
 
 @admin.register(RecruitmentType)
 class RecruitmentTypeAdmin(admin.ModelAdmin):
     list_display = ('label',)
+    search_fields = ('label',)
+
+
+@admin.register(LegalStructure)
+class LegalStructureAdmin(admin.ModelAdmin):
+    list_display = ('label',)
+    search_fields = ('label',)
 
 
 @admin.register(ContractRequest)
-class ContractRequestAdmin(admin.ModelAdmin):
+class ContractRequestAdmin(LargeTableAdmin):
+    """ The status of a contract request only changes through the actions of the workflow, which record its history """
     list_display = (
         'id', 'school', 'speaker', 'created_at', 'comment', 'status', 'performance', 'applied_rate',
         'rate_type', 'ttc', 'hourly_volume', 'unit', 'started_at', 'ended_at', 'discipline', 'school_year',
         'rp', 'recruitment_type'
     )
+    list_select_related = (
+        'school', 'speaker', 'status', 'performance', 'rate_type', 'unit', 'discipline', 'school_year__school', 'rp',
+        'recruitment_type'
+    )
+    list_filter = (
+        'status', 'school', 'period', 'ttc', 'performance', 'recruitment_type',
+        ('rp', admin.RelatedOnlyFieldListFilter)
+    )
+    search_fields = ('speaker__last_name', 'speaker__first_name', 'speaker__mail', 'discipline__label', 'comment')
+    date_hierarchy = 'started_at'
+    autocomplete_fields = (
+        'school', 'legal_structure', 'speaker', 'company', 'status', 'performance', 'rate_type', 'unit',
+        'discipline', 'school_year', 'rp', 'recruitment_type'
+    )
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        return readonly_fields if obj is None else (*readonly_fields, 'status')
+
+    def get_changeform_initial_data(self, request):
+        return {'status': get_workflow().initial_status_id, **super().get_changeform_initial_data(request)}
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            record_transitions([Transition(obj.id, None, obj.status_id)], request.user)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        for action, label in ACTIONS:
+            name = f'status_{action}'
+            actions[name] = (self.status_action(action), name, f"Statut : {label.lower()}")
+        return actions
+
+    @staticmethod
+    def status_action(action):
+        def change_status(modeladmin, request, queryset):
+            transitions = bulk_transition(list(queryset.values_list('id', flat=True)), action, request.user)
+            modeladmin.message_user(request, f"{len(transitions)} contrats ont changé de statut", messages.SUCCESS)
+        return change_status
+
+
+@admin.register(ContractStatusEvent)
+class ContractStatusEventAdmin(LargeTableAdmin):
+    """ The status history is append-only """
+    list_display = ('contract', 'from_status', 'to_status', 'user', 'created_at')
+    list_select_related = ('contract__speaker', 'from_status', 'to_status', 'user')
+    list_filter = ('to_status',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    """ The imports are created by the uploads and updated by the run_import_worker command """
+    list_display = (
+        'name', 'kind', 'status', 'dry_run', 'rows', 'imported', 'error_count', 'user', 'created_at', 'finished_at'
+    )
+    list_select_related = ('user',)
+    list_filter = ('kind', 'status')
+    exclude = ('errors',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ImportRun)
+class ImportRunAdmin(admin.ModelAdmin):
+    """ Deleting the fingerprint of a file allows to import it again without forcing it """
+    list_display = (
+        'name', 'kind', 'sha256', 'rows', 'imported', 'committed', 'errors', 'user', 'created_at', 'finished_at'
+    )
+    list_select_related = ('user',)
+    list_filter = ('kind',)
+    search_fields = ('name', 'sha256')
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,92 @@
+import datetime
+from collections import namedtuple
+
+from django.db import connection
+from django.utils import timezone
+
+from nifleur.models import ContractRequest, ContractStatusEvent, Status, CLOSE
+
+DwellTime = namedtuple('DwellTime', ['status', 'count', 'median_days', 'p90_days'])
+StuckContract = namedtuple('StuckContract', ['contract', 'entered_at', 'days'])
+
+# Default number of days after which a contract request is considered stuck in its status
+STUCK_DAYS = 30
+
+# Time spent in a status: from the event entering the status to the next event of the same contract
+DWELL_TIMES_QUERY = """
+    WITH spells AS (
+        SELECT
+            to_status_id AS status_id,
+            LEAD(created_at) OVER (PARTITION BY contract_id ORDER BY created_at, id) - created_at AS duration
+        FROM {events}
+    )
+    SELECT
+        status_id,
+        COUNT(*),
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY duration),
+        PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY duration)
+    FROM spells
+    WHERE duration IS NOT NULL
+    GROUP BY status_id
+"""
+
+# Last event of each open contract, found with one index probe on (contract, created_at) per contract
+STUCK_CONTRACTS_QUERY = """
+    SELECT contract.id, COALESCE(last_event.created_at, contract.created_at) AS entered_at
+    FROM {contracts} contract
+    LEFT JOIN LATERAL (
+        SELECT created_at FROM {events} WHERE contract_id = contract.id ORDER BY created_at DESC LIMIT 1
+    ) last_event ON TRUE
+    WHERE contract.status_id = ANY(%(statuses)s) AND COALESCE(last_event.created_at, contract.created_at) < %(limit)s
+    ORDER BY entered_at, contract.id
+"""
+
+
+def days(duration):
+    return round(duration.total_seconds() / 86400, 1)
+
+
+def status_dwell_times():
+    """
+    Median and 90th percentile of the time spent by the contract requests in each status, computed from the status
+    history. The current status of a contract request is not counted until it changes.
+
+    :return: list of :class:`DwellTime` sorted by status position
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(DWELL_TIMES_QUERY.format(events=connection.ops.quote_name(ContractStatusEvent._meta.db_table)))
+        rows = {status_id: (count, median, p90) for status_id, count, median, p90 in cursor.fetchall()}
+    return [
+        DwellTime(status, rows[status.id][0], days(rows[status.id][1]), days(rows[status.id][2]))
+        for status in Status.objects.filter(id__in=rows.keys()).order_by('position')
+    ]
+
+
+def stuck_contracts(stuck_days=STUCK_DAYS):
+    """
+    Contract requests which have been in the same open status for more than the given number of days
+
+    :param int stuck_days:
+    :return: list of :class:`StuckContract`, the longest stuck first
+    """
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            STUCK_CONTRACTS_QUERY.format(
+                contracts=connection.ops.quote_name(ContractRequest._meta.db_table),
+                events=connection.ops.quote_name(ContractStatusEvent._meta.db_table)
+            ),
+            {
+                'statuses': list(Status.objects.exclude(type=CLOSE).values_list('id', flat=True)),
+                'limit': now - datetime.timedelta(days=stuck_days)
+            }
+        )
+        rows = cursor.fetchall()
+
+    contracts = ContractRequest.objects.select_related('speaker', 'school', 'discipline', 'status').in_bulk(
+        [contract_id for contract_id, _ in rows]
+    )
+    return [
+        StuckContract(contracts[contract_id], entered_at, (now - entered_at).days)
+        for contract_id, entered_at in rows
+    ]
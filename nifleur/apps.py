@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NifleurConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nifleur'
+
+    def ready(self):
+        # Connect the signals invalidating the compiled status transition graph
+        from nifleur import workflow  # noqa: F401
@@ -0,0 +1,180 @@
+from collections import namedtuple
+
+import numpy
+from django.db.models import Case, When, Value, Sum, Q, FloatField
+from django.db.models.functions import Coalesce
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+from nifleur.models import Discipline, Speaker, EXPERT
+from nifleur.utils import tokenize
+from nifleur.workflow import cancelled_status_ids
+
+Proposal = namedtuple('Proposal', ['discipline', 'speaker', 'score'])
+
+# Weight of a word found in the main, second and third area of expertise of the speaker
+EXPERTISE_WEIGHTS = (1, 0.75, 0.5)
+# Bonus given to the most experienced speakers (teaching and professional levels)
+LEVEL_WEIGHT = 0.5
+# Malus given to the speakers with the most contracted hours
+LOAD_WEIGHT = 0.3
+# Malus added for each extra discipline proposed to the same speaker, to share the disciplines between speakers
+SLOT_WEIGHT = 0.05
+# Number of best speakers kept as candidates for each discipline
+CANDIDATES_PER_DISCIPLINE = 20
+
+
+def build_token_matrix(texts, vocabulary, weights=None):
+    """
+    Sparse matrix with one row per text and one column per word of the vocabulary
+
+    :param list texts: list of tuple of texts, a row can be built from several texts
+    :param dict vocabulary: word -> column index
+    :param tuple weights: weight of each text of the tuple, the best weight is kept for a word
+    """
+    rows, columns, values = [], [], []
+    for row, row_texts in enumerate(texts):
+        row_values = {}
+        for index, text in enumerate(row_texts):
+            weight = weights[index] if weights else 1
+            for word in tokenize(text):
+                column = vocabulary.get(word)
+                if column is not None and weight > row_values.get(column, 0):
+                    row_values[column] = weight
+        rows += [row] * len(row_values)
+        columns += row_values.keys()
+        values += row_values.values()
+    return csr_matrix((values, (rows, columns)), shape=(len(texts), len(vocabulary)))
+
+
+def score_matrix(discipline_labels, speakers):
+    """
+    Score of each speaker for each discipline
+
+    :param list discipline_labels: label of each discipline
+    :param list speakers: list of tuple (main, second, third expertise, teaching level, professional level, hours)
+    :return: text match matrix (disciplines x speakers, between 0 and 1) and the final score matrix
+    """
+    vocabulary = {}
+    for label in discipline_labels:
+        for word in tokenize(label):
+            vocabulary.setdefault(word, len(vocabulary))
+
+    disciplines_words = build_token_matrix([(label,) for label in discipline_labels], vocabulary)
+    word_counts = numpy.maximum(numpy.asarray(disciplines_words.sum(axis=1)).ravel(), 1)
+    speakers_words = build_token_matrix([speaker[:3] for speaker in speakers], vocabulary, EXPERTISE_WEIGHTS)
+    text_match = (disciplines_words @ speakers_words.T).toarray() / word_counts[:, None]
+
+    levels = numpy.array([(speaker[3] or 0) + (speaker[4] or 0) for speaker in speakers], dtype=float)
+    hours = numpy.array([speaker[5] for speaker in speakers], dtype=float)
+    load = hours / hours.max() if hours.max() > 0 else hours
+
+    score = text_match * (1 + LEVEL_WEIGHT * levels / (2 * EXPERT)) - LOAD_WEIGHT * load
+    return text_match, score
+
+
+def candidate_edges(text_match, score, slots):
+    """
+    Edges of the bipartite graph between the disciplines and the speaker slots.
+    Only the best speakers having a word in common with a discipline are kept as candidates.
+
+    :param numpy.ndarray text_match: text match matrix (disciplines x speakers)
+    :param numpy.ndarray score: score matrix (disciplines x speakers)
+    :param int slots: number of disciplines a speaker can take, the next slots are a bit more expensive
+    :return: rows (disciplines), columns (speaker slots) and positive costs of the edges
+    """
+    candidates = min(CANDIDATES_PER_DISCIPLINE, score.shape[1])
+    masked_score = numpy.where(text_match > 0, score, -numpy.inf)
+    best_speakers = numpy.argpartition(-masked_score, candidates - 1, axis=1)[:, :candidates]
+
+    rows = numpy.repeat(numpy.arange(score.shape[0]), candidates)
+    speakers = best_speakers.ravel()
+    edge_score = masked_score[rows, speakers]
+    possible = numpy.isfinite(edge_score)
+    rows, speakers, edge_score = rows[possible], speakers[possible], edge_score[possible]
+    if not len(rows):
+        return rows, speakers, edge_score
+
+    cost = 1 + edge_score.max() - edge_score
+    return (
+        numpy.repeat(rows, slots),
+        numpy.repeat(speakers * slots, slots) + numpy.tile(numpy.arange(slots), len(rows)),
+        numpy.repeat(cost, slots) + numpy.tile(numpy.arange(slots) * SLOT_WEIGHT, len(rows))
+    )
+
+
+def propose_assignments(school=None, school_year=None, max_disciplines_per_speaker=3):
+    """
+    Propose a speaker for each discipline without speaker of a school or a school year.
+    Speakers are scored on their areas of expertise, expertise levels and contracted hours, then the proposals
+    are the min cost matching between disciplines and speakers (each speaker can take several disciplines).
+
+    :param School school:
+    :param SchoolYear school_year:
+    :param int max_disciplines_per_speaker: maximum number of disciplines proposed to a speaker
+    :return: list of :class:`Proposal` sorted by discipline
+    """
+    disciplines = Discipline.objects.filter(speaker__isnull=True)
+    if school:
+        disciplines = disciplines.filter(school=school)
+    if school_year:
+        disciplines = disciplines.filter(school_year=school_year)
+    disciplines = list(disciplines.select_related('school_year__school', 'school').order_by('label', 'id'))
+
+    contract_filter = ~Q(contract_request_speaker__status__in=cancelled_status_ids())
+    speakers = list(Speaker.objects.annotate(contracted_hours=Coalesce(
+        Sum('contract_request_speaker__hourly_volume', filter=contract_filter),
+        Value(0),
+        output_field=FloatField()
+    )).order_by('id'))
+    if not disciplines or not speakers:
+        return []
+
+    text_match, score = score_matrix(
+        [discipline.label for discipline in disciplines],
+        [(
+            speaker.main_area_of_expertise, speaker.second_area_of_expertise, speaker.third_area_of_expertise,
+            speaker.teaching_expertise_level, speaker.professional_expertise_level, speaker.contracted_hours
+        ) for speaker in speakers]
+    )
+
+    rows, columns, cost = candidate_edges(text_match, score, max_disciplines_per_speaker)
+    if not len(rows):
+        return []
+
+    # Each discipline can also be left without speaker, at a cost higher than any candidate
+    slots_count = len(speakers) * max_disciplines_per_speaker
+    graph = csr_matrix(
+        (
+            numpy.concatenate((cost, numpy.full(len(disciplines), 10 * (cost.max() + 1)))),
+            (
+                numpy.concatenate((rows, numpy.arange(len(disciplines)))),
+                numpy.concatenate((columns, slots_count + numpy.arange(len(disciplines))))
+            )
+        ),
+        shape=(len(disciplines), slots_count + len(disciplines))
+    )
+    matched_rows, matched_columns = min_weight_full_bipartite_matching(graph)
+
+    proposals = []
+    for row, column in zip(matched_rows, matched_columns):
+        if column >= slots_count:
+            continue
+        speaker_index = column // max_disciplines_per_speaker
+        score_value = round(float(score[row, speaker_index]), 2)
+        proposals.append(Proposal(disciplines[row], speakers[speaker_index], score_value))
+    return sorted(proposals, key=lambda proposal: (proposal.discipline.label, proposal.discipline.id))
+
+
+def apply_assignments(assignments):
+    """
+    Set the speaker of the disciplines in a single UPDATE, disciplines which got a speaker meanwhile are skipped
+
+    :param dict assignments: discipline id -> speaker id
+    :return: number of updated disciplines
+    """
+    if not assignments:
+        return 0
+    return Discipline.objects.filter(id__in=assignments.keys(), speaker__isnull=True).update(
+        speaker=Case(*[When(id=discipline, then=Value(speaker)) for discipline, speaker in assignments.items()])
+    )
@@ -0,0 +1,51 @@
+import hashlib
+
+from avatar.models import Avatar
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.middleware.csrf import get_token
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+
+from nifleur.models import TableVersion
+
+# Tables shown by every page: the user and its avatar in the sidebar
+PAGE_MODELS = (User, Avatar)
+
+
+def table_versions_etag(request, tables):
+    """
+    ETag of a page from the versions of the tables it shows, the page requested with its query string, the user and
+    its CSRF secret so the forms of a cached page stay valid. None when the page must be rendered: other methods than
+    GET, or messages waiting to be shown.
+    """
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    # The secret is created before the page is rendered when the browser has no CSRF cookie yet
+    get_token(request)
+    versions = dict(TableVersion.objects.filter(name__in=tables).values_list('name', 'version'))
+    key = '|'.join([
+        request.get_full_path(),
+        str(request.user.pk),
+        request.META['CSRF_COOKIE'],
+        *(f'{table}={versions.get(table, 0)}' for table in tables)
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def versioned_page(*models):
+    """
+    Answer a page with 304 Not Modified while the tables of its models are not written, the browser revalidates it at
+    each visit with its ETag so the queries and the rendering of the page are skipped. The page is gzipped.
+
+    :param models: models shown by the page, with their related models displayed
+    """
+    tables = sorted({model._meta.db_table for model in models + PAGE_MODELS})
+
+    def etag(request, *args, **kwargs):
+        return table_versions_etag(request, tables)
+
+    def decorator(view):
+        return gzip_page(cache_control(private=True, no_cache=True)(condition(etag_func=etag)(view)))
+    return decorator
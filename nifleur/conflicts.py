@@ -0,0 +1,34 @@
+from collections import namedtuple
+
+from django.db import connection
+
+from nifleur.models import ContractRequest
+from nifleur.workflow import cancelled_status_ids
+
+Conflict = namedtuple('Conflict', ['speaker_id', 'contract_id', 'other_contract_id', 'started_at', 'ended_at'])
+
+CONFLICTS_QUERY = """
+    SELECT a.speaker_id, a.id, b.id, GREATEST(a.started_at, b.started_at), LEAST(a.ended_at, b.ended_at)
+    FROM {table} a
+    INNER JOIN {table} b
+        ON b.speaker_id = a.speaker_id
+        AND b.id > a.id
+        AND TSTZRANGE(a.started_at, a.ended_at, '[]') && TSTZRANGE(b.started_at, b.ended_at, '[]')
+    WHERE (a.status_id <> ALL(%(cancelled)s)) IS NOT FALSE AND (b.status_id <> ALL(%(cancelled)s)) IS NOT FALSE
+    ORDER BY a.speaker_id, 4, a.id, b.id
+"""
+
+
+def find_speaker_conflicts():
+    """
+    Find every pair of active contract requests of the same speaker with overlapping periods.
+    The pairs are found by a single self join of the contract requests using the period GiST index.
+
+    :return: list of :class:`Conflict`, each pair is returned once
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            CONFLICTS_QUERY.format(table=connection.ops.quote_name(ContractRequest._meta.db_table)),
+            {'cancelled': list(cancelled_status_ids())}
+        )
+        return [Conflict(*row) for row in cursor.fetchall()]
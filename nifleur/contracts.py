@@ -0,0 +1,68 @@
+from django.db import transaction
+from django.db.models import Case, When, Value
+
+from nifleur.models import ContractRequest, Discipline, Speaker
+from nifleur.workflow import Transition, get_workflow, record_transitions
+
+
+def speaker_choices():
+    speakers = Speaker.objects.order_by('last_name', 'first_name')
+    return [
+        (speaker_id, f'{last_name} {first_name}')
+        for speaker_id, first_name, last_name in speakers.values_list('id', 'first_name', 'last_name')
+    ]
+
+
+def discipline_choices():
+    disciplines = Discipline.objects.order_by('school__label', 'school_year__year', 'label')
+    return [
+        (discipline_id, f'{school} - {year} - {label}' if year else f'{school} - {label}')
+        for discipline_id, label, school, year in disciplines.values_list(
+            'id', 'label', 'school__label', 'school_year__year'
+        )
+    ]
+
+
+def assign_discipline_speakers(assignments):
+    """
+    Set the speaker of the disciplines with a single UPDATE
+
+    :param dict assignments: discipline id -> speaker id
+    :return: number of updated disciplines
+    """
+    if not assignments:
+        return 0
+    return Discipline.objects.filter(id__in=assignments.keys()).update(
+        speaker=Case(*[When(id=discipline, then=Value(speaker)) for discipline, speaker in assignments.items()])
+    )
+
+
+@transaction.atomic
+def create_contract_requests(common, rows, user=None):
+    """
+    Create contract requests sharing common values with a single INSERT, record their initial status and give
+    their speaker to their discipline with a single UPDATE
+
+    :param dict common: values shared by the contract requests (school, school year, rp...)
+    :param list rows: dict of the values of each contract request, with speaker and discipline ids
+    :param User user: user recorded in the status history
+    :return: list of the created :class:`ContractRequest`
+    """
+    companies = dict(
+        Speaker.objects.filter(id__in={row['speaker'] for row in rows}).values_list('id', 'company_id')
+    )
+    status_id = get_workflow().initial_status_id
+    contract_requests = ContractRequest.objects.bulk_create([
+        ContractRequest(
+            **common,
+            **{key: value for key, value in row.items() if key not in ('speaker', 'discipline')},
+            speaker_id=row['speaker'],
+            discipline_id=row['discipline'],
+            company_id=companies.get(row['speaker']),
+            status_id=status_id
+        )
+        for row in rows
+    ])
+    record_transitions([Transition(contract.id, None, status_id) for contract in contract_requests], user)
+    assign_discipline_speakers({contract.discipline_id: contract.speaker_id for contract in contract_requests})
+    return contract_requests
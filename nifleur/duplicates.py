@@ -0,0 +1,215 @@
+import re
+from collections import namedtuple, defaultdict
+
+from phonenumber_field.phonenumber import to_python
+
+from nifleur.models import Company, Speaker
+from nifleur.utils import normalize_text
+
+Record = namedtuple('Record', ['id', 'label', 'name_key', 'phonetic_key', 'phone'])
+Duplicate = namedtuple('Duplicate', ['record', 'other', 'score'])
+
+# Words ignored in company names: "ACME SAS" and "Acme" are the same company
+LEGAL_FORMS = {
+    'sa', 'sas', 'sasu', 'sarl', 'eurl', 'sci', 'snc', 'scop', 'ei', 'eirl', 'auto', 'entrepreneur', 'inc', 'ltd',
+    'llc', 'gmbh', 'corp', 'co', 'cie', 'et'
+}
+DUPLICATE_THRESHOLD = 0.88
+# Blocks bigger than this are only compared between neighbours, sorted by name, to stay far from O(n²)
+MAX_BLOCK_SIZE = 50
+NEIGHBOURHOOD_SIZE = 10
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'), **dict.fromkeys('dt', '3'), 'l': '4',
+    **dict.fromkeys('mn', '5'), 'r': '6'
+}
+
+
+def name_key(value, ignored_words=()):
+    """ Normalized name: lowercase words without accents, punctuation or ignored words, sorted """
+    words = re.findall(r'[a-z0-9]+', normalize_text(value))
+    return ' '.join(sorted(word for word in words if word not in ignored_words)) or ' '.join(words)
+
+
+def soundex(value):
+    """ Phonetic key of a word: same key for words which sound alike ('Dupond' and 'Dupont' -> D153) """
+    letters = re.sub(r'[^a-z]', '', normalize_text(value))
+    if not letters:
+        return ''
+    key = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        code = SOUNDEX_CODES.get(letter, '')
+        if code and code != previous:
+            key += code
+        if letter not in 'hw':
+            previous = code
+    return (key + '000')[:4]
+
+
+def jaro_winkler(first, second):
+    """ Jaro-Winkler similarity between two strings, from 0 (different) to 1 (same) """
+    if first == second:
+        return 1.0
+    if not first or not second:
+        return 0.0
+
+    window = max(len(first), len(second)) // 2 - 1
+    first_matches = [False] * len(first)
+    second_matches = [False] * len(second)
+    matches = 0
+    for i, char in enumerate(first):
+        for j in range(max(0, i - window), min(i + window + 1, len(second))):
+            if not second_matches[j] and second[j] == char:
+                first_matches[i] = second_matches[j] = True
+                matches += 1
+                break
+    if not matches:
+        return 0.0
+
+    transpositions = 0
+    j = 0
+    for i, char in enumerate(first):
+        if first_matches[i]:
+            while not second_matches[j]:
+                j += 1
+            if char != second[j]:
+                transpositions += 1
+            j += 1
+    jaro = (matches / len(first) + matches / len(second) + (matches - transpositions / 2) / matches) / 3
+
+    prefix = 0
+    for first_char, second_char in zip(first[:4], second[:4]):
+        if first_char != second_char:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def trigrams(value):
+    padded = f'  {value} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(first, second):
+    """ Similarity of two records: same phone number or best of Jaro-Winkler and trigram similarity of the names """
+    if first.phone and first.phone == second.phone:
+        return 1.0
+    first_trigrams, second_trigrams = trigrams(first.name_key), trigrams(second.name_key)
+    trigram_similarity = len(first_trigrams & second_trigrams) / len(first_trigrams | second_trigrams)
+    return max(jaro_winkler(first.name_key, second.name_key), trigram_similarity)
+
+
+def phone_key(phone):
+    """ Phone number in E164 format, or None if empty or invalid """
+    phone = to_python(phone) if phone else None
+    return phone.as_e164 if phone and phone.is_valid() else None
+
+
+def company_record(company_id, label, phone=None):
+    key = name_key(label, LEGAL_FORMS)
+    return Record(company_id, label, key, soundex(key.split(' ')[0]), phone_key(phone))
+
+
+def speaker_record(speaker_id, first_name, last_name, phone=None):
+    key = name_key(f'{first_name} {last_name}')
+    phonetic = f"{soundex(last_name)}{normalize_text(first_name)[:1]}"
+    return Record(speaker_id, f'{first_name} {last_name}', key, phonetic, phone_key(phone))
+
+
+def company_records():
+    return [
+        company_record(company_id, label, phone)
+        for company_id, label, phone in Company.objects.values_list('id', 'label', 'relation_phone_number')
+    ]
+
+
+def speaker_records():
+    return [
+        speaker_record(*values)
+        for values in Speaker.objects.values_list('id', 'first_name', 'last_name', 'phone_number')
+    ]
+
+
+class DuplicateIndex:
+    """
+    Blocking index of records: a record is only compared with the records sharing one of its blocking keys
+    (normalized name, phonetic key or phone number)
+    """
+    def __init__(self, records=(), threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self.blocks = defaultdict(list)
+        for record in records:
+            self.add(record)
+
+    @staticmethod
+    def blocking_keys(record):
+        keys = [('name', record.name_key), ('phonetic', record.phonetic_key)]
+        if record.phone:
+            keys.append(('phone', record.phone))
+        return keys
+
+    def add(self, record):
+        for key in self.blocking_keys(record):
+            self.blocks[key].append(record)
+
+    def find(self, record):
+        """ Records of the index similar to the given record, best first """
+        candidates = {}
+        for key in self.blocking_keys(record):
+            block = self.blocks.get(key, [])
+            if len(block) > MAX_BLOCK_SIZE:
+                block = sorted(block, key=lambda other: abs(jaro_winkler(other.name_key, record.name_key) - 1))
+                block = block[:NEIGHBOURHOOD_SIZE]
+            for other in block:
+                if other.id != record.id:
+                    candidates[other.id] = other
+
+        duplicates = [Duplicate(record, other, similarity(record, other)) for other in candidates.values()]
+        return sorted(
+            [duplicate for duplicate in duplicates if duplicate.score >= self.threshold],
+            key=lambda duplicate: -duplicate.score
+        )
+
+    def pairs(self):
+        """ Every pair of similar records of the index, each pair is returned once """
+        compared = set()
+        duplicates = []
+        for block in self.blocks.values():
+            if len(block) < 2:
+                continue
+            if len(block) > MAX_BLOCK_SIZE:
+                block = sorted(block, key=lambda record: record.name_key)
+                neighbours = [
+                    (record, other)
+                    for i, record in enumerate(block)
+                    for other in block[i + 1:i + 1 + NEIGHBOURHOOD_SIZE]
+                ]
+            else:
+                neighbours = [(record, other) for i, record in enumerate(block) for other in block[i + 1:]]
+
+            for record, other in neighbours:
+                pair = (min(record.id, other.id), max(record.id, other.id))
+                if record.id == other.id or pair in compared:
+                    continue
+                compared.add(pair)
+                score = similarity(record, other)
+                if score >= self.threshold:
+                    duplicates.append(Duplicate(record, other, score))
+        return sorted(duplicates, key=lambda duplicate: (-duplicate.score, duplicate.record.label))
+
+
+def find_duplicate_companies(threshold=DUPLICATE_THRESHOLD):
+    return DuplicateIndex(company_records(), threshold).pairs()
+
+
+def find_duplicate_speakers(threshold=DUPLICATE_THRESHOLD):
+    return DuplicateIndex(speaker_records(), threshold).pairs()
+
+
+def duplicates_message(duplicates, limit=10):
+    """ Summary of the potential duplicates found during an import """
+    pairs = ', '.join(f"{duplicate.record.label} ~ {duplicate.other.label}" for duplicate in duplicates[:limit])
+    if len(duplicates) > limit:
+        pairs += "... (commande find_duplicates pour la liste complète)"
+    return f"{len(duplicates)} doublons potentiels : {pairs}"
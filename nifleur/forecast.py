@@ -0,0 +1,116 @@
+import numpy
+from django.core.cache import cache
+from django.db.models import Max, Count, Q, ExpressionWrapper, BooleanField
+from django.db.models.functions import TruncDate
+
+from nifleur.models import ContractRequest
+
+FORECAST_CACHE_TIMEOUT = 60 * 60
+FORECAST_DIMENSIONS = ('school', 'speaker', 'rp')
+
+# Rate types whose label contains this value are a flat price for the whole contract, the other ones are hourly
+FLAT_RATE_LABEL = 'forfait'
+
+
+def forecast_cache_key():
+    """ Cache key of the forecast, it changes as soon as a contract request is created, edited or deleted """
+    version = ContractRequest.objects.aggregate(last_update=Max('updated_at'), total=Count('id'))
+    last_update = version['last_update'].timestamp() if version['last_update'] else 0
+    return f"contract_forecast:{version['total']}:{last_update}"
+
+
+def spread_over_months(started_at, ended_at, values):
+    """
+    Spread values over the months covered by date ranges, prorated by the number of days in each month
+
+    :param numpy.ndarray started_at: first day of each range (datetime64[D])
+    :param numpy.ndarray ended_at: last day of each range, included (datetime64[D])
+    :param numpy.ndarray values: 2 dimensional array, one row per range and one column per value to spread
+    :return: months (datetime64[M]) and an array of shape (ranges, months, values)
+    """
+    ended_at = numpy.maximum(ended_at, started_at)
+    days = (ended_at - started_at).astype(numpy.int64) + 1
+
+    months = numpy.arange(started_at.min().astype('datetime64[M]'), ended_at.max().astype('datetime64[M]') + 1)
+    month_start = months.astype('datetime64[D]')
+    month_end = (months + 1).astype('datetime64[D]') - 1
+
+    overlap = numpy.minimum(ended_at[:, None], month_end[None, :]) - numpy.maximum(started_at[:, None], month_start)
+    overlap = numpy.clip(overlap.astype(numpy.int64) + 1, 0, None)
+    share = overlap / days[:, None]
+    return months, share[:, :, None] * values[:, None, :]
+
+
+def group_series(keys, labels, series):
+    """
+    Sum the monthly series of the contracts sharing the same key
+
+    :param list keys: group key of each contract
+    :param list labels: label of each contract group
+    :param numpy.ndarray series: array of shape (contracts, months, 2) containing the hours and the cost
+    :return: list of dict sorted by total hours
+    """
+    unique_keys, index, inverse = numpy.unique(numpy.array(keys), return_index=True, return_inverse=True)
+    totals = numpy.zeros((len(unique_keys),) + series.shape[1:])
+    numpy.add.at(totals, inverse.ravel(), series)
+
+    groups = [{
+        'id': int(unique_keys[i]),
+        'label': labels[index[i]],
+        'hours': totals[i, :, 0].round(2).tolist(),
+        'cost': totals[i, :, 1].round(2).tolist()
+    } for i in range(len(unique_keys))]
+    return sorted(groups, key=lambda group: sum(group['hours']), reverse=True)
+
+
+def compute_forecast():
+    """
+    Monthly forecast of the hours and cost of all active contract requests, grouped by school, speaker and rp.
+    Each contract is prorated on the days of every month between its start and end dates.
+    """
+    contracts = ContractRequest.objects.active().annotate(
+        start=TruncDate('started_at'),
+        end=TruncDate('ended_at'),
+        flat_rate=ExpressionWrapper(Q(rate_type__label__icontains=FLAT_RATE_LABEL), output_field=BooleanField())
+    ).values_list(
+        'start', 'end', 'hourly_volume', 'applied_rate', 'flat_rate',
+        'school_id', 'school__label',
+        'speaker_id', 'speaker__first_name', 'speaker__last_name',
+        'rp_id', 'rp__first_name', 'rp__last_name', 'rp__username'
+    )
+    rows = list(contracts)
+    forecast = {'months': [], **{dimension: [] for dimension in FORECAST_DIMENSIONS}}
+    if not rows:
+        return forecast
+
+    columns = list(zip(*rows))
+    hours = numpy.array(columns[2], dtype=float)
+    rate = numpy.array(columns[3], dtype=float)
+    cost = numpy.where(numpy.array(columns[4], dtype=bool), rate, rate * hours)
+
+    months, series = spread_over_months(
+        numpy.array(columns[0], dtype='datetime64[D]'),
+        numpy.array(columns[1], dtype='datetime64[D]'),
+        numpy.stack((hours, cost), axis=1)
+    )
+    forecast['months'] = [str(month) for month in months]
+    forecast['school'] = group_series(columns[5], columns[6], series)
+    forecast['speaker'] = group_series(
+        columns[7],
+        [f'{first_name} {last_name}' for first_name, last_name in zip(columns[8], columns[9])],
+        series
+    )
+    forecast['rp'] = group_series(
+        columns[10],
+        [
+            f'{first_name} {last_name}'.strip() or username
+            for first_name, last_name, username in zip(columns[11], columns[12], columns[13])
+        ],
+        series
+    )
+    return forecast
+
+
+def get_forecast():
+    """ Return the cached forecast, computed again only when contract requests changed """
+    return cache.get_or_set(forecast_cache_key(), compute_forecast, FORECAST_CACHE_TIMEOUT)
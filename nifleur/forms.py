@@ -1,9 +1,14 @@
+import datetime
+from collections import defaultdict
+
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from nifleur.models import Discipline, Speaker, ContractRequest, Performance, SchoolYear, Status, School, \
     RecruitmentType, RateType, CompanyType, Unit, LegalStructure, Company
+from nifleur.utils import short_datetime
 
 
 class CustomModelForm(forms.ModelForm):
@@ -64,6 +69,132 @@ class ContractRequestForm(CustomModelForm):
         users = User.objects.filter(groups__name__icontains='Pédagogique')
         self.fields['rp'].choices = [(user.pk, user.get_full_name()) for user in users]
 
+    def clean(self):
+        cleaned_data = super(ContractRequestForm, self).clean()
+        speaker = cleaned_data.get('speaker')
+        started_at = cleaned_data.get('started_at')
+        ended_at = cleaned_data.get('ended_at')
+
+        if speaker and started_at and ended_at:
+            conflicts = ContractRequest.objects.active().overlapping(speaker, started_at, ended_at) \
+                .exclude(pk=self.instance.pk).order_by('started_at')
+            conflict = conflicts.first()
+            if conflict:
+                raise forms.ValidationError(
+                    "L'intervenant %(speaker)s a déjà un contrat sur cette période (du %(started_at)s au %(ended_at)s)",
+                    code='overlap',
+                    params={
+                        'speaker': speaker,
+                        'started_at': short_datetime(conflict.started_at),
+                        'ended_at': short_datetime(conflict.ended_at)
+                    }
+                )
+        return cleaned_data
+
+
+class ContractRequestEditForm(ContractRequestForm):
+    """ Edition of a contract request: the status is left to the workflow, the version detects concurrent edits """
+    version = forms.CharField(widget=forms.HiddenInput)
+
+    class Meta(ContractRequestForm.Meta):
+        fields = tuple(field for field in ContractRequestForm.Meta.fields if field != 'status')
+
+    def __init__(self, *args, **kwargs):
+        super(ContractRequestEditForm, self).__init__(*args, **kwargs)
+        self.fields['version'].initial = self.instance.updated_at.isoformat()
+
+    def clean_version(self):
+        try:
+            return datetime.datetime.fromisoformat(self.cleaned_data['version'])
+        except ValueError:
+            raise forms.ValidationError("Version de la demande de contrat invalide")
+
+
+class ContractRequestBatchForm(CustomModelForm):
+    """ Values shared by every contract request of a batch """
+    class Meta:
+        model = ContractRequest
+        fields = (
+            'school', 'legal_structure', 'school_year', 'performance', 'rate_type', 'ttc', 'unit', 'period', 'rp',
+            'recruitment_type'
+        )
+        widgets = {
+            'ttc': forms.Select(choices=TTC_CHOICES)
+        }
+
+    def __init__(self, *args, **kwargs):
+        super(ContractRequestBatchForm, self).__init__(*args, **kwargs)
+        users = User.objects.filter(groups__name__icontains='Pédagogique')
+        self.fields['rp'].choices = [(user.pk, user.get_full_name()) for user in users]
+
+
+class ContractRequestRowForm(forms.Form):
+    """ One contract request of a batch, the speakers and disciplines choices are loaded once for the whole batch """
+    speaker = forms.TypedChoiceField(label='Intervenant', coerce=int)
+    discipline = forms.TypedChoiceField(label='Matière', coerce=int)
+    started_at = forms.DateTimeField(label='Début du contrat')
+    ended_at = forms.DateTimeField(label='Fin du contrat')
+    hourly_volume = forms.FloatField(label='Volume horaire', min_value=0)
+    applied_rate = forms.FloatField(label='Tarif à appliquer', min_value=0)
+    comment = forms.CharField(label='Commentaire', max_length=255, required=False)
+
+    def __init__(self, *args, speaker_choices=(), discipline_choices=(), **kwargs):
+        super(ContractRequestRowForm, self).__init__(*args, **kwargs)
+        self.fields['speaker'].choices = speaker_choices
+        self.fields['discipline'].choices = discipline_choices
+        for visible in self.visible_fields():
+            visible.field.widget.attrs['class'] = 'form-control form-control-sm'
+        self.fields['started_at'].widget.attrs['class'] += ' datepicker_input'
+        self.fields['ended_at'].widget.attrs['class'] += ' datepicker_input'
+
+    def clean(self):
+        cleaned_data = super(ContractRequestRowForm, self).clean()
+        started_at = cleaned_data.get('started_at')
+        ended_at = cleaned_data.get('ended_at')
+        if started_at and ended_at and ended_at < started_at:
+            raise forms.ValidationError("La fin du contrat doit être après son début")
+        for field, message in (('hourly_volume', "Le volume horaire"), ('applied_rate', "Le tarif à appliquer")):
+            if cleaned_data.get(field) == 0:
+                self.add_error(field, f"{message} doit être positif")
+        return cleaned_data
+
+
+class BaseContractRequestRowFormSet(forms.BaseFormSet):
+    def clean(self):
+        """ Overlapping contracts of a speaker, in the batch or in the database, checked with a single query """
+        if any(self.errors):
+            return
+        rows = [form.cleaned_data for form in self.forms if form.cleaned_data and not self._should_delete_form(form)]
+        if not rows:
+            return
+
+        periods = defaultdict(list)
+        for contract in ContractRequest.objects.active().filter(
+            speaker_id__in={row['speaker'] for row in rows},
+            started_at__lt=max(row['ended_at'] for row in rows),
+            ended_at__gt=min(row['started_at'] for row in rows)
+        ).values('speaker_id', 'started_at', 'ended_at'):
+            periods[contract['speaker_id']].append((contract['started_at'], contract['ended_at']))
+
+        for row in rows:
+            for started_at, ended_at in periods[row['speaker']]:
+                if started_at < row['ended_at'] and row['started_at'] < ended_at:
+                    raise forms.ValidationError(
+                        "Un intervenant a plusieurs contrats sur la même période (du %(started_at)s au %(ended_at)s)",
+                        code='overlap',
+                        params={'started_at': short_datetime(started_at), 'ended_at': short_datetime(ended_at)}
+                    )
+            periods[row['speaker']].append((row['started_at'], row['ended_at']))
+
+
+ContractRequestRowFormSet = forms.formset_factory(
+    ContractRequestRowForm,
+    formset=BaseContractRequestRowFormSet,
+    extra=5,
+    max_num=200,
+    validate_max=True
+)
+
 
 class PerformanceForm(CustomModelForm):
     class Meta:
@@ -149,3 +280,100 @@ class CompanyForm(CustomModelForm):
         widgets = {
             'relation_phone_number': forms.TextInput(attrs={'placeholder': '0_ __ __ __ __', 'data-slots': '_'})
         }
+
+
+class AssignmentFilterForm(forms.Form):
+    school = forms.ModelChoiceField(School.objects.all(), label='Ecole', required=False)
+    school_year = forms.ModelChoiceField(
+        SchoolYear.objects.select_related('school').order_by('school__label', 'year'),
+        label='Classe',
+        required=False
+    )
+    max_disciplines_per_speaker = forms.IntegerField(
+        label="Nombre maximum de matières par intervenant",
+        min_value=1,
+        max_value=20,
+        initial=3,
+        required=False
+    )
+
+    def __init__(self, *args, **kwargs):
+        super(AssignmentFilterForm, self).__init__(*args, **kwargs)
+        for visible in self.visible_fields():
+            visible.field.widget.attrs['class'] = 'form-control'
+
+
+class AssignmentForm(AssignmentFilterForm):
+    """
+    Proposals selected among the disciplines of the school or the school year filtered, each one is sent as
+    "discipline id:speaker id"
+    """
+    assignment = forms.Field(widget=forms.MultipleHiddenInput, required=False)
+
+    def clean_assignment(self):
+        """ The proposals as a dict discipline id -> speaker id """
+        assignments = {}
+        for value in self.cleaned_data['assignment'] or []:
+            discipline_id, _, speaker_id = value.partition(':')
+            if not discipline_id.isdigit() or not speaker_id.isdigit():
+                raise forms.ValidationError("Proposition d'attribution invalide : %(value)s", params={'value': value})
+            assignments[int(discipline_id)] = int(speaker_id)
+        return assignments
+
+    def clean(self):
+        cleaned_data = super(AssignmentForm, self).clean()
+        assignments = cleaned_data.get('assignment')
+        if not assignments:
+            return cleaned_data
+        school, school_year = cleaned_data.get('school'), cleaned_data.get('school_year')
+        if not school and not school_year:
+            raise forms.ValidationError("Choisissez l'école ou la classe des matières à attribuer")
+
+        disciplines = Discipline.objects.filter(id__in=assignments)
+        if school:
+            disciplines = disciplines.filter(school=school)
+        if school_year:
+            disciplines = disciplines.filter(school_year=school_year)
+        if disciplines.count() != len(assignments):
+            raise forms.ValidationError("Des matières n'appartiennent pas à l'école ou la classe choisie")
+        if Speaker.objects.filter(id__in=set(assignments.values())).count() != len(set(assignments.values())):
+            raise forms.ValidationError("Des intervenants proposés n'existent plus")
+        return cleaned_data
+
+
+class RolloverForm(forms.Form):
+    source = forms.ModelChoiceField(
+        SchoolYear.objects.select_related('school').order_by('school__label', 'year'),
+        label='Promotion à reconduire'
+    )
+    target = forms.ModelChoiceField(
+        SchoolYear.objects.select_related('school').order_by('school__label', 'year'),
+        label='Nouvelle promotion'
+    )
+    started_at = forms.DateField(label='Contrats commençant à partir du')
+    ended_at = forms.DateField(label="Jusqu'au (exclu)")
+    target_started_at = forms.DateField(label='Décaler ces contrats pour commencer au')
+    contracts = forms.BooleanField(label='Reconduire aussi les demandes de contrat', required=False, initial=True)
+
+    def __init__(self, *args, **kwargs):
+        super(RolloverForm, self).__init__(*args, **kwargs)
+        for visible in self.visible_fields():
+            visible.field.widget.attrs['class'] = 'form-control'
+        self.fields['contracts'].widget.attrs['class'] = 'form-check-input'
+        for field in ('started_at', 'ended_at', 'target_started_at'):
+            self.fields[field].widget.attrs['class'] += ' datepicker_input'
+
+    def clean(self):
+        """ The dates are converted to the start of the day in the current time zone """
+        cleaned_data = super(RolloverForm, self).clean()
+        if cleaned_data.get('source') and cleaned_data.get('source') == cleaned_data.get('target'):
+            raise forms.ValidationError("La nouvelle promotion doit être différente de la promotion à reconduire")
+        for field in ('started_at', 'ended_at', 'target_started_at'):
+            if cleaned_data.get(field):
+                cleaned_data[field] = timezone.make_aware(
+                    datetime.datetime.combine(cleaned_data[field], datetime.time())
+                )
+        if cleaned_data.get('started_at') and cleaned_data.get('ended_at') and \
+                cleaned_data['ended_at'] <= cleaned_data['started_at']:
+            raise forms.ValidationError("La fin de la période doit être après son début")
+        return cleaned_data
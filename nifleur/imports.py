@@ -0,0 +1,753 @@
+import codecs
+import itertools
+import json
+import os
+import re
+import time
+import uuid
+from collections import defaultdict, namedtuple
+
+import openpyxl
+import pandas
+from pandas.api.types import is_numeric_dtype
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dates import MONTHS_AP
+
+from nifleur.contracts import assign_discipline_speakers
+from nifleur.duplicates import DuplicateIndex, company_records, speaker_records, company_record, speaker_record
+from nifleur.models import ContractRequest, School, Speaker, Status, Performance, RateType, Unit, Discipline, \
+    SchoolYear, RecruitmentType, LegalStructure, Company, CompanyType, PERIOD, STATUS_CHOICES, LEVELS, BEGINNER, \
+    INTERMEDIATE, EXPERT, index_speaker_skills
+from nifleur.workflow import Transition, cancelled_status_ids, invalidate_workflow, record_transitions
+
+RowError = namedtuple('RowError', ['line', 'column', 'value', 'message'])
+ImportReport = namedtuple('ImportReport', ['total', 'valid', 'imported', 'errors'])
+
+IMPORT_BATCH_SIZE = 1000
+# Rows committed together by the imports processed in background
+IMPORT_CHUNK_SIZE = 500
+# Error reports of the imports are kept in a folder of the spool directory, shared by the processes, until they expire
+ERROR_REPORT_DIR = 'reports'
+ERROR_REPORT_TIMEOUT = 60 * 60
+ERROR_REPORT_HEADER = ['Ligne', 'Colonne', 'Valeur', 'Erreur']
+# Formats of the dates of the imported files: exports of the application, then ISO dates of the spreadsheets
+DATE_FORMATS = ('%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d')
+TRUE_VALUES = {'true', 'vrai', 'oui', '1', 'x'}
+
+
+def read_table(file):
+    """
+    DataFrame of an uploaded XLSX or CSV file, every cell is read as text. The format sniffed by ImportUploadHandler
+    is used before the extension of the file.
+    """
+    file_format = getattr(file, 'format', None) or ('csv' if file.name.lower().endswith('.csv') else 'xlsx')
+    if file_format == 'csv':
+        return pandas.read_csv(codecs.getreader('utf-8-sig')(file), sep=None, engine='python', dtype=str)
+    return pandas.read_excel(file, dtype=str)
+
+
+def chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def open_workbook(file):
+    """ Workbook read lazily: the rows of its sheets are parsed while they are iterated """
+    return openpyxl.load_workbook(file, read_only=True, data_only=True)
+
+
+def estimated_rows(sheet):
+    """ Number of rows of a sheet without its header, given by the dimensions saved in the file """
+    return max((sheet.max_row or 1) - 1, 0)
+
+
+def cell_text(value):
+    """ Text of a cell as read by pandas.read_excel: integers stored as floats lose their decimal part """
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def header_names(header):
+    """ Names of the columns of a sheet, the empty and repeated names are renamed like pandas does """
+    names = []
+    for index, value in enumerate(header):
+        name = cell_text(value) or f'Unnamed: {index}'
+        names.append(f'{name}.{names.count(name)}' if name in names else name)
+    return names
+
+
+def read_sheet_chunks(sheet, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    DataFrames of text of the rows of a read-only sheet, read lazily by chunks so only one chunk is in memory. The
+    first row gives the names of the columns, the empty rows are skipped and the index is the position of the row
+    after the header.
+    """
+    rows = sheet.iter_rows(values_only=True)
+    columns = header_names(next(rows, None) or ())
+    start = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        frame = pandas.DataFrame(
+            [[cell_text(value) for value in row[:len(columns)]] for row in chunk],
+            index=range(start, start + len(chunk)),
+            dtype=object
+        )
+        frame = frame.reindex(columns=range(len(columns)))
+        frame.columns = columns
+        start += len(chunk)
+        frame = frame.dropna(how='all')
+        if not frame.empty:
+            yield frame
+
+
+def merge_reports(report, other):
+    """ Add the counts of a chunk to the report of the file, the errors are appended to the list of the report """
+    report.errors.extend(other.errors)
+    return ImportReport(
+        report.total + other.total, report.valid + other.valid, report.imported + other.imported, report.errors
+    )
+
+
+def read_csv_rows(file, columns):
+    """ DataFrame of an uploaded CSV file without header and separated by semicolons, every cell is read as text """
+    try:
+        frame = pandas.read_csv(codecs.getreader('utf-8-sig')(file), sep=';', header=None, dtype=str)
+    except pandas.errors.EmptyDataError:
+        frame = pandas.DataFrame()
+    frame = frame.reindex(columns=range(len(columns)))
+    frame.columns = columns
+    return frame
+
+
+def error_report_path(token):
+    return os.path.join(settings.IMPORT_SPOOL_DIR, ERROR_REPORT_DIR, f'{token}.json')
+
+
+def store_error_report(errors, user):
+    """
+    Keep the errors of an import to download them later as a CSV report. The report is written in the spool directory
+    so every process of the server can send it, the expired reports are removed.
+
+    :param list errors: list of :class:`RowError`
+    :param User user: only user allowed to download the report
+    :return: token of the report
+    """
+    directory = os.path.join(settings.IMPORT_SPOOL_DIR, ERROR_REPORT_DIR)
+    os.makedirs(directory, exist_ok=True)
+    expired = time.time() - ERROR_REPORT_TIMEOUT
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.json') and entry.stat().st_mtime < expired:
+            os.remove(entry.path)
+
+    token = uuid.uuid4().hex
+    with open(error_report_path(token), 'w', encoding='utf-8') as file:
+        json.dump({'user': user.id, 'errors': [list(error) for error in errors]}, file, default=str)
+    return token
+
+
+def get_error_report(token, user):
+    """ Rows of an error report with its header, None if the report expired or belongs to another user """
+    if not re.fullmatch(r'[0-9a-f]{32}', token):
+        return None
+    path = error_report_path(token)
+    try:
+        if os.path.getmtime(path) < time.time() - ERROR_REPORT_TIMEOUT:
+            return None
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+    except FileNotFoundError:
+        return None
+    if report['user'] != user.id:
+        return None
+    return [ERROR_REPORT_HEADER, *report['errors']]
+
+
+def label_lookup(model, field='label'):
+    """ Id of every row of a table by its normalized label, loaded with a single query """
+    return {str(value).strip().lower(): pk for pk, value in model.objects.values_list('id', field)}
+
+
+class FrameValidator:
+    """
+    Validation of a whole file at once: each column is cleaned and resolved with vectorized operations and the
+    invalid rows are flagged, the errors keep the line and the value of each invalid cell
+    """
+    def __init__(self, frame, first_line=2):
+        self.frame = frame
+        self.first_line = first_line
+        self.values = pandas.DataFrame(index=frame.index)
+        self.invalid = pandas.Series(False, index=frame.index)
+        self.errors = []
+
+    def text(self, column):
+        """ Stripped text of a column, empty strings for the empty cells or if the column is missing """
+        if column not in self.frame.columns:
+            self.errors.append(RowError(1, column, '', "Colonne manquante"))
+            self.invalid[:] = True
+            return pandas.Series('', index=self.frame.index)
+        return self.frame[column].fillna('').astype(str).str.strip()
+
+    def add_errors(self, mask, column, message):
+        """ Flag the rows of the mask as invalid, the rows of a missing column are already flagged """
+        if column not in self.frame.columns:
+            return
+        for index in self.frame.index[mask]:
+            value = self.frame.at[index, column]
+            line = index + self.first_line
+            self.errors.append(RowError(line, column, '' if pandas.isna(value) else value, message))
+        self.invalid |= mask
+
+    def required(self, text, column):
+        empty = text == ''
+        self.add_errors(empty, column, "Valeur obligatoire")
+        return empty
+
+    def unique(self, text, column, existing=(), seen=None):
+        """
+        Flag the values repeated in the file or already existing, compared without case
+
+        :param set seen: values of the previous chunks of the file, completed with the values of this chunk
+        """
+        normalized = text.str.lower()
+        repeated = normalized.duplicated() if seen is None else normalized.duplicated() | normalized.isin(seen)
+        self.add_errors((normalized != '') & repeated, column, "Valeur en double dans le fichier")
+        self.add_errors(normalized.isin(existing), column, "Existe déjà")
+        if seen is not None:
+            seen.update(normalized[normalized != ''])
+
+    def max_length(self, text, column, model, field):
+        """ Flag the values longer than the column of the table """
+        self.add_errors(text.str.len() > model._meta.get_field(field).max_length, column, "Valeur trop longue")
+
+    def resolve(self, name, column, lookup, required=True):
+        """ Resolve the labels of a column with a lookup dict: label -> id """
+        text = self.text(column)
+        empty = self.required(text, column) if required else text == ''
+        resolved = text.str.lower().map(lookup)
+        self.add_errors(~empty & resolved.isna(), column, "Valeur inconnue")
+        self.values[name] = resolved.astype('Int64') if is_numeric_dtype(resolved) else resolved
+
+    def number(self, name, column, positive=True):
+        number = pandas.to_numeric(self.text(column).str.replace(',', '.', regex=False), errors='coerce')
+        invalid = number.isna() | (number <= 0) if positive else number.isna()
+        self.add_errors(invalid, column, "Nombre invalide")
+        self.values[name] = number
+
+    def datetime(self, name, column):
+        """ Dates of the current time zone, the abbreviated months of the exports are replaced by their number """
+        months = {str(month).lower(): f'/{number:02d}/' for number, month in MONTHS_AP.items()}
+        text = self.text(column).str.lower().str.replace(
+            r' ({}) '.format('|'.join(re.escape(month) for month in months)),
+            lambda match: months[match.group(1)],
+            regex=True
+        )
+        parsed = pandas.Series(pandas.NaT, index=text.index, dtype='datetime64[ns]')
+        for date_format in DATE_FORMATS:
+            parsed = parsed.fillna(pandas.to_datetime(text, format=date_format, errors='coerce'))
+        parsed = parsed.dt.tz_localize(timezone.get_current_timezone_name(), ambiguous='NaT', nonexistent='NaT')
+        self.add_errors(parsed.isna(), column, "Date invalide")
+        self.values[name] = parsed
+
+    def boolean(self, name, column, true_values=TRUE_VALUES):
+        self.values[name] = self.text(column).str.lower().isin(true_values)
+
+    def valid_values(self):
+        return self.values[~self.invalid]
+
+    def report(self, imported=0):
+        return ImportReport(len(self.frame), int((~self.invalid).sum()), imported, self.errors)
+
+
+def validate_contract_requests(frame):
+    """
+    Resolve and check the rows of a file with the layout of the contract requests export, each referenced table
+    is loaded once in a lookup dict
+
+    :param pandas.DataFrame frame:
+    :return: :class:`FrameValidator` with the resolved values and the errors
+    """
+    validator = FrameValidator(frame)
+    validator.resolve('school_id', 'Marque / Ecole', label_lookup(School))
+    validator.resolve('legal_structure_id', 'Structure juridique', label_lookup(LegalStructure))
+    validator.resolve('speaker_id', 'Mail', label_lookup(Speaker, 'mail'))
+    validator.resolve('status_id', 'Status contrat', label_lookup(Status))
+    validator.resolve('performance_id', 'Type de mission', label_lookup(Performance))
+    validator.resolve('rate_type_id', 'Horaire ou forfait', label_lookup(RateType))
+    validator.resolve('unit_id', 'Unité', label_lookup(Unit), required=False)
+    validator.resolve('recruitment_type_id', 'Type de recrutement', label_lookup(RecruitmentType))
+    validator.resolve('period', 'Période', {
+        **{label.lower(): value for value, label in PERIOD}, **{value.lower(): value for value, _ in PERIOD}
+    })
+    validator.resolve('rp_id', 'RP', {
+        f'{first_name} {last_name}'.strip().lower(): pk
+        for pk, first_name, last_name in User.objects.values_list('id', 'first_name', 'last_name')
+    })
+    validator.number('applied_rate', 'Tarif a appliquer')
+    validator.number('hourly_volume', 'Volume horaire')
+    validator.datetime('started_at', 'Date début')
+    validator.datetime('ended_at', 'Date fin')
+    validator.add_errors(validator.values['ended_at'] < validator.values['started_at'], 'Date fin',
+                         "La fin du contrat est avant son début")
+    validator.values['ttc'] = validator.text('TTC/SST').str.upper() == 'TTC'
+    comment = validator.text('Commentaire')
+    validator.values['comment'] = comment.where(comment != '')
+
+    # School years by school, year and kind of students, the first one when several match
+    school_years = {}
+    for pk, school_id, year, initial, alternating in SchoolYear.objects.order_by('-id').values_list(
+        'id', 'school_id', 'year', 'initial', 'alternating'
+    ):
+        school_years[(school_id, year.strip().lower(), initial, alternating)] = pk
+    validator.boolean('initial', 'Initial')
+    validator.boolean('alternating', 'alternant')
+    year = validator.text('Promotion').str.lower()
+    validator.values['school_year_id'] = pandas.Series([
+        school_years.get(key) for key in zip(
+            validator.values['school_id'], year, validator.values['initial'], validator.values['alternating']
+        )
+    ], index=frame.index, dtype=object)
+    validator.add_errors(validator.values['school_year_id'].isna(), 'Promotion', "Promotion inconnue")
+
+    # Disciplines by school year and label, the disciplines without school year (imported) by school and label
+    disciplines, school_disciplines = {}, {}
+    for pk, school_id, school_year_id, label in Discipline.objects.order_by('-id').values_list(
+        'id', 'school_id', 'school_year_id', 'label'
+    ):
+        if school_year_id is None:
+            school_disciplines[(school_id, label.strip().lower())] = pk
+        else:
+            disciplines[(school_year_id, label.strip().lower())] = pk
+    validator.values['discipline_id'] = pandas.Series([
+        disciplines.get((school_year_id, discipline), school_disciplines.get((school_id, discipline)))
+        for school_id, school_year_id, discipline in zip(
+            validator.values['school_id'], validator.values['school_year_id'], validator.text('Matière').str.lower()
+        )
+    ], index=frame.index, dtype=object)
+    validator.add_errors(validator.values['discipline_id'].isna(), 'Matière', "Matière inconnue pour la promotion")
+    validate_contract_periods(validator)
+    return validator
+
+
+def validate_contract_periods(validator):
+    """
+    Flag the contract requests overlapping an active contract request of their speaker, in the database or in the
+    previous rows of the file, like the forms. The contracts of the database are loaded with a single query.
+
+    :param FrameValidator validator: validator of the contract requests, with the resolved values
+    """
+    cancelled = cancelled_status_ids()
+    rows = validator.values[~validator.invalid & ~validator.values['status_id'].isin(cancelled)]
+    if rows.empty:
+        return
+
+    periods = defaultdict(list)
+    for speaker_id, started_at, ended_at in ContractRequest.objects.exclude(status__in=cancelled).filter(
+        speaker_id__in=set(rows['speaker_id']),
+        started_at__lt=rows['ended_at'].max().to_pydatetime(),
+        ended_at__gt=rows['started_at'].min().to_pydatetime()
+    ).values_list('speaker_id', 'started_at', 'ended_at'):
+        periods[speaker_id].append((started_at, ended_at))
+
+    overlapping = pandas.Series(False, index=validator.frame.index)
+    for index, speaker_id, started_at, ended_at in zip(rows.index, rows['speaker_id'], rows['started_at'],
+                                                       rows['ended_at']):
+        started_at, ended_at = started_at.to_pydatetime(), ended_at.to_pydatetime()
+        if any(other_start < ended_at and started_at < other_end for other_start, other_end in periods[speaker_id]):
+            overlapping[index] = True
+        else:
+            periods[speaker_id].append((started_at, ended_at))
+    validator.add_errors(overlapping, 'Date début', "L'intervenant a déjà un contrat sur cette période")
+
+
+CONTRACT_REQUEST_FIELDS = (
+    'school_id', 'legal_structure_id', 'speaker_id', 'status_id', 'performance_id', 'rate_type_id', 'unit_id',
+    'recruitment_type_id', 'period', 'rp_id', 'applied_rate', 'hourly_volume', 'started_at', 'ended_at', 'ttc',
+    'comment', 'school_year_id', 'discipline_id'
+)
+
+
+@transaction.atomic
+def import_contract_requests(file, user=None, batch_size=IMPORT_BATCH_SIZE, dry_run=False):
+    """
+    Import the contract requests of a file with the layout of the export: the file is validated at once, then the
+    valid rows are inserted by batches. The company of the contract requests is the company of their speaker.
+
+    :param file: uploaded XLSX or CSV file
+    :param User user: user recorded in the status history
+    :param int batch_size: number of rows by INSERT
+    :param bool dry_run: only validate the file
+    :return: :class:`ImportReport`
+    """
+    validator = validate_contract_requests(read_table(file))
+    values = validator.valid_values()
+    if dry_run or values.empty:
+        return validator.report()
+
+    companies = dict(Speaker.objects.filter(id__in=set(values['speaker_id'])).values_list('id', 'company_id'))
+    contract_requests = []
+    for row in values[list(CONTRACT_REQUEST_FIELDS)].to_dict('records'):
+        data = {key: None if pandas.isna(value) else value for key, value in row.items()}
+        data['started_at'], data['ended_at'] = data['started_at'].to_pydatetime(), data['ended_at'].to_pydatetime()
+        contract_requests.append(ContractRequest(**data, company_id=companies.get(data['speaker_id'])))
+
+    for start in range(0, len(contract_requests), batch_size):
+        created = ContractRequest.objects.bulk_create(contract_requests[start:start + batch_size])
+        record_transitions([Transition(contract.id, None, contract.status_id) for contract in created], user)
+    assign_discipline_speakers({contract.discipline_id: contract.speaker_id for contract in contract_requests})
+    return validator.report(len(contract_requests))
+
+
+# Columns of the CSV files of the parameters and of the schools, in their order in the files
+LABEL_COLUMNS = ['Nom']
+STATUS_COLUMNS = ['Nom', 'Position', 'Couleur', 'Type']
+SCHOOL_COLUMNS = ['Nom', 'Nom complet']
+SCHOOL_YEAR_COLUMNS = ['Ecole', 'Promotion', 'Nom', 'Initial', 'Alternant']
+# Values of the speakers files: civilities and expertise levels
+CIVILITIES = {'m.': Speaker.MEN, 'm': Speaker.MEN, 'mme': Speaker.WOMEN, 'mme.': Speaker.WOMEN}
+EXPERTISE_LEVELS = {
+    **{label.lower(): level for level, label in LEVELS},
+    'd': BEGINNER, 'confirmé': INTERMEDIATE, 'c': INTERMEDIATE, 'e': EXPERT
+}
+SPEAKER_FIELDS = (
+    'civility', 'last_name', 'first_name', 'company_type', 'company', 'phone_number', 'mail', 'highest_degree',
+    'main_area_of_expertise', 'second_area_of_expertise', 'third_area_of_expertise', 'teaching_expertise_level',
+    'professional_expertise_level'
+)
+MAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+
+def positional_columns(frame, count):
+    """ Names of the first columns of a file read by position, the missing columns get a placeholder name """
+    return [frame.columns[index] if index < len(frame.columns) else f'Colonne {index + 1}' for index in range(count)]
+
+
+def existing_labels(model, field='label'):
+    return {str(value).strip().lower() for value in model.objects.values_list(field, flat=True)}
+
+
+def validate_labels(frame, model):
+    """ Check a file of labels of a parameter table: labels are required and unique """
+    validator = FrameValidator(frame, first_line=1)
+    label = validator.text('Nom')
+    validator.required(label, 'Nom')
+    validator.unique(label, 'Nom', existing_labels(model))
+    validator.values['label'] = label
+    return validator
+
+
+def validate_statuses(frame):
+    """ Check a file of statuses: label and color are unique, the type is given by its code or its label """
+    validator = validate_labels(frame, Status)
+    color = validator.text('Couleur')
+    color = color.where((color == '') | color.str.startswith('#'), '#' + color)
+    validator.required(color, 'Couleur')
+    validator.unique(color, 'Couleur', existing_labels(Status, 'color'))
+    validator.add_errors(color.str.len() > Status._meta.get_field('color').max_length, 'Couleur', "Couleur invalide")
+    validator.values['color'] = color
+    validator.number('position', 'Position', positive=False)
+    position = validator.values['position']
+    validator.add_errors(position.notna() & ((position < 0) | (position % 1 != 0)), 'Position', "Position invalide")
+    validator.resolve('type', 'Type', {
+        **{str(value): value for value, _ in STATUS_CHOICES}, **{label: value for value, label in STATUS_CHOICES}
+    })
+    return validator
+
+
+@transaction.atomic
+def import_labels(file, model, dry_run=False):
+    """
+    Import a CSV file of labels of a parameter table, or of statuses: name; position; color; type
+
+    :param file: uploaded CSV file
+    :param model: model of the parameter table
+    :param bool dry_run: only validate the file
+    :return: :class:`ImportReport`
+    """
+    if model is Status:
+        validator = validate_statuses(read_csv_rows(file, STATUS_COLUMNS))
+    else:
+        validator = validate_labels(read_csv_rows(file, LABEL_COLUMNS), model)
+    if dry_run:
+        return validator.report()
+    created = model.objects.bulk_create([model(**row) for row in validator.valid_values().to_dict('records')])
+    if model is Status:
+        invalidate_workflow()
+    return validator.report(len(created))
+
+
+def validate_schools(frame):
+    validator = FrameValidator(frame, first_line=1)
+    label = validator.text('Nom')
+    validator.required(label, 'Nom')
+    validator.add_errors(label.str.len() > School._meta.get_field('label').max_length, 'Nom', "Nom trop long")
+    validator.unique(label, 'Nom', existing_labels(School))
+    full_name = validator.text('Nom complet')
+    validator.values['label'], validator.values['full_name'] = label, full_name.where(full_name != '')
+    return validator
+
+
+@transaction.atomic
+def import_schools(file, dry_run=False):
+    """ Import a CSV file of schools: label; full name """
+    validator = validate_schools(read_csv_rows(file, SCHOOL_COLUMNS))
+    if dry_run:
+        return validator.report()
+    created = School.objects.bulk_create([
+        School(label=row['label'], full_name=None if pandas.isna(row['full_name']) else row['full_name'])
+        for row in validator.valid_values().to_dict('records')
+    ])
+    return validator.report(len(created))
+
+
+def validate_school_years(frame):
+    """
+    Check a file of school years: the school exists and the year is unique in each school. The schools and the
+    school years of the schools of the file are fetched once and compared in memory.
+    """
+    validator = FrameValidator(frame, first_line=1)
+    validator.resolve('school_id', 'Ecole', label_lookup(School))
+    year = validator.text('Promotion')
+    validator.required(year, 'Promotion')
+    validator.max_length(year, 'Promotion', SchoolYear, 'year')
+    existing = SchoolYear.objects.filter(school_id__in=validator.values['school_id'].dropna().unique().tolist()) \
+        .values_list('school_id', 'year')
+    keys = pandas.Series(list(zip(validator.values['school_id'], year.str.lower())), index=frame.index)
+    validator.add_errors((year != '') & keys.duplicated(), 'Promotion', "Promotion en double dans le fichier")
+    validator.add_errors(
+        keys.isin({(school_id, value.strip().lower()) for school_id, value in existing}), 'Promotion',
+        "La promotion existe déjà dans l'école"
+    )
+    label = validator.text('Nom')
+    validator.max_length(label, 'Nom', SchoolYear, 'label')
+    validator.values['year'], validator.values['label'] = year, label.where(label != '')
+    validator.boolean('initial', 'Initial')
+    validator.boolean('alternating', 'Alternant')
+    validator.add_errors(
+        ~validator.values['initial'] & ~validator.values['alternating'], 'Alternant',
+        "Une classe doit possède au moins des initiaux ou des alternants ou les deux"
+    )
+    return validator
+
+
+@transaction.atomic
+def import_school_years(file, dry_run=False):
+    """
+    Import a CSV file of school years: school; year; label; initial; alternating. The rules of SchoolYear.clean are
+    checked by the validation so the valid rows are inserted at once.
+    """
+    validator = validate_school_years(read_csv_rows(file, SCHOOL_YEAR_COLUMNS))
+    if dry_run:
+        return validator.report()
+    created = SchoolYear.objects.bulk_create([
+        SchoolYear(**{key: None if pandas.isna(value) else value for key, value in row.items()})
+        for row in validator.valid_values().to_dict('records')
+    ])
+    return validator.report(len(created))
+
+
+def validate_speakers(frame, mails=None, seen_mails=None):
+    """
+    Check a file of speakers read by position: civility, last name, first name, company type, company, phone number,
+    mail, diploma, three areas of expertise, teaching and professional expertise levels
+
+    :param pandas.DataFrame frame: the whole file or one of its chunks
+    :param set mails: normalized mails of the existing speakers
+    :param set seen_mails: normalized mails of the previous chunks
+    """
+    validator = FrameValidator(frame)
+    columns = dict(zip(SPEAKER_FIELDS, positional_columns(frame, len(SPEAKER_FIELDS))))
+    validator.resolve('civility', columns['civility'], CIVILITIES)
+    for field in ('last_name', 'first_name'):
+        validator.values[field] = validator.text(columns[field])
+        validator.required(validator.values[field], columns[field])
+    mail = validator.text(columns['mail'])
+    empty = validator.required(mail, columns['mail'])
+    validator.add_errors(~empty & ~mail.str.match(MAIL_PATTERN), columns['mail'], "Mail invalide")
+    validator.unique(
+        mail, columns['mail'], existing_labels(Speaker, 'mail') if mails is None else mails, seen_mails
+    )
+    validator.values['mail'] = mail
+    phone_number = validator.text(columns['phone_number'])
+    validator.values['phone_number'] = phone_number.where(phone_number.str.len() != 9, '0' + phone_number)
+    for field in ('company_type', 'company', 'highest_degree', 'main_area_of_expertise', 'second_area_of_expertise',
+                  'third_area_of_expertise'):
+        validator.values[field] = validator.text(columns[field])
+    for field in ('first_name', 'last_name', 'mail', 'highest_degree', 'main_area_of_expertise',
+                  'second_area_of_expertise', 'third_area_of_expertise'):
+        validator.max_length(validator.values[field], columns[field], Speaker, field)
+    validator.max_length(validator.values['company'], columns['company'], Company, 'label')
+    validator.max_length(validator.values['company_type'], columns['company_type'], CompanyType, 'label')
+    for field in ('teaching_expertise_level', 'professional_expertise_level'):
+        validator.resolve(field, columns[field], EXPERTISE_LEVELS, required=False)
+    return validator
+
+
+def import_speakers(file, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, progress=None, checkpoint=None, resume=0):
+    """
+    Import an Excel file of speakers, the companies are created with their speakers. The workbook is streamed by
+    chunks of rows: each chunk is validated and its valid rows are inserted in one transaction, so the memory used
+    does not depend on the size of the file.
+
+    :param file: uploaded Excel file or its path
+    :param bool dry_run: only validate the file
+    :param int chunk_size: number of rows by chunk
+    :param progress: called after each chunk with the number of rows read, the estimated number of rows of the file
+        and the :class:`ImportReport` of the rows read
+    :param checkpoint: called in the transaction of each chunk with the number of rows of the file committed and the
+        number of speakers imported
+    :param int resume: number of rows of the file already committed by an interrupted import, they are skipped
+    :return: :class:`ImportReport` and the list of the potential duplicates of the created speakers and companies
+    """
+    mails, seen_mails = existing_labels(Speaker, 'mail'), set()
+    companies, company_types = label_lookup(Company), label_lookup(CompanyType)
+    companies_index, speakers_index = DuplicateIndex(company_records()), DuplicateIndex(speaker_records())
+    report, duplicates = ImportReport(0, 0, 0, []), []
+
+    workbook = open_workbook(file)
+    try:
+        sheet = workbook.worksheets[0]
+        for frame in read_sheet_chunks(sheet, chunk_size):
+            if frame.index[-1] + 1 <= resume:
+                continue
+            validator = validate_speakers(frame, mails, seen_mails)
+            rows = [
+                {key: None if pandas.isna(value) or value == '' else value for key, value in row.items()}
+                for row in validator.valid_values().to_dict('records')
+            ]
+            if not dry_run:
+                with transaction.atomic():
+                    if rows:
+                        duplicates += create_speakers(rows, companies, company_types, companies_index, speakers_index)
+                    if checkpoint:
+                        checkpoint(frame.index[-1] + 1, report.imported + len(rows))
+            report = merge_reports(report, validator.report(0 if dry_run else len(rows)))
+            if progress:
+                progress(frame.index[-1] + 1, estimated_rows(sheet), report)
+    finally:
+        workbook.close()
+    return report, duplicates
+
+
+def create_speakers(rows, companies, company_types, companies_index, speakers_index):
+    """
+    Insert speakers with a single INSERT, their missing companies and company types are created before them
+
+    :param list rows: dict of the values of each speaker, with the labels of its company and company type
+    :param dict companies: id of the companies by normalized label, completed with the created companies
+    :param dict company_types: id of the company types by normalized label, completed with the created types
+    :param DuplicateIndex companies_index:
+    :param DuplicateIndex speakers_index:
+    :return: list of the potential duplicates of the created speakers and companies
+    """
+    new_types = {}
+    for row in rows:
+        if row['company_type']:
+            new_types.setdefault(row['company_type'].lower(), row['company_type'])
+    created = CompanyType.objects.bulk_create([
+        CompanyType(label=label) for key, label in new_types.items() if key not in company_types
+    ])
+    company_types.update({company_type.label.lower(): company_type.id for company_type in created})
+
+    new_companies = {}
+    for row in rows:
+        if row['company'] and row['company'].lower() not in companies:
+            new_companies.setdefault(row['company'].lower(), Company(
+                label=row['company'],
+                company_type_id=company_types.get((row['company_type'] or '').lower())
+            ))
+    duplicates = []
+    for company in Company.objects.bulk_create(new_companies.values()):
+        companies[company.label.lower()] = company.id
+        record = company_record(company.id, company.label)
+        duplicates += companies_index.find(record)
+        companies_index.add(record)
+
+    speakers = Speaker.objects.bulk_create([
+        Speaker(
+            company_id=companies.get((row['company'] or '').lower()),
+            **{key: value for key, value in row.items() if key not in ('company', 'company_type')}
+        )
+        for row in rows
+    ])
+    index_speaker_skills(speakers)
+    for speaker, row in zip(speakers, rows):
+        record = speaker_record(speaker.id, speaker.first_name, speaker.last_name, row['phone_number'])
+        duplicates += speakers_index.find(record)
+        speakers_index.add(record)
+    return duplicates
+
+
+def validate_disciplines(frame):
+    """
+    Check a sheet of disciplines read by position: the schools of the first column must exist, the disciplines of
+    the fourth column are created in each school of the sheet
+    """
+    validator = FrameValidator(frame)
+    school_column, label_column = positional_columns(frame, 4)[0::3]
+    validator.resolve('school_id', school_column, label_lookup(School), required=False)
+    validator.values['label'] = validator.text(label_column)
+    validator.max_length(validator.values['label'], label_column, Discipline, 'label')
+    return validator
+
+
+def import_disciplines(file, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE, progress=None, checkpoint=None,
+                       resume=0):
+    """
+    Import an Excel file of disciplines, every discipline of a sheet is created in every school of the sheet. Each
+    sheet is streamed by chunks of rows to collect its valid schools and disciplines, then the disciplines are
+    inserted by chunks.
+
+    :param file: uploaded Excel file or its path
+    :param bool dry_run: only validate the file
+    :param int chunk_size: number of rows by chunk and of disciplines by INSERT
+    :param progress: called after each chunk with the number of rows read, the estimated number of rows of the file
+        and the :class:`ImportReport` of the rows read
+    :param checkpoint: called in the transaction of each INSERT with the number of disciplines of the file committed
+        and the number of disciplines imported
+    :param int resume: number of disciplines of the file already committed by an interrupted import, they are skipped
+    :return: :class:`ImportReport`
+    """
+    report, processed, committed = ImportReport(0, 0, 0, []), 0, 0
+    workbook = open_workbook(file)
+    try:
+        total = sum(estimated_rows(sheet) for sheet in workbook.worksheets)
+        for sheet in workbook.worksheets:
+            schools, labels = {}, {}
+            for frame in read_sheet_chunks(sheet, chunk_size):
+                validator = validate_disciplines(frame)
+                sheet_report = validator.report()
+                report = merge_reports(report, sheet_report._replace(errors=[
+                    error._replace(column=f'{sheet.title} - {error.column}') for error in sheet_report.errors
+                ]))
+                values = validator.valid_values()
+                schools.update(dict.fromkeys(int(school_id) for school_id in values['school_id'].dropna()))
+                labels.update(dict.fromkeys(label for label in values['label'] if label))
+                if progress:
+                    progress(processed + frame.index[-1] + 1, total, report)
+            processed += estimated_rows(sheet)
+            if dry_run:
+                continue
+
+            disciplines = [Discipline(school_id=school_id, label=label) for school_id in schools for label in labels]
+            skipped = min(max(resume - committed, 0), len(disciplines))
+            committed += skipped
+            for chunk in chunks(disciplines[skipped:], chunk_size):
+                with transaction.atomic():
+                    Discipline.objects.bulk_create(chunk)
+                    committed += len(chunk)
+                    report = report._replace(imported=report.imported + len(chunk))
+                    if checkpoint:
+                        checkpoint(committed, report.imported)
+                if progress:
+                    progress(processed, total, report)
+    finally:
+        workbook.close()
+    return report
@@ -0,0 +1,215 @@
+import datetime
+import hashlib
+import os
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from nifleur.duplicates import duplicates_message
+from nifleur.imports import import_disciplines, import_speakers
+from nifleur.models import ImportJob, ImportRun
+
+# Job queued for an uploaded file, or previous run of the identical file when the upload is short-circuited
+SpooledImport = namedtuple('SpooledImport', ['job', 'previous'])
+# A running job without progress for this time lost its worker
+STALE_JOB_TIMEOUT = datetime.timedelta(minutes=10)
+INTERRUPTED_MESSAGE = "Le traitement de l'import a été interrompu, envoyez à nouveau le fichier pour le reprendre"
+
+
+def run_speakers_import(path, dry_run, progress, checkpoint, resume):
+    report, duplicates = import_speakers(
+        path, dry_run=dry_run, progress=progress, checkpoint=checkpoint, resume=resume
+    )
+    return report, duplicates_message(duplicates) if duplicates else ''
+
+
+def run_disciplines_import(path, dry_run, progress, checkpoint, resume):
+    return import_disciplines(path, dry_run=dry_run, progress=progress, checkpoint=checkpoint, resume=resume), ''
+
+
+# Import of each kind of job: called with the path of the file, the dry run flag, the progress and checkpoint
+# callbacks and the position to resume from
+IMPORTERS = {
+    ImportJob.SPEAKERS: run_speakers_import,
+    ImportJob.DISCIPLINES: run_disciplines_import,
+}
+
+
+def recent_import_jobs(user, kind, days=1):
+    """ Last imports of a user, the pending and running ones are followed by the page """
+    return ImportJob.objects.filter(
+        user=user, kind=kind, created_at__gte=timezone.now() - datetime.timedelta(days=days)
+    ).order_by('-created_at')[:5]
+
+
+def import_job_progress_data(job):
+    """ Progress of a job for the page polling it: rows done and total, errors and final summary """
+    return {
+        'status': job.status,
+        'status_label': job.get_status_display(),
+        'finished': job.finished,
+        'dry_run': job.dry_run,
+        'rows': job.rows,
+        'valid': job.valid,
+        'processed': job.processed,
+        'imported': job.imported,
+        'errors': job.error_count,
+        'message': job.message,
+        'report_url': reverse('import_job_report', args=[job.id]) if job.finished and job.errors else None
+    }
+
+
+def spool_import_job(file, kind, user, dry_run=False, force=False):
+    """
+    Write an uploaded file on disk by chunks and queue its import for the run_import_worker command. The SHA-256 of
+    the file is computed while it is written: a file being imported is not queued again, nor a file already imported
+    unless forced. The import of a file interrupted by a failure resumes after its committed rows, even if forced. The
+    dry runs are always queued and are not recorded.
+
+    :param file: uploaded file
+    :param str kind: one of ImportJob.KINDS
+    :param User user:
+    :param bool dry_run: only validate the file
+    :param bool force: import the file even if it was already imported
+    :return: :class:`SpooledImport` with the created :class:`ImportJob` and the previous :class:`ImportRun` of the
+        file if its import is resumed, or only with the previous :class:`ImportRun` if the file is not imported again
+    """
+    os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(settings.IMPORT_SPOOL_DIR, f'{uuid.uuid4().hex}{os.path.splitext(file.name)[1].lower()}')
+    if getattr(file, 'sha256', None):
+        # Already written in the spool directory and hashed by ImportUploadHandler
+        file_move_safe(file.temporary_file_path(), path)
+        sha256 = file.sha256
+    else:
+        digest = hashlib.sha256()
+        with open(path, 'wb') as spool:
+            for chunk in file.chunks():
+                digest.update(chunk)
+                spool.write(chunk)
+        sha256 = digest.hexdigest()
+
+    if not dry_run:
+        # The running imports of a stopped worker can be resumed
+        fail_stale_import_jobs()
+    try:
+        with transaction.atomic():
+            previous = None if dry_run else ImportRun.objects.select_for_update(of=('self',)) \
+                .select_related('job').filter(kind=kind, sha256=sha256).order_by('-created_at').first()
+            if previous is not None and not previous.interrupted:
+                if not force or not previous.finished:
+                    os.remove(path)
+                    return SpooledImport(None, previous)
+                previous = None
+
+            job = ImportJob.objects.create(kind=kind, name=file.name, path=path, dry_run=dry_run, user=user)
+            if previous is not None:
+                previous.job = job
+                previous.save(update_fields=['job'])
+            elif not dry_run:
+                ImportRun.objects.create(kind=kind, sha256=sha256, name=file.name, job=job, user=user)
+            return SpooledImport(job, previous)
+    except IntegrityError:
+        # The same file was uploaded at the same time, its import is already queued
+        os.remove(path)
+        return SpooledImport(None, ImportRun.objects.get(kind=kind, sha256=sha256, finished_at__isnull=True))
+
+
+@transaction.atomic
+def fail_stale_import_jobs():
+    """
+    Fail the running jobs without progress since STALE_JOB_TIMEOUT: their worker was stopped while it imported them.
+    Their spooled file is deleted.
+
+    :return: number of failed jobs
+    """
+    now = timezone.now()
+    jobs = list(ImportJob.objects.select_for_update(skip_locked=True).filter(
+        status=ImportJob.RUNNING, heartbeat_at__lt=now - STALE_JOB_TIMEOUT
+    ))
+    for job in jobs:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+    return ImportJob.objects.filter(id__in=[job.id for job in jobs]).update(
+        status=ImportJob.FAILED, message=INTERRUPTED_MESSAGE, finished_at=now
+    )
+
+
+@transaction.atomic
+def claim_import_job():
+    """
+    Oldest pending job, marked as running. The row is locked so concurrent workers never claim the same job. The
+    running jobs of the stopped workers are failed first.
+    """
+    fail_stale_import_jobs()
+    job = ImportJob.objects.select_for_update(skip_locked=True).filter(status=ImportJob.PENDING) \
+        .order_by('created_at', 'id').first()
+    if job is not None:
+        job.status, job.started_at = ImportJob.RUNNING, timezone.now()
+        job.heartbeat_at = job.started_at
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def finish_import_job(job, **fields):
+    """
+    Save the result of a running job, unless it was failed meanwhile by :func:`fail_stale_import_jobs`
+
+    :param ImportJob job: updated with the saved fields, or reloaded if it is not running anymore
+    :return: True if the result was saved
+    """
+    if ImportJob.objects.filter(id=job.id, status=ImportJob.RUNNING).update(**fields):
+        for field, value in fields.items():
+            setattr(job, field, value)
+        return True
+    job.refresh_from_db()
+    return False
+
+
+def run_import_job(job):
+    """
+    Import the spooled file of a job, the progress is saved after each chunk of rows so the page can poll it: rows
+    read over the estimated number of rows of the file, valid rows, imported rows and number of errors found so far.
+    The list of the errors is only saved once the job is finished. The spooled file is deleted once the job is
+    processed.
+
+    :param ImportJob job: running job
+    """
+    def progress(processed, rows, report):
+        ImportJob.objects.filter(id=job.id).update(
+            processed=processed, rows=max(rows, processed), valid=report.valid, imported=report.imported,
+            error_count=len(report.errors), heartbeat_at=timezone.now()
+        )
+
+    run = None if job.dry_run else ImportRun.objects.filter(job=job).first()
+    resume, imported = (run.committed, run.imported or 0) if run else (0, 0)
+
+    def checkpoint(committed, job_imported):
+        ImportRun.objects.filter(id=run.id).update(committed=committed, imported=imported + job_imported)
+
+    try:
+        report, message = IMPORTERS[job.kind](job.path, job.dry_run, progress, checkpoint if run else None, resume)
+    except Exception as error:
+        # The run keeps the committed rows, the import resumes after them when the file is uploaded again
+        finish_import_job(job, status=ImportJob.FAILED, message=str(error), finished_at=timezone.now())
+    else:
+        if resume:
+            message = f"Import repris après une interruption. {message}".strip()
+        errors = [list(error) for error in report.errors]
+        finished = finish_import_job(
+            job, status=ImportJob.DONE, message=message, finished_at=timezone.now(), rows=report.total,
+            valid=report.valid, processed=report.total, imported=report.imported, errors=errors, error_count=len(errors)
+        )
+        if finished:
+            ImportRun.objects.filter(job=job).update(
+                rows=job.rows, imported=imported + job.imported, errors=len(job.errors), message=job.message,
+                finished_at=job.finished_at
+            )
+    finally:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+    return job
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from nifleur.duplicates import find_duplicate_companies, find_duplicate_speakers, DUPLICATE_THRESHOLD
+
+SEARCHES = {
+    'company': ('sociétés', find_duplicate_companies),
+    'speaker': ('intervenants', find_duplicate_speakers)
+}
+
+
+class Command(BaseCommand):
+    help = "Liste les sociétés et les intervenants qui sont probablement des doublons"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=SEARCHES.keys(), help="Ne chercher que ce type de doublons")
+        parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD, help="Similarité minimale (0-1)")
+
+    def handle(self, *args, **options):
+        for model, (label, find_duplicates) in SEARCHES.items():
+            if options['model'] and options['model'] != model:
+                continue
+            duplicates = find_duplicates(options['threshold'])
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{len(duplicates)} doublons potentiels de {label}"))
+            for duplicate in duplicates:
+                self.stdout.write(
+                    f"{duplicate.score:.2f} : {duplicate.record.label} (#{duplicate.record.id}) "
+                    f"~ {duplicate.other.label} (#{duplicate.other.id})"
+                )
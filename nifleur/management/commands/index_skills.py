@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from nifleur.models import Speaker, index_speaker_skills
+
+
+class Command(BaseCommand):
+    help = "Construit l'index des compétences à partir des domaines de compétence des intervenants"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        speakers = Speaker.objects.only('id', *Speaker.EXPERTISE_FIELDS).order_by('id')
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(speakers.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            index_speaker_skills(batch)
+            total += len(batch)
+            last_id = batch[-1].id
+        self.stdout.write(self.style.SUCCESS(f"Les compétences de {total} intervenants ont été indexées"))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nifleur.forms import RolloverForm
+from nifleur.rollover import rollover_school_year
+from nifleur.workflow import TransitionError
+
+
+class Command(BaseCommand):
+    help = "Reconduit les matières et les demandes de contrat d'une promotion dans une autre promotion"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', type=int, help="Identifiant de la promotion à reconduire")
+        parser.add_argument('target', type=int, help="Identifiant de la nouvelle promotion")
+        parser.add_argument('started_at', help="Début de la période des contrats à reconduire (AAAA-MM-JJ)")
+        parser.add_argument('ended_at', help="Fin (exclue) de la période des contrats à reconduire (AAAA-MM-JJ)")
+        parser.add_argument('target_started_at', help="Début de la nouvelle période des contrats (AAAA-MM-JJ)")
+        parser.add_argument('--disciplines-only', action='store_true', help="Ne reconduit que les matières")
+
+    def handle(self, *args, **options):
+        form = RolloverForm({
+            'source': options['source'],
+            'target': options['target'],
+            'started_at': options['started_at'],
+            'ended_at': options['ended_at'],
+            'target_started_at': options['target_started_at'],
+            'contracts': not options['disciplines_only']
+        })
+        if not form.is_valid():
+            raise CommandError(' '.join(error for errors in form.errors.values() for error in errors))
+
+        try:
+            rollover = rollover_school_year(
+                form.cleaned_data['source'],
+                form.cleaned_data['target'],
+                form.cleaned_data['started_at'],
+                form.cleaned_data['ended_at'],
+                form.cleaned_data['target_started_at'],
+                contracts=form.cleaned_data['contracts']
+            )
+        except TransitionError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"{rollover.disciplines} matières et {rollover.contracts} demandes de contrat ont été reconduites"
+        ))
+        if rollover.overlapping:
+            self.stdout.write(self.style.WARNING(
+                f"{rollover.overlapping} demandes de contrat n'ont pas été reconduites, leur intervenant a déjà un "
+                f"contrat sur la nouvelle période"
+            ))
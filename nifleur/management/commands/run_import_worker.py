@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nifleur.jobs import claim_import_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Traite les imports de fichiers en attente, en continu ou jusqu'à ce qu'il n'y en ait plus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="S'arrêter quand il n'y a plus d'import en attente")
+        parser.add_argument('--sleep', type=float, default=2, help="Secondes d'attente entre deux recherches d'import")
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_import_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f"Import #{job.id} : {job.name}")
+            job = run_import_job(job)
+            if job.status == job.FAILED:
+                self.stderr.write(f"Import #{job.id} échoué : {job.message}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Import #{job.id} terminé : {job.imported} lignes importées, {len(job.errors)} erreurs"
+                ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from nifleur.conflicts import find_speaker_conflicts
+from nifleur.models import Speaker
+from nifleur.utils import short_datetime
+
+
+class Command(BaseCommand):
+    help = "Liste les demandes de contrat d'un même intervenant dont les périodes se chevauchent"
+
+    def handle(self, *args, **options):
+        conflicts = find_speaker_conflicts()
+        if not conflicts:
+            self.stdout.write(self.style.SUCCESS("Aucun chevauchement de contrats"))
+            return
+
+        speakers = Speaker.objects.in_bulk({conflict.speaker_id for conflict in conflicts})
+        for conflict in conflicts:
+            self.stdout.write(
+                f"{speakers[conflict.speaker_id]} : contrats {conflict.contract_id} et {conflict.other_contract_id} "
+                f"du {short_datetime(conflict.started_at)} au {short_datetime(conflict.ended_at)}"
+            )
+        self.stdout.write(self.style.WARNING(
+            f"{len(conflicts)} chevauchements pour {len(speakers)} intervenants"
+        ))
@@ -0,0 +1,76 @@
+from django.db import transaction
+
+from nifleur.models import Company, Speaker, ContractRequest, Discipline
+
+COMPANY_FILLED_FIELDS = ('company_type_id', 'relation_mail', 'relation_phone_number')
+SPEAKER_FILLED_FIELDS = (
+    'company_id', 'phone_number', 'highest_degree', 'main_area_of_expertise', 'second_area_of_expertise',
+    'third_area_of_expertise', 'teaching_expertise_level', 'professional_expertise_level'
+)
+
+
+def fill_empty_fields(target, duplicates, fields):
+    """
+    Copy on the target the values of its empty fields from the duplicates
+
+    :return: list of the filled fields
+    """
+    filled = []
+    for field in fields:
+        if getattr(target, field) in (None, ''):
+            for duplicate in duplicates:
+                value = getattr(duplicate, field)
+                if value not in (None, ''):
+                    setattr(target, field, value)
+                    filled.append(field)
+                    break
+    return filled
+
+
+@transaction.atomic
+def merge_companies(target, duplicates):
+    """
+    Merge companies into the target: every contract request and speaker of the duplicates is moved to the target,
+    the empty fields of the target are filled from the duplicates then the duplicates are deleted.
+
+    :param Company target:
+    :param list duplicates: companies to merge into the target
+    :return: number of deleted companies
+    """
+    ids = [company.id for company in duplicates if company.id != target.id]
+    duplicates = list(Company.objects.select_for_update().filter(id__in=ids).order_by('id'))
+    if not duplicates:
+        return 0
+
+    ContractRequest.objects.filter(company_id__in=ids).update(company=target)
+    Speaker.objects.filter(company_id__in=ids).update(company=target)
+    # Unique fields are copied once the duplicates are deleted
+    filled = fill_empty_fields(target, duplicates, COMPANY_FILLED_FIELDS)
+    deleted = Company.objects.filter(id__in=ids).delete()[1].get(Company._meta.label, 0)
+    if filled:
+        target.save(update_fields=filled)
+    return deleted
+
+
+@transaction.atomic
+def merge_speakers(target, duplicates):
+    """
+    Merge speakers into the target: every contract request and discipline of the duplicates is moved to the target,
+    the empty fields of the target are filled from the duplicates then the duplicates are deleted.
+
+    :param Speaker target:
+    :param list duplicates: speakers to merge into the target
+    :return: number of deleted speakers
+    """
+    ids = [speaker.id for speaker in duplicates if speaker.id != target.id]
+    duplicates = list(Speaker.objects.select_for_update().filter(id__in=ids).order_by('id'))
+    if not duplicates:
+        return 0
+
+    ContractRequest.objects.filter(speaker_id__in=ids).update(speaker=target)
+    Discipline.objects.filter(speaker_id__in=ids).update(speaker=target)
+    filled = fill_empty_fields(target, duplicates, SPEAKER_FILLED_FIELDS)
+    deleted = Speaker.objects.filter(id__in=ids).delete()[1].get(Speaker._meta.label, 0)
+    if filled:
+        target.save(update_fields=filled)
+    return deleted
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:05
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import nifleur.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0003_alter_discipline_school_year'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contractrequest',
+            index=django.contrib.postgres.indexes.GistIndex(nifleur.models.TsTzRange('started_at', 'ended_at'), name='contract_request_period_gist'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0004_contractrequest_period_gist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Skill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('label', models.CharField(max_length=100, unique=True, verbose_name='Nom')),
+            ],
+            options={
+                'verbose_name': 'Compétence',
+                'verbose_name_plural': 'Compétences',
+            },
+        ),
+        migrations.CreateModel(
+            name='SpeakerSkill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rang')),
+                ('skill', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='speakers', to='nifleur.skill', verbose_name='Compétence')),
+                ('speaker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='skills', to='nifleur.speaker', verbose_name='Intervenant')),
+            ],
+            options={
+                'verbose_name': "Compétence d'un intervenant",
+                'verbose_name_plural': 'Compétences des intervenants',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='speakerskill',
+            constraint=models.UniqueConstraint(fields=('skill', 'speaker'), name='unique_speaker_skill'),
+        ),
+    ]
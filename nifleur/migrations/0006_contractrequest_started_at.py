@@ -0,0 +1,17 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0005_skill_speakerskill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contractrequest',
+            index=models.Index(fields=['started_at'], name='contract_request_started_at'),
+        ),
+    ]
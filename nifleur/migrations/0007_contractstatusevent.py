@@ -0,0 +1,41 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('nifleur', '0006_contractrequest_started_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('contract', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='nifleur.contractrequest', verbose_name='Demande de contrat')),
+                ('from_status', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='nifleur.status', verbose_name='Statut précédent')),
+                ('to_status', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='nifleur.status', verbose_name='Nouveau statut')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Changement de statut',
+                'verbose_name_plural': 'Changements de statut',
+                'indexes': [models.Index(fields=['contract', 'created_at'], name='status_event_contract_date')],
+            },
+        ),
+        # The existing contract requests entered their current status at their last update at the latest
+        migrations.RunSQL(
+            """
+            INSERT INTO nifleur_contractstatusevent (contract_id, to_status_id, created_at)
+            SELECT id, status_id, updated_at FROM nifleur_contractrequest
+            """,
+            migrations.RunSQL.noop
+        ),
+    ]
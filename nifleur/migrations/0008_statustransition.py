@@ -0,0 +1,59 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_transitions(apps, schema_editor):
+    """ Transitions matching the previous behaviour, based on the positions of the statuses """
+    Status = apps.get_model('nifleur', 'Status')
+    StatusTransition = apps.get_model('nifleur', 'StatusTransition')
+    statuses = list(Status.objects.order_by('position', 'id'))
+    if not statuses:
+        return
+    close_statuses = sorted((status for status in statuses if status.type == 3), key=lambda status: status.id)
+    initial = next((status for status in statuses if status.position == 4), statuses[0])
+
+    transitions = [StatusTransition(action='create', to_status=initial)]
+    for index, status in enumerate(statuses):
+        if index > 0:
+            transitions.append(StatusTransition(from_status=status, action='reset', to_status=statuses[0]))
+            transitions.append(StatusTransition(from_status=status, action='back', to_status=statuses[index - 1]))
+        if index < len(statuses) - 1:
+            transitions.append(StatusTransition(from_status=status, action='next', to_status=statuses[index + 1]))
+        for action, target in (('finish', close_statuses[:1]), ('cancel', close_statuses[-1:])):
+            if target and target[0] != status:
+                transitions.append(StatusTransition(from_status=status, action=action, to_status=target[0]))
+    StatusTransition.objects.bulk_create(transitions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0007_contractstatusevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('create', 'Création'), ('reset', 'Revenir au début'), ('back', 'Précédent'), ('next', 'Suivant'), ('finish', 'Terminer le contrat'), ('cancel', 'Annuler le contrat')], max_length=10, verbose_name='Action')),
+                ('from_status', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='nifleur.status', verbose_name='Statut de départ')),
+                ('to_status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transitions', to='nifleur.status', verbose_name="Statut d'arrivée")),
+            ],
+            options={
+                'verbose_name': 'Transition de statut',
+                'verbose_name_plural': 'Transitions de statut',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statustransition',
+            constraint=models.UniqueConstraint(fields=('from_status', 'action'), name='unique_status_transition'),
+        ),
+        migrations.AddConstraint(
+            model_name='statustransition',
+            constraint=models.UniqueConstraint(condition=models.Q(('from_status__isnull', True)), fields=('action',), name='unique_initial_transition'),
+        ),
+        migrations.RunPython(create_transitions, migrations.RunPython.noop),
+    ]
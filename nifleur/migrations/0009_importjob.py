@@ -0,0 +1,43 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('nifleur', '0008_statustransition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('speakers', 'Intervenants'), ('disciplines', 'Matières')], max_length=20, verbose_name='Type')),
+                ('status', models.CharField(choices=[('pending', 'En attente'), ('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Echoué')], default='pending', max_length=10, verbose_name='Statut')),
+                ('name', models.CharField(max_length=255, verbose_name='Fichier')),
+                ('path', models.CharField(max_length=255, verbose_name='Chemin')),
+                ('dry_run', models.BooleanField(default=False, verbose_name='Vérification seule')),
+                ('rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Lignes')),
+                ('valid', models.PositiveIntegerField(blank=True, null=True, verbose_name='Lignes valides')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Lignes traitées')),
+                ('imported', models.PositiveIntegerField(default=0, verbose_name='Lignes importées')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='Erreurs')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Début')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Import',
+                'verbose_name_plural': 'Imports',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='import_job_status_date')],
+            },
+        ),
+    ]
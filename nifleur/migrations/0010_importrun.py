@@ -0,0 +1,39 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('nifleur', '0009_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('speakers', 'Intervenants'), ('disciplines', 'Matières')], max_length=20, verbose_name='Type')),
+                ('sha256', models.CharField(max_length=64, verbose_name='Empreinte SHA-256')),
+                ('name', models.CharField(max_length=255, verbose_name='Fichier')),
+                ('rows', models.PositiveIntegerField(blank=True, null=True, verbose_name='Lignes')),
+                ('imported', models.PositiveIntegerField(blank=True, null=True, verbose_name='Lignes importées')),
+                ('errors', models.PositiveIntegerField(blank=True, null=True, verbose_name='Erreurs')),
+                ('message', models.TextField(blank=True, verbose_name='Message')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('job', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='run', to='nifleur.importjob', verbose_name='Import')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Fichier importé',
+                'verbose_name_plural': 'Fichiers importés',
+                'indexes': [models.Index(fields=['kind', 'sha256'], name='import_run_kind_sha256')],
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.18 on 2026-10-19 14:49
+
+from django.db import migrations, models
+from django.db.models import F
+
+# The school of a discipline is filled with the school of its school year, and must match it
+DISCIPLINE_SCHOOL_TRIGGER = """
+    CREATE FUNCTION nifleur_discipline_school() RETURNS trigger AS $$
+    DECLARE
+        school_year_school_id bigint;
+    BEGIN
+        IF NEW.school_year_id IS NOT NULL THEN
+            SELECT school_id INTO school_year_school_id FROM nifleur_schoolyear WHERE id = NEW.school_year_id;
+            IF NEW.school_id IS NULL THEN
+                NEW.school_id := school_year_school_id;
+            ELSIF NEW.school_id IS DISTINCT FROM school_year_school_id THEN
+                RAISE EXCEPTION 'L''école % de la matière % n''est pas l''école % de sa classe %',
+                    NEW.school_id, NEW.id, school_year_school_id, NEW.school_year_id
+                    USING ERRCODE = 'check_violation';
+            END IF;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER nifleur_discipline_school BEFORE INSERT OR UPDATE OF school_id, school_year_id
+    ON nifleur_discipline FOR EACH ROW EXECUTE FUNCTION nifleur_discipline_school();
+
+    CREATE FUNCTION nifleur_schoolyear_school() RETURNS trigger AS $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM nifleur_discipline WHERE school_year_id = NEW.id AND school_id <> NEW.school_id) THEN
+            RAISE EXCEPTION 'La classe % a des matières d''une autre école que %', NEW.id, NEW.school_id
+                USING ERRCODE = 'check_violation';
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER nifleur_schoolyear_school AFTER UPDATE OF school_id
+    ON nifleur_schoolyear FOR EACH ROW EXECUTE FUNCTION nifleur_schoolyear_school();
+"""
+
+DROP_DISCIPLINE_SCHOOL_TRIGGER = """
+    DROP TRIGGER nifleur_schoolyear_school ON nifleur_schoolyear;
+    DROP FUNCTION nifleur_schoolyear_school();
+    DROP TRIGGER nifleur_discipline_school ON nifleur_discipline;
+    DROP FUNCTION nifleur_discipline_school();
+"""
+
+
+def check_existing_rows(apps, schema_editor):
+    """ List the rows violating the constraints: they must be corrected before the migration is applied again """
+    ContractRequest = apps.get_model('nifleur', 'ContractRequest')
+    Discipline = apps.get_model('nifleur', 'Discipline')
+    SchoolYear = apps.get_model('nifleur', 'SchoolYear')
+    checks = [
+        (
+            'Demandes de contrat finissant avant leur début',
+            ContractRequest.objects.filter(ended_at__lt=F('started_at'))
+        ),
+        ('Demandes de contrat sans volume horaire positif', ContractRequest.objects.filter(hourly_volume__lte=0)),
+        ('Demandes de contrat sans tarif positif', ContractRequest.objects.filter(applied_rate__lte=0)),
+        ('Classes sans initiaux ni alternants', SchoolYear.objects.filter(initial=False, alternating=False)),
+        (
+            "Matières d'une autre école que leur classe",
+            Discipline.objects.filter(school_year__isnull=False).exclude(school=F('school_year__school'))
+        ),
+    ]
+    violations = []
+    for label, queryset in checks:
+        ids = [str(pk) for pk in queryset.order_by('pk').values_list('pk', flat=True)]
+        if ids:
+            violations.append(f"{label} : {', '.join(ids)}")
+    if violations:
+        raise ValueError(
+            'Des lignes ne respectent pas les contraintes ajoutées, corrigez-les avant de migrer :\n'
+            + '\n'.join(violations)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0010_importrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_existing_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contractrequest',
+            constraint=models.CheckConstraint(check=models.Q(('ended_at__gte', models.F('started_at'))), name='contract_request_ended_after_started', violation_error_message='La fin du contrat doit être après son début'),
+        ),
+        migrations.AddConstraint(
+            model_name='contractrequest',
+            constraint=models.CheckConstraint(check=models.Q(('hourly_volume__gt', 0)), name='contract_request_positive_hourly_volume', violation_error_message='Le volume horaire doit être positif'),
+        ),
+        migrations.AddConstraint(
+            model_name='contractrequest',
+            constraint=models.CheckConstraint(check=models.Q(('applied_rate__gt', 0)), name='contract_request_positive_applied_rate', violation_error_message='Le tarif à appliquer doit être positif'),
+        ),
+        migrations.AddConstraint(
+            model_name='schoolyear',
+            constraint=models.CheckConstraint(check=models.Q(('initial', True), ('alternating', True), _connector='OR'), name='school_year_initial_or_alternating', violation_error_message='Une classe doit possède au moins des initiaux ou des alternants ou les deux'),
+        ),
+        migrations.RunSQL(DISCIPLINE_SCHOOL_TRIGGER, DROP_DISCIPLINE_SCHOOL_TRIGGER),
+    ]
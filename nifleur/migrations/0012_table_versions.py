@@ -0,0 +1,100 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Tables shown by the list pages answered with 304 Not Modified, their version is incremented by each write
+VERSIONED_TABLES = [
+    'avatar_avatar',
+    'nifleur_company',
+    'nifleur_companytype',
+    'nifleur_contractrequest',
+    'nifleur_discipline',
+    'nifleur_importjob',
+    'nifleur_legalstructure',
+    'nifleur_performance',
+    'nifleur_ratetype',
+    'nifleur_recruitmenttype',
+    'nifleur_school',
+    'nifleur_schoolyear',
+    'nifleur_speaker',
+    'nifleur_status',
+    'nifleur_unit',
+]
+# Columns of the users shown by the pages: a login only updates last_login and does not change the version
+USER_COLUMNS = 'username, first_name, last_name, email, is_staff, is_active, is_superuser'
+
+# The version is incremented once per table and per transaction, when the transaction commits: the deferred trigger
+# runs for each written row at commit and the first one flags the table for the rest of the transaction. The row of
+# the version is then only locked for the end of the commit and not for the whole transaction of the writers.
+TABLE_VERSION_FUNCTIONS = """
+    CREATE FUNCTION nifleur_table_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO nifleur_tableversion (name, version) VALUES (TG_TABLE_NAME, 1)
+        ON CONFLICT (name) DO UPDATE SET version = nifleur_tableversion.version + 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE FUNCTION nifleur_table_version_at_commit() RETURNS trigger AS $$
+    BEGIN
+        IF current_setting('nifleur_table_version.' || TG_TABLE_NAME, true) IS DISTINCT FROM 'on' THEN
+            PERFORM set_config('nifleur_table_version.' || TG_TABLE_NAME, 'on', true);
+            INSERT INTO nifleur_tableversion (name, version) VALUES (TG_TABLE_NAME, 1)
+            ON CONFLICT (name) DO UPDATE SET version = nifleur_tableversion.version + 1;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+DROP_TABLE_VERSION_FUNCTIONS = """
+    DROP FUNCTION nifleur_table_version_at_commit();
+    DROP FUNCTION nifleur_table_version();
+"""
+
+TABLE_VERSION_TRIGGERS = """
+    CREATE CONSTRAINT TRIGGER nifleur_table_version AFTER INSERT OR DELETE OR UPDATE{columns}
+    ON {table} DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION nifleur_table_version_at_commit();
+
+    CREATE TRIGGER nifleur_table_version_truncate AFTER TRUNCATE
+    ON {table} FOR EACH STATEMENT EXECUTE FUNCTION nifleur_table_version();
+"""
+
+DROP_TABLE_VERSION_TRIGGERS = """
+    DROP TRIGGER nifleur_table_version_truncate ON {table};
+    DROP TRIGGER nifleur_table_version ON {table};
+"""
+
+
+def table_version_triggers(template):
+    return [template.format(table=table, columns='') for table in VERSIONED_TABLES] + [
+        template.format(table='auth_user', columns=f' OF {USER_COLUMNS}')
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('avatar', '0003_auto_20170827_1345'),
+        ('nifleur', '0011_check_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('name', models.CharField(max_length=63, primary_key=True, serialize=False, verbose_name='Table')),
+                ('version', models.BigIntegerField(default=0, verbose_name='Version')),
+            ],
+            options={
+                'verbose_name': 'Version de table',
+                'verbose_name_plural': 'Versions de table',
+            },
+        ),
+        migrations.RunSQL(TABLE_VERSION_FUNCTIONS, DROP_TABLE_VERSION_FUNCTIONS),
+        migrations.RunSQL(
+            table_version_triggers(TABLE_VERSION_TRIGGERS), table_version_triggers(DROP_TABLE_VERSION_TRIGGERS)
+        ),
+    ]
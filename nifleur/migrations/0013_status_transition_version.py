@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# The compiled workflow of each process is reloaded when the version of the statuses or of the transitions changes
+STATUS_TRANSITION_TRIGGERS = """
+    CREATE CONSTRAINT TRIGGER nifleur_table_version AFTER INSERT OR DELETE OR UPDATE
+    ON nifleur_statustransition DEFERRABLE INITIALLY DEFERRED FOR EACH ROW
+    EXECUTE FUNCTION nifleur_table_version_at_commit();
+
+    CREATE TRIGGER nifleur_table_version_truncate AFTER TRUNCATE
+    ON nifleur_statustransition FOR EACH STATEMENT EXECUTE FUNCTION nifleur_table_version();
+"""
+
+DROP_STATUS_TRANSITION_TRIGGERS = """
+    DROP TRIGGER nifleur_table_version_truncate ON nifleur_statustransition;
+    DROP TRIGGER nifleur_table_version ON nifleur_statustransition;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0012_table_versions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(STATUS_TRANSITION_TRIGGERS, DROP_STATUS_TRANSITION_TRIGGERS),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0013_status_transition_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='error_count',
+            field=models.PositiveIntegerField(default=0, verbose_name="Nombre d'erreurs"),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Dernière progression'),
+        ),
+        migrations.RunSQL(
+            "UPDATE nifleur_importjob SET error_count = jsonb_array_length(errors)", migrations.RunSQL.noop
+        ),
+    ]
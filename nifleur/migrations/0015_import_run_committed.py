@@ -0,0 +1,18 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0014_import_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importrun',
+            name='committed',
+            field=models.PositiveIntegerField(default=0, verbose_name='Avancement'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:33
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def finish_duplicate_runs(apps, schema_editor):
+    """ Only the last unfinished run of a file is kept unfinished, the older ones were forced over """
+    ImportRun = apps.get_model('nifleur', 'ImportRun')
+    last_runs = set()
+    for run in ImportRun.objects.filter(finished_at__isnull=True).order_by('-created_at', '-id'):
+        if (run.kind, run.sha256) in last_runs:
+            run.finished_at = timezone.now()
+            run.save(update_fields=['finished_at'])
+        last_runs.add((run.kind, run.sha256))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nifleur', '0015_import_run_committed'),
+    ]
+
+    operations = [
+        migrations.RunPython(finish_duplicate_runs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='importrun',
+            constraint=models.UniqueConstraint(condition=models.Q(('finished_at__isnull', True)), fields=('kind', 'sha256'), name='unique_running_import_run'),
+        ),
+    ]
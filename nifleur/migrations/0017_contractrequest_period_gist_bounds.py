@@ -0,0 +1,24 @@
+# Generated by Django 4.2.18 on 2026-10-19 15:45
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+import nifleur.models
+
+
+class Migration(migrations.Migration):
+    """ The index is built again on the periods including their bounds, the expression of the queries """
+
+    dependencies = [
+        ('nifleur', '0016_unique_running_import_run'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='contractrequest',
+            name='contract_request_period_gist',
+        ),
+        migrations.AddIndex(
+            model_name='contractrequest',
+            index=django.contrib.postgres.indexes.GistIndex(nifleur.models.TsTzRange('started_at', 'ended_at'), name='contract_request_period_gist'),
+        ),
+    ]
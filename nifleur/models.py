@@ -1,10 +1,15 @@
 from django.contrib.auth.models import User
+from django.contrib.postgres.fields import DateTimeRangeField
+from django.contrib.postgres.indexes import GistIndex
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.urls import reverse
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils.translation import gettext_lazy as _
 
+from nifleur.utils import tokenize
+
 
 BEGINNER = 1
 INTERMEDIATE = 2
@@ -150,6 +155,7 @@ class Speaker(models.Model):
         (MEN, 'M.'),
         (WOMEN, 'Mme')
     )
+    EXPERTISE_FIELDS = ('main_area_of_expertise', 'second_area_of_expertise', 'third_area_of_expertise')
     first_name = models.CharField('Prénom', max_length=50)
     last_name = models.CharField('Nom', max_length=100)
     civility = models.CharField('Civilité', max_length=1, choices=CIVILITY, default=MEN)
@@ -196,6 +202,81 @@ class Speaker(models.Model):
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(Speaker.EXPERTISE_FIELDS):
+            index_speaker_skills([self])
+
+
+class Skill(models.Model):
+    """
+    Normalized word of the areas of expertise of the speakers, used as an inverted index to find speakers
+
+    Attributes:
+
+    - :class:`str` label -> lowercase word without accents
+    """
+    label = models.CharField('Nom', max_length=100, unique=True)
+
+    class Meta:
+        verbose_name = 'Compétence'
+        verbose_name_plural = 'Compétences'
+
+    def __str__(self):
+        return self.label
+
+
+class SpeakerSkill(models.Model):
+    """
+    Link between a speaker and a skill found in one of its areas of expertise
+
+    Attributes:
+
+    - :class:`Speaker` speaker
+    - :class:`Skill` skill
+    - :class:`int` rank -> 1 if found in the main area of expertise, 2 in the second, 3 in the third
+    """
+    speaker = models.ForeignKey(Speaker, verbose_name='Intervenant', related_name='skills', on_delete=models.CASCADE)
+    skill = models.ForeignKey(Skill, verbose_name='Compétence', related_name='speakers', on_delete=models.CASCADE)
+    rank = models.PositiveSmallIntegerField('Rang')
+
+    class Meta:
+        verbose_name = "Compétence d'un intervenant"
+        verbose_name_plural = "Compétences des intervenants"
+        constraints = [
+            models.UniqueConstraint(fields=['skill', 'speaker'], name='unique_speaker_skill')
+        ]
+
+    def __str__(self):
+        return f"{self.speaker} - {self.skill}"
+
+
+def index_speaker_skills(speakers):
+    """
+    Rebuild the skills of the speakers from their areas of expertise
+
+    :param list speakers: list of :class:`Speaker`
+    """
+    speakers_skills = {}
+    for speaker in speakers:
+        skills = {}
+        for rank, field in enumerate(Speaker.EXPERTISE_FIELDS, start=1):
+            for word in tokenize(getattr(speaker, field)):
+                skills.setdefault(word[:100], rank)
+        speakers_skills[speaker.id] = skills
+
+    labels = set().union(*speakers_skills.values())
+    Skill.objects.bulk_create([Skill(label=label) for label in labels], ignore_conflicts=True)
+    skill_ids = dict(Skill.objects.filter(label__in=labels).values_list('label', 'id'))
+
+    SpeakerSkill.objects.filter(speaker_id__in=speakers_skills.keys()).delete()
+    SpeakerSkill.objects.bulk_create([
+        SpeakerSkill(speaker_id=speaker_id, skill_id=skill_ids[label], rank=rank)
+        for speaker_id, skills in speakers_skills.items()
+        for label, rank in skills.items()
+    ])
+
 
 class Performance(models.Model):
     """
@@ -271,24 +352,19 @@ class SchoolYear(models.Model):
     class Meta:
         verbose_name = 'Promotion'
         verbose_name_plural = 'Promotions'
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(initial=True) | models.Q(alternating=True),
+                name='school_year_initial_or_alternating',
+                violation_error_message=_("Une classe doit possède au moins des initiaux ou des alternants ou les deux")
+            )
+        ]
 
     def __str__(self):
         if self.label:
             return f'{self.school} - {self.year} - {self.label}'
         return f'{self.school} - {self.year}'
 
-    def clean(self, *args, **kwargs):
-        if not self.initial and not self.alternating:
-            raise ValidationError(
-                _("Une classe doit possède au moins des initiaux ou des alternants ou les deux"),
-                code='invalid'
-            )
-        super().clean()
-
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-
 
 class Discipline(models.Model):
     """
@@ -333,12 +409,17 @@ class Discipline(models.Model):
         return self.label
 
     def clean(self, *args, **kwargs):
-        if not self.school and self.school_year:
-            self.school = self.school_year.school
+        if self.school_year_id is not None:
+            if self.school_id is None:
+                self.school_id = self.school_year.school_id
+            elif self.school_id != self.school_year.school_id:
+                raise ValidationError({'school_year': "La classe doit appartenir à l'école de la matière"})
         super().clean()
 
     def save(self, *args, **kwargs):
-        self.full_clean()
+        # A trigger of the database fills the school the same way and checks it matches the school of the school year
+        if self.school_id is None and self.school_year_id is not None:
+            self.school_id = self.school_year.school_id
         super().save(*args, **kwargs)
 
 
@@ -351,6 +432,21 @@ STATUS_CHOICES = (
     (CLOSE, 'fermé')
 )
 
+CREATE = 'create'
+RESET = 'reset'
+BACK = 'back'
+NEXT = 'next'
+FINISH = 'finish'
+CANCEL = 'cancel'
+TRANSITION_ACTIONS = (
+    (CREATE, 'Création'),
+    (RESET, 'Revenir au début'),
+    (BACK, 'Précédent'),
+    (NEXT, 'Suivant'),
+    (FINISH, 'Terminer le contrat'),
+    (CANCEL, 'Annuler le contrat')
+)
+
 
 class Status(models.Model):
     """
@@ -384,23 +480,52 @@ class Status(models.Model):
     def get_verbose_name(self):
         return 'un statut'
 
-    @property
-    def can_back(self):
-        return self.position > 1
 
-    @property
-    def can_next(self):
-        # FIXME Potential bug if position not in strict order
-        return self.position < Status.objects.count()
+class StatusTransition(models.Model):
+    """
+    Allowed change of status of a contract request: the action moves a contract request from a status to another.
+    The transition without from status gives the status of the new contract requests.
 
-    @property
-    def finish(self):
-        return self == Status.objects.filter(type=CLOSE).first()
+    Attributes:
 
-    @property
-    def cancel(self):
-        # FIXME Potential bug if new status CLOSE was created
-        return self == Status.objects.filter(type=CLOSE).last()
+    - :class:`Status` from_status
+    - :class:`str` action
+    - :class:`Status` to_status
+    """
+    from_status = models.ForeignKey(
+        Status,
+        verbose_name='Statut de départ',
+        related_name='transitions',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    action = models.CharField('Action', max_length=10, choices=TRANSITION_ACTIONS)
+    to_status = models.ForeignKey(
+        Status,
+        verbose_name="Statut d'arrivée",
+        related_name='incoming_transitions',
+        on_delete=models.CASCADE
+    )
+
+    class Meta:
+        verbose_name = 'Transition de statut'
+        verbose_name_plural = 'Transitions de statut'
+        constraints = [
+            models.UniqueConstraint(fields=['from_status', 'action'], name='unique_status_transition'),
+            models.UniqueConstraint(
+                fields=['action'],
+                condition=models.Q(from_status__isnull=True),
+                name='unique_initial_transition'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.from_status or 'Création'} -> {self.get_action_display()} -> {self.to_status}"
+
+    def clean(self):
+        if (self.from_status_id is None) != (self.action == CREATE):
+            raise ValidationError("Seule l'action de création n'a pas de statut de départ")
 
 
 class Unit(models.Model):
@@ -467,6 +592,39 @@ class LegalStructure(models.Model):
         return 'une structure juridique'
 
 
+class TsTzRange(models.Func):
+    """
+    Build a timestamp range from two datetime expressions: [start, end], the bounds are included so a contract
+    ending when it starts still overlaps the others
+    """
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+    def __init__(self, start, end, **extra):
+        super().__init__(start, end, models.Value('[]'), **extra)
+
+
+class ContractRequestQuerySet(models.QuerySet):
+    def active(self):
+        """ Exclude the cancelled contract requests, in a status reached by the cancel action of the workflow """
+        from nifleur.workflow import cancelled_status_ids
+        return self.exclude(status__in=cancelled_status_ids())
+
+    def with_period(self):
+        """ Annotate the period of the contract, matching the GiST index expression """
+        return self.annotate(contract_period=TsTzRange('started_at', 'ended_at'))
+
+    def overlapping(self, speaker, started_at, ended_at):
+        """ Contract requests of the speaker whose period overlaps the given one """
+        return self.with_period().filter(
+            speaker=speaker,
+            contract_period__overlap=TsTzRange(
+                models.Value(started_at, output_field=models.DateTimeField()),
+                models.Value(ended_at, output_field=models.DateTimeField())
+            )
+        )
+
+
 class ContractRequest(TimeStampedModel):
     """
     Main model to list all contract requests
@@ -571,12 +729,252 @@ class ContractRequest(TimeStampedModel):
         on_delete=models.PROTECT
     )
 
+    objects = ContractRequestQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Demande de contrat'
         verbose_name_plural = 'Demandes de contrat'
+        indexes = [
+            GistIndex(TsTzRange('started_at', 'ended_at'), name='contract_request_period_gist'),
+            models.Index(fields=['started_at'], name='contract_request_started_at'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(ended_at__gte=models.F('started_at')),
+                name='contract_request_ended_after_started',
+                violation_error_message="La fin du contrat doit être après son début"
+            ),
+            models.CheckConstraint(
+                check=models.Q(hourly_volume__gt=0),
+                name='contract_request_positive_hourly_volume',
+                violation_error_message="Le volume horaire doit être positif"
+            ),
+            models.CheckConstraint(
+                check=models.Q(applied_rate__gt=0),
+                name='contract_request_positive_applied_rate',
+                violation_error_message="Le tarif à appliquer doit être positif"
+            ),
+        ]
 
     def __str__(self):
         return f"Demande de contrat de {self.speaker.get_civility_display()} {self.speaker}"
 
     def get_absolute_url(self):
         return reverse('contract_request_detail', kwargs={'contract_id': self.id})
+
+
+class ContractStatusEvent(models.Model):
+    """
+    Append-only history of the status changes of the contract requests
+
+    Attributes:
+
+    - :class:`ContractRequest` contract
+    - :class:`Status` from_status, empty for the creation of the contract request
+    - :class:`Status` to_status
+    - :class:`User` user
+    - :class:`datetime` created_at
+    """
+    contract = models.ForeignKey(
+        ContractRequest,
+        verbose_name='Demande de contrat',
+        related_name='status_events',
+        on_delete=models.CASCADE,
+        # Covered by the (contract, created_at) index
+        db_index=False
+    )
+    from_status = models.ForeignKey(
+        Status,
+        verbose_name='Statut précédent',
+        related_name='+',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True
+    )
+    to_status = models.ForeignKey(Status, verbose_name='Nouveau statut', related_name='+', on_delete=models.PROTECT)
+    user = models.ForeignKey(
+        User,
+        verbose_name='Utilisateur',
+        related_name='+',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField('Date', default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Changement de statut'
+        verbose_name_plural = 'Changements de statut'
+        indexes = [models.Index(fields=['contract', 'created_at'], name='status_event_contract_date')]
+
+    def __str__(self):
+        return f"{self.contract_id} : {self.from_status_id} -> {self.to_status_id}"
+
+
+class ImportJob(models.Model):
+    """
+    Import of an uploaded file, spooled on disk and processed in background by the run_import_worker command
+
+    Attributes:
+
+    - :class:`str` kind -> type of the imported rows
+    - :class:`str` status
+    - :class:`str` name -> name of the uploaded file
+    - :class:`str` path -> path of the spooled file, deleted once the job is processed
+    - :class:`bool` dry_run -> only validate the file
+    - :class:`int` rows -> number of rows of the file, estimated while the file is read
+    - :class:`int` valid -> number of valid rows, to import
+    - :class:`int` processed -> number of rows already read
+    - :class:`int` imported
+    - :class:`list` errors -> line, column, value and message of each error, saved once the job is finished
+    - :class:`int` error_count -> number of errors found so far
+    - :class:`str` message -> failure or warnings of the import
+    - :class:`User` user
+    - :class:`datetime` heartbeat_at -> last progress of a running job, a job without progress lost its worker
+    """
+    SPEAKERS = 'speakers'
+    DISCIPLINES = 'disciplines'
+    KINDS = (
+        (SPEAKERS, 'Intervenants'),
+        (DISCIPLINES, 'Matières')
+    )
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'En attente'),
+        (RUNNING, 'En cours'),
+        (DONE, 'Terminé'),
+        (FAILED, 'Echoué')
+    )
+
+    kind = models.CharField('Type', max_length=20, choices=KINDS)
+    status = models.CharField('Statut', max_length=10, choices=STATUSES, default=PENDING)
+    name = models.CharField('Fichier', max_length=255)
+    path = models.CharField('Chemin', max_length=255)
+    dry_run = models.BooleanField('Vérification seule', default=False)
+    rows = models.PositiveIntegerField('Lignes', null=True, blank=True)
+    valid = models.PositiveIntegerField('Lignes valides', null=True, blank=True)
+    processed = models.PositiveIntegerField('Lignes traitées', default=0)
+    imported = models.PositiveIntegerField('Lignes importées', default=0)
+    errors = models.JSONField('Erreurs', default=list, blank=True)
+    error_count = models.PositiveIntegerField("Nombre d'erreurs", default=0)
+    message = models.TextField('Message', blank=True)
+    user = models.ForeignKey(
+        User,
+        verbose_name='Utilisateur',
+        related_name='+',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField('Date', default=timezone.now)
+    started_at = models.DateTimeField('Début', null=True, blank=True)
+    heartbeat_at = models.DateTimeField('Dernière progression', null=True, blank=True)
+    finished_at = models.DateTimeField('Fin', null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import"
+        verbose_name_plural = "Imports"
+        indexes = [models.Index(fields=['status', 'created_at'], name='import_job_status_date')]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} : {self.name} ({self.get_status_display()})"
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+
+class ImportRun(models.Model):
+    """
+    Fingerprint of an imported file, an identical file of the same kind is not imported twice unless forced
+
+    Attributes:
+
+    - :class:`str` kind -> one of ImportJob.KINDS
+    - :class:`str` sha256 -> hexadecimal SHA-256 of the content of the file
+    - :class:`str` name -> name of the uploaded file
+    - :class:`ImportJob` job -> last import of the file, its result is copied once it is finished
+    - :class:`int` rows
+    - :class:`int` imported
+    - :class:`int` committed -> rows of the file (speakers) or disciplines committed, an interrupted import of the
+      file resumes after them
+    - :class:`int` errors -> number of errors
+    - :class:`str` message
+    - :class:`User` user
+    """
+    kind = models.CharField('Type', max_length=20, choices=ImportJob.KINDS)
+    sha256 = models.CharField('Empreinte SHA-256', max_length=64)
+    name = models.CharField('Fichier', max_length=255)
+    job = models.OneToOneField(
+        ImportJob,
+        verbose_name='Import',
+        related_name='run',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    rows = models.PositiveIntegerField('Lignes', null=True, blank=True)
+    imported = models.PositiveIntegerField('Lignes importées', null=True, blank=True)
+    committed = models.PositiveIntegerField('Avancement', default=0)
+    errors = models.PositiveIntegerField('Erreurs', null=True, blank=True)
+    message = models.TextField('Message', blank=True)
+    user = models.ForeignKey(
+        User,
+        verbose_name='Utilisateur',
+        related_name='+',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField('Date', default=timezone.now)
+    finished_at = models.DateTimeField('Fin', null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Fichier importé"
+        verbose_name_plural = "Fichiers importés"
+        indexes = [models.Index(fields=['kind', 'sha256'], name='import_run_kind_sha256')]
+        constraints = [
+            # A file is imported by one job at a time
+            models.UniqueConstraint(
+                fields=['kind', 'sha256'],
+                condition=models.Q(finished_at__isnull=True),
+                name='unique_running_import_run'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} : {self.name} ({self.sha256[:12]})"
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    @property
+    def interrupted(self):
+        """ The import of the file failed or its job was deleted before it finished """
+        return not self.finished and (self.job is None or self.job.status == ImportJob.FAILED)
+
+
+class TableVersion(models.Model):
+    """
+    Version of a table, incremented by a trigger of the database when a transaction writing in the table commits, bulk
+    writes and raw SQL included. The list pages are answered with 304 Not Modified while the versions of the tables
+    they show are unchanged (see :mod:`nifleur.conditional`).
+
+    Attributes:
+
+    - :class:`str` name -> name of the table in the database
+    - :class:`int` version
+    """
+    name = models.CharField('Table', max_length=63, primary_key=True)
+    version = models.BigIntegerField('Version', default=0)
+
+    class Meta:
+        verbose_name = "Version de table"
+        verbose_name_plural = "Versions de table"
+
+    def __str__(self):
+        return f"{self.name} ({self.version})"
@@ -0,0 +1,132 @@
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from nifleur.models import ContractRequest, ContractStatusEvent, Discipline
+from nifleur.workflow import TransitionError, cancelled_status_ids, get_workflow
+
+Rollover = namedtuple('Rollover', ['disciplines', 'contracts', 'overlapping'])
+
+# Disciplines of the source school year missing in the target school year, compared by label
+DISCIPLINES_QUERY = """
+    INSERT INTO {disciplines} (school_year_id, school_id, label, speaker_id)
+    SELECT %(target)s, %(school)s, source.label, source.speaker_id
+    FROM {disciplines} source
+    WHERE source.school_year_id = %(source)s AND NOT EXISTS (
+        SELECT 1 FROM {disciplines} target WHERE target.school_year_id = %(target)s AND target.label = source.label
+    )
+"""
+
+# Active contracts of the source school year started in the window, shifted into the target school year and window.
+# A contract already rolled over (same speaker, discipline and start) is not cloned twice, and a clone overlapping an
+# active contract of its speaker is skipped and counted.
+CONTRACTS_QUERY = """
+    WITH target_disciplines AS (
+        SELECT label, MIN(id) AS id FROM {disciplines} WHERE school_year_id = %(target)s GROUP BY label
+    ), candidates AS (
+        SELECT source.id, target_discipline.id AS target_discipline_id, EXISTS (
+            SELECT 1 FROM {contracts} other
+            WHERE other.speaker_id = source.speaker_id
+                AND (other.status_id <> ALL(%(cancelled)s)) IS NOT FALSE
+                AND TSTZRANGE(other.started_at, other.ended_at, '[]')
+                    && TSTZRANGE(source.started_at + %(offset)s, source.ended_at + %(offset)s, '[]')
+        ) AS overlapping
+        FROM {contracts} source
+        INNER JOIN {disciplines} source_discipline ON source_discipline.id = source.discipline_id
+        INNER JOIN target_disciplines target_discipline ON target_discipline.label = source_discipline.label
+        WHERE source.school_year_id = %(source)s
+            AND (source.status_id <> ALL(%(cancelled)s)) IS NOT FALSE
+            AND source.started_at >= %(started_at)s AND source.started_at < %(ended_at)s
+            AND NOT EXISTS (
+                SELECT 1 FROM {contracts} existing
+                WHERE existing.school_year_id = %(target)s
+                    AND existing.speaker_id = source.speaker_id
+                    AND existing.discipline_id = target_discipline.id
+                    AND existing.started_at = source.started_at + %(offset)s
+            )
+    ), inserted AS (
+        INSERT INTO {contracts} ({columns})
+        SELECT {values}
+        FROM candidates
+        INNER JOIN {contracts} source ON source.id = candidates.id
+        WHERE NOT candidates.overlapping
+        RETURNING id
+    ), events AS (
+        INSERT INTO {events} (contract_id, to_status_id, user_id, created_at)
+        SELECT id, %(status)s, %(user)s, %(now)s FROM inserted
+    )
+    SELECT (SELECT COUNT(*) FROM inserted), (SELECT COUNT(*) FROM candidates WHERE overlapping)
+"""
+
+# Values of the cloned contracts which are not copied from the source contract
+CONTRACT_VALUES = {
+    'school_id': '%(school)s',
+    'school_year_id': '%(target)s',
+    'discipline_id': 'candidates.target_discipline_id',
+    'status_id': '%(status)s',
+    'started_at': 'source.started_at + %(offset)s',
+    'ended_at': 'source.ended_at + %(offset)s',
+    'created_at': '%(now)s',
+    'updated_at': '%(now)s',
+}
+
+
+@transaction.atomic
+def rollover_school_year(source, target, started_at, ended_at, target_started_at, contracts=True, user=None):
+    """
+    Clone the disciplines of a school year and its active contract requests started in a window into another school
+    year, the contract requests are moved to a new window starting at the target date and start at the initial status.
+    The contract requests whose new period overlaps an active contract request of their speaker are not cloned.
+    Every row is copied by INSERT ... SELECT statements in a single transaction.
+
+    :param SchoolYear source:
+    :param SchoolYear target:
+    :param datetime started_at: start of the window of the source contract requests
+    :param datetime ended_at: end (excluded) of the window of the source contract requests
+    :param datetime target_started_at: start of the window of the cloned contract requests
+    :param bool contracts: clone the contract requests too, not only the disciplines
+    :param User user: user recorded in the status history of the cloned contract requests
+    :return: :class:`Rollover` with the number of cloned disciplines and contract requests, and the number of
+        contract requests skipped because they overlap
+    :raise TransitionError: if no status is defined for the new contract requests
+    """
+    status_id = get_workflow().initial_status_id
+    if status_id is None:
+        raise TransitionError("Aucun statut n'est défini pour les nouvelles demandes de contrat")
+
+    quote = connection.ops.quote_name
+    tables = {
+        'disciplines': quote(Discipline._meta.db_table),
+        'contracts': quote(ContractRequest._meta.db_table),
+        'events': quote(ContractStatusEvent._meta.db_table)
+    }
+    params = {
+        'source': source.id,
+        'target': target.id,
+        'school': target.school_id,
+        'started_at': started_at,
+        'ended_at': ended_at,
+        'offset': target_started_at - started_at,
+        'status': status_id,
+        'cancelled': list(cancelled_status_ids()),
+        'user': user.id if user else None,
+        'now': timezone.now()
+    }
+
+    with connection.cursor() as cursor:
+        cursor.execute(DISCIPLINES_QUERY.format(**tables), params)
+        disciplines = cursor.rowcount
+        if not contracts:
+            return Rollover(disciplines, 0, 0)
+
+        columns = [field.column for field in ContractRequest._meta.concrete_fields if not field.primary_key]
+        cursor.execute(
+            CONTRACTS_QUERY.format(
+                columns=', '.join(quote(column) for column in columns),
+                values=', '.join(CONTRACT_VALUES.get(column, f'source.{quote(column)}') for column in columns),
+                **tables
+            ),
+            params
+        )
+        return Rollover(disciplines, *cursor.fetchone())
@@ -0,0 +1,45 @@
+from django.db.models import Q
+
+from nifleur.models import Speaker, SpeakerSkill
+from nifleur.utils import tokenize
+
+
+def find_speakers_by_skills(query, limit=50):
+    """
+    Find the speakers having all the skills of the query (a word also matches the skills starting with it).
+    Each word is resolved to the posting list of its skills, then the posting lists are intersected from the
+    smallest one.
+
+    :param str query: free text, ex: "développement python"
+    :param int limit: maximum number of speakers returned
+    :return: list of :class:`Speaker` ranked by expertise levels then by the areas of expertise matching the query
+    """
+    words = set(tokenize(query))
+    if not words:
+        return []
+
+    skill_filter = Q()
+    for word in words:
+        skill_filter |= Q(skill__label__startswith=word)
+    postings = {word: {} for word in words}
+    for label, speaker_id, rank in SpeakerSkill.objects.filter(skill_filter).values_list(
+        'skill__label', 'speaker_id', 'rank'
+    ):
+        for word in words:
+            if label.startswith(word):
+                posting = postings[word]
+                posting[speaker_id] = min(rank, posting.get(speaker_id, rank))
+
+    posting_lists = sorted(postings.values(), key=len)
+    speaker_ids = set(posting_lists[0])
+    for posting in posting_lists[1:]:
+        speaker_ids.intersection_update(posting)
+        if not speaker_ids:
+            return []
+
+    speakers = Speaker.objects.in_bulk(speaker_ids).values()
+    return sorted(speakers, key=lambda speaker: (
+        -((speaker.professional_expertise_level or 0) + (speaker.teaching_expertise_level or 0)),
+        sum(posting[speaker.id] for posting in posting_lists),
+        speaker.last_name
+    ))[:limit]
@@ -0,0 +1,93 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files of the project loaded by every page, concatenated by collectstatic. The bundles stay in the folder of their
+# files so the relative urls of the stylesheets are unchanged.
+BUNDLES = {
+    'css/base.bundle.css': ['css/colors.css', 'css/main.css', 'css/notification.css'],
+    'js/base.bundle.js': ['js/notification.js', 'js/main.js'],
+}
+# Extensions of the text files compressed by collectstatic, the images and fonts are already compressed
+COMPRESSED_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.eot', '.ttf')
+# Under this size, the compressed file is not worth its request headers
+COMPRESS_MIN_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Storage of collectstatic: the bundles are built from their files, every file is copied with the hash of its
+    content in its name so it can be cached forever, and the text files get gzip and brotli variants written next to
+    them for the web server (gzip_static / brotli_static with nginx).
+    """
+    # The source maps of the scripts are not rewritten: some vendored scripts reference maps which are not shipped
+    patterns = tuple(pattern for pattern in ManifestStaticFilesStorage.patterns if pattern[0] != '*.js')
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = {**paths, **self.build_bundles(paths)}
+        yield from super().post_process(paths, dry_run, **options)
+        if not dry_run:
+            for hashed_name in set(self.hashed_files.values()):
+                self.compress(hashed_name)
+
+    def build_bundles(self, paths):
+        """ Concatenate the collected files of each bundle, the bundles are then hashed like the other files """
+        bundles = {}
+        for name, files in BUNDLES.items():
+            content = []
+            for path in files:
+                storage, source = paths[path]
+                with storage.open(source) as file:
+                    content.append(f'/* {path} */\n'.encode() + file.read().rstrip() + b'\n')
+            if self.exists(name):
+                self.delete(name)
+            self._save(name, ContentFile(b'\n'.join(content)))
+            bundles[name] = (self, name)
+        return bundles
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSED_EXTENSIONS) or not self.exists(name):
+            return
+        with self.open(name) as file:
+            content = file.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(content)
+        for extension, compressed in variants.items():
+            if len(compressed) >= len(content):
+                continue
+            path = self.path(name + extension)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(compressed)
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Not collected (development and tests): the file is served by the finders with its own name. Once the
+            # manifest is loaded, a missing file is an error of the deployment
+            if settings.DEBUG or not self.hashed_files:
+                return name
+            raise
+
+
+def bundle_files(name, storage):
+    """
+    Static files to link for a bundle: the bundle once collected, its own files while developing because the runserver
+    serves the static files from the source folders
+    """
+    if not settings.DEBUG and name in getattr(storage, 'hashed_files', {}):
+        return [name]
+    return BUNDLES[name]
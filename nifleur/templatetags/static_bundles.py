@@ -0,0 +1,24 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from nifleur.staticfiles import bundle_files
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle_css(name):
+    """ Stylesheet links of a bundle of nifleur.staticfiles.BUNDLES """
+    return format_html_join('\n', '<link rel="stylesheet" type="text/css" href="{}">', (
+        (static(path),) for path in bundle_files(name, staticfiles_storage)
+    ))
+
+
+@register.simple_tag
+def bundle_js(name):
+    """ Scripts of a bundle of nifleur.staticfiles.BUNDLES """
+    return format_html_join('\n', '<script src="{}"></script>', (
+        (static(path),) for path in bundle_files(name, staticfiles_storage)
+    ))
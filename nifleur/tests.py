@@ -1,6 +1,45 @@
-from django.contrib.auth.models import User
-from django.test import TestCase
+import csv
+import datetime
+import functools
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+from unittest import mock
+
+import pandas
+
+from avatar.models import Avatar
+from django.conf import settings
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+
+from nifleur.analytics import status_dwell_times, stuck_contracts
+from nifleur.assignment import propose_assignments, apply_assignments
+from nifleur.conflicts import find_speaker_conflicts
+from nifleur.duplicates import find_duplicate_companies, find_duplicate_speakers, jaro_winkler, soundex
+from nifleur.forecast import compute_forecast
+from nifleur.imports import import_disciplines, import_speakers
+from nifleur.jobs import INTERRUPTED_MESSAGE, STALE_JOB_TIMEOUT, claim_import_job, fail_stale_import_jobs
+from nifleur.merge import merge_companies, merge_speakers
+from nifleur.skills import find_speakers_by_skills
+from nifleur.staticfiles import BUNDLES, CompressedManifestStaticFilesStorage, bundle_files
+from nifleur.uploads import IMPORT_UPLOAD_LIMITS, MB, UploadLimit
+from nifleur.workflow import bulk_transition, create_position_transitions, get_workflow, invalidate_workflow, \
+    transition, TransitionError, NEXT, CANCEL, BACK, RESET, CREATE
+from nifleur.models import School, LegalStructure, Speaker, Status, Performance, RateType, SchoolYear, Discipline, \
+    RecruitmentType, ContractRequest, ContractStatusEvent, StatusTransition, Skill, Company, ImportJob, ImportRun, \
+    CompanyType, TableVersion, OPEN, ON_GOING, CLOSE, EXPERT
 
 
 class TestMessageCase(TestCase):
@@ -19,6 +58,54 @@ class TestMessageCase(TestCase):
             self.assertEqual(str(response_messages[i]), messages[i])
 
 
+class ContractDataMixin:
+    """ Create the minimal data required to create contract requests """
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.rp = User.objects.create_user('rp', 'rp@test.com', 'rp_password', first_name='Jean', last_name='Dupont')
+        cls.school = School.objects.create(label='ESGI')
+        cls.school_year = SchoolYear.objects.create(school=cls.school, year='B3', initial=True)
+        cls.discipline = Discipline.objects.create(school=cls.school, school_year=cls.school_year, label='Python')
+        cls.legal_structure = LegalStructure.objects.create(label='SAS')
+        cls.speaker = Speaker.objects.create(first_name='Ada', last_name='Lovelace', mail='ada@test.com')
+        cls.performance = Performance.objects.create(label='Cours')
+        cls.hourly_rate = RateType.objects.create(label='Horaire')
+        cls.flat_rate = RateType.objects.create(label='Forfait')
+        cls.recruitment_type = RecruitmentType.objects.create(label='Vacataire')
+        cls.status_open = Status.objects.create(position=1, label='Ouvert', color='#ffffff', type=OPEN)
+        cls.status_sent = Status.objects.create(position=2, label='Envoyé', color='#eeeeee', type=OPEN)
+        cls.status_validated = Status.objects.create(position=3, label='Validé', color='#dddddd', type=ON_GOING)
+        cls.status_ongoing = Status.objects.create(position=4, label='En cours', color='#cccccc', type=ON_GOING)
+        cls.status_finish = Status.objects.create(position=5, label='Terminé', color='#00ff00', type=CLOSE)
+        cls.status_cancel = Status.objects.create(position=6, label='Annulé', color='#ff0000', type=CLOSE)
+        create_position_transitions()
+
+    @classmethod
+    def create_contract(cls, started_at, ended_at, **kwargs):
+        data = {
+            'school': cls.school,
+            'legal_structure': cls.legal_structure,
+            'speaker': cls.speaker,
+            'status': cls.status_open,
+            'performance': cls.performance,
+            'applied_rate': 50,
+            'rate_type': cls.hourly_rate,
+            'hourly_volume': 10,
+            'discipline': cls.discipline,
+            'school_year': cls.school_year,
+            'period': 'S1',
+            'rp': cls.rp,
+            'recruitment_type': cls.recruitment_type,
+            **kwargs
+        }
+        return ContractRequest.objects.create(
+            started_at=timezone.make_aware(datetime.datetime.combine(started_at, datetime.time(9))),
+            ended_at=timezone.make_aware(datetime.datetime.combine(ended_at, datetime.time(18))),
+            **data
+        )
+
+
 class ViewsTest(TestMessageCase):
     @classmethod
     def setUpTestData(cls):
@@ -35,6 +122,52 @@ class ViewsTest(TestMessageCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'nifleur/home.html')
 
+    def test_avatar_cache(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+        def get_home():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('home'))
+            return response, [query for query in queries.captured_queries if 'avatar_avatar' in query['sql']]
+
+        self.assertEqual(len(get_home()[1]), 1)
+        # The avatar of the sidebar is rendered from the cache
+        self.assertEqual(get_home()[1], [])
+
+        avatar = Avatar.objects.create(user=self.superuser, primary=True, avatar='avatars/super_user/ada.png')
+        response, queries = get_home()
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, avatar.avatar_url(55))
+
+    def test_list_pages_not_modified(self):
+        self.client.force_login(self.superuser)
+        for url in ['speakers_list', 'company_list', 'discipline_list', 'contract_requests_list']:
+            response = self.client.get(reverse(url))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('no-cache', response['Cache-Control'])
+            response = self.client.get(reverse(url), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304, url)
+
+        url = reverse('company_list')
+        CompanyType.objects.create(label='SAS')
+        etag = self.client.get(url)['ETag']
+        # Another user gets its own page
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # The messages are always shown
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        response = self.client.post(url, {'label': 'Acme', 'company_type': CompanyType.objects.get().id})
+        response = self.client.get(response.url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertMessagesContains(response, ["La société Acme vient d'être créée"])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Acme', gzip.decompress(response.content).decode())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
     def test_logout(self):
         self.client.force_login(self.superuser)
         response = self.client.get(reverse('logout_user'), follow=True)
@@ -63,3 +196,1033 @@ class ViewsTest(TestMessageCase):
             follow=True
         )
         self.assertTrue(response.context['user'].is_authenticated)
+
+
+class TableVersionTest(TransactionTestCase):
+    """ The versions of the tables are incremented when the transactions commit, the test case must commit """
+    def test_list_page_version(self):
+        user = User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password')
+        self.client.force_login(user)
+        url = reverse('company_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # A login only changes the last login of the user
+        self.client.login(username='super_user', password='admin_password')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # The bulk writes increment the version once, when their transaction commits
+        version = TableVersion.objects.filter(name=CompanyType._meta.db_table).values_list('version', flat=True)
+        initial_version = version.first() or 0
+        with transaction.atomic():
+            CompanyType.objects.bulk_create([CompanyType(label='SAS'), CompanyType(label='SARL')])
+            CompanyType.objects.filter(label='SARL').update(label='EURL')
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(version.first(), initial_version + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+    def test_workflow_version(self):
+        first = Status.objects.create(position=1, label='Ouvert', color='#ffffff', type=OPEN)
+        second = Status.objects.create(position=2, label='Terminé', color='#00ff00', type=CLOSE)
+        self.assertIsNone(get_workflow().target(first.id, NEXT))
+        # Written by another process: no signal, the graph is reloaded from the committed version
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO nifleur_statustransition (from_status_id, action, to_status_id) VALUES (%s, %s, %s)",
+                [first.id, NEXT, second.id]
+            )
+        self.assertEqual(get_workflow().target(first.id, NEXT), second.id)
+
+class ForecastTest(ContractDataMixin, TestCase):
+    def test_contract_spread_by_days(self):
+        # 10 days in January and 10 days in February
+        self.create_contract(datetime.date(2022, 1, 22), datetime.date(2022, 2, 10), hourly_volume=20)
+        forecast = compute_forecast()
+        self.assertEqual(forecast['months'], ['2022-01', '2022-02'])
+        self.assertEqual(forecast['school'][0]['hours'], [10, 10])
+        self.assertEqual(forecast['school'][0]['cost'], [500, 500])
+
+    def test_flat_rate_and_cancelled_contracts(self):
+        self.create_contract(datetime.date(2022, 3, 1), datetime.date(2022, 3, 31), rate_type=self.flat_rate)
+        self.create_contract(datetime.date(2022, 3, 1), datetime.date(2022, 3, 31), status=self.status_cancel)
+        forecast = compute_forecast()
+        self.assertEqual(forecast['months'], ['2022-03'])
+        self.assertEqual(forecast['rp'][0]['label'], 'Jean Dupont')
+        self.assertEqual(forecast['rp'][0]['hours'], [10])
+        self.assertEqual(forecast['rp'][0]['cost'], [50])
+
+    def test_forecast_view(self):
+        self.client.force_login(self.rp)
+        response = self.client.get(reverse('contract_requests_forecast'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['months'], [])
+
+
+class ConflictsTest(ContractDataMixin, TestCase):
+    def test_overlapping_contracts(self):
+        first = self.create_contract(datetime.date(2022, 1, 10), datetime.date(2022, 1, 20))
+        second = self.create_contract(datetime.date(2022, 1, 15), datetime.date(2022, 2, 15))
+        self.create_contract(datetime.date(2022, 3, 1), datetime.date(2022, 3, 2))
+        self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 3, 1), status=self.status_cancel)
+
+        conflicts = find_speaker_conflicts()
+        self.assertEqual([(c.contract_id, c.other_contract_id) for c in conflicts], [(first.id, second.id)])
+
+        overlapping = ContractRequest.objects.active().overlapping(self.speaker, first.started_at, first.ended_at)
+        self.assertQuerysetEqual(overlapping.order_by('id'), [first, second])
+
+    def test_instant_contract_overlaps(self):
+        # A contract ending when it starts is not an empty period
+        first = self.create_contract(datetime.date(2022, 1, 10), datetime.date(2022, 1, 20))
+        instant = self.create_contract(datetime.date(2022, 1, 20), datetime.date(2022, 1, 20))
+
+        conflicts = find_speaker_conflicts()
+        self.assertEqual([(c.contract_id, c.other_contract_id) for c in conflicts], [(first.id, instant.id)])
+        overlapping = ContractRequest.objects.overlapping(self.speaker, instant.started_at, instant.ended_at)
+        self.assertQuerysetEqual(overlapping.order_by('id'), [first, instant])
+
+    def test_cancelled_statuses_from_workflow(self):
+        # The last CLOSE status is not the target of the cancel action: its contract requests stay active
+        archived = Status.objects.create(position=7, label='Archivé', color='#999999', type=CLOSE)
+        first = self.create_contract(datetime.date(2022, 1, 10), datetime.date(2022, 1, 20), status=archived)
+        second = self.create_contract(datetime.date(2022, 1, 15), datetime.date(2022, 2, 15))
+        self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 3, 1), status=self.status_cancel)
+        # Several statuses can be cancelled
+        StatusTransition.objects.filter(from_status=self.status_open, action=CANCEL).update(to_status=self.status_sent)
+        self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 3, 1), status=self.status_sent)
+        invalidate_workflow()
+
+        self.assertEqual(
+            [(c.contract_id, c.other_contract_id) for c in find_speaker_conflicts()], [(first.id, second.id)]
+        )
+        self.assertQuerysetEqual(ContractRequest.objects.active().order_by('id'), [first, second])
+
+    def test_create_overlapping_contract(self):
+        contract = self.create_contract(datetime.date(2022, 1, 10), datetime.date(2022, 1, 20))
+        self.client.force_login(self.rp)
+        response = self.client.post(reverse('create_contract_request'), {
+            'school': self.school.id,
+            'legal_structure': self.legal_structure.id,
+            'speaker': self.speaker.id,
+            'status': self.status_open.id,
+            'performance': self.performance.id,
+            'applied_rate': 50,
+            'rate_type': self.hourly_rate.id,
+            'ttc': False,
+            'hourly_volume': 10,
+            'started_at': '15/01/2022',
+            'ended_at': '25/01/2022',
+            'discipline': self.discipline.id,
+            'school_year': self.school_year.id,
+            'rp': self.rp.id,
+            'period': 'S1',
+            'recruitment_type': self.recruitment_type.id
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].non_field_errors().as_data()[0].code, 'overlap')
+        self.assertQuerysetEqual(ContractRequest.objects.all(), [contract])
+
+
+class AssignmentTest(ContractDataMixin, TestCase):
+    def test_propose_and_apply_assignments(self):
+        self.speaker.main_area_of_expertise = 'Développement Python'
+        self.speaker.save()
+        economist = Speaker.objects.create(
+            first_name='Adam', last_name='Smith', mail='adam@test.com', main_area_of_expertise='Économie',
+            second_area_of_expertise='Gestion de projet'
+        )
+        economy = Discipline.objects.create(school=self.school, school_year=self.school_year, label='economie')
+        history = Discipline.objects.create(school=self.school, school_year=self.school_year, label='Histoire')
+
+        proposals = propose_assignments(school_year=self.school_year)
+        self.assertEqual(
+            [(proposal.discipline, proposal.speaker) for proposal in proposals],
+            [(self.discipline, self.speaker), (economy, economist)]
+        )
+
+        self.assertEqual(apply_assignments({p.discipline.id: p.speaker.id for p in proposals}), 2)
+        self.assertEqual(Discipline.objects.get(id=economy.id).speaker, economist)
+        self.assertIsNone(Discipline.objects.get(id=history.id).speaker)
+        self.assertEqual(propose_assignments(school_year=self.school_year), [])
+
+
+    def test_assignment_form(self):
+        other_year = SchoolYear.objects.create(school=self.school, year='M1', initial=True)
+        other = Discipline.objects.create(school=self.school, school_year=other_year, label='Java')
+        self.client.force_login(self.rp)
+
+        def post(*assignments):
+            return self.client.post(reverse('discipline_assignment'), {
+                'school_year': self.school_year.id, 'assignment': assignments
+            })
+
+        for assignments, error in (
+            (('python',), "Proposition d'attribution invalide : python"),
+            ((f'{self.discipline.id}:x',), f"Proposition d'attribution invalide : {self.discipline.id}:x"),
+            ((f'{other.id}:{self.speaker.id}',), "Des matières n'appartiennent pas à l'école ou la classe choisie"),
+            ((f'{self.discipline.id}:0',), "Des intervenants proposés n'existent plus"),
+        ):
+            response = post(*assignments)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                [message for errors in response.context['form'].errors.values() for message in errors], [error]
+            )
+        self.assertFalse(Discipline.objects.filter(speaker__isnull=False).exists())
+
+        self.assertRedirects(post(f'{self.discipline.id}:{self.speaker.id}'), reverse('discipline_list'))
+        self.assertEqual(Discipline.objects.get(id=self.discipline.id).speaker, self.speaker)
+        self.assertIsNone(Discipline.objects.get(id=other.id).speaker)
+
+
+class SkillsTest(TestCase):
+    def test_skills_index_and_search(self):
+        beginner = Speaker.objects.create(
+            first_name='Ada', last_name='Lovelace', mail='ada@test.com', main_area_of_expertise='Développement Python',
+            second_area_of_expertise='Mathématiques'
+        )
+        expert = Speaker.objects.create(
+            first_name='Alan', last_name='Turing', mail='alan@test.com', main_area_of_expertise='Mathématiques',
+            third_area_of_expertise='python', professional_expertise_level=EXPERT
+        )
+        self.assertIn('developpement', Skill.objects.values_list('label', flat=True))
+
+        self.assertEqual(find_speakers_by_skills('python mathématiques'), [expert, beginner])
+        self.assertEqual(find_speakers_by_skills('DÉVELOPP'), [beginner])
+        self.assertEqual(find_speakers_by_skills('python cuisine'), [])
+
+        beginner.main_area_of_expertise = 'Cuisine'
+        beginner.save()
+        self.assertEqual(find_speakers_by_skills('python'), [expert])
+
+
+def speakers_workbook(rows):
+    """ XLSX file with the columns of the speakers import """
+    columns = [
+        'Civilité', 'Nom', 'Prénom', 'Type société', 'Société', 'Téléphone', 'Mail', 'Diplôme', 'Domaine 1',
+        'Domaine 2', 'Domaine 3', 'Niveau pédagogie', 'Niveau professionnel'
+    ]
+    file = io.BytesIO()
+    pandas.DataFrame([row + [None] * (len(columns) - len(row)) for row in rows], columns=columns).to_excel(
+        file, index=False
+    )
+    return SimpleUploadedFile('speakers.xlsx', file.getvalue())
+
+
+class SpoolDirMixin:
+    """ Spool the uploaded files and the error reports in a temporary directory """
+    def setUp(self):
+        super().setUp()
+        spool = tempfile.TemporaryDirectory()
+        self.addCleanup(spool.cleanup)
+        spool_settings = self.settings(IMPORT_SPOOL_DIR=spool.name)
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+
+
+class ImportJobMixin(SpoolDirMixin):
+    """ Process the spooled files with the import worker """
+    def run_import_worker(self):
+        call_command('run_import_worker', '--once', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(os.listdir(settings.IMPORT_SPOOL_DIR), [])
+        return ImportJob.objects.latest('id')
+
+
+class DuplicatesTest(ImportJobMixin, TestMessageCase):
+    def test_similarity(self):
+        self.assertEqual(soundex('Dupond'), soundex('Dupont'))
+        self.assertAlmostEqual(jaro_winkler('martha', 'marhta'), 0.961, places=3)
+
+    def test_find_duplicates(self):
+        acme = Company.objects.create(label='ACME')
+        acme_sas = Company.objects.create(label='Acme SAS')
+        Company.objects.create(label='Globex')
+        ada = Speaker.objects.create(first_name='Ada', last_name='Lovelace', mail='ada@test.com')
+        ada_bis = Speaker.objects.create(first_name='Ada', last_name='Lovelase', mail='ada.lovelace@test.com')
+        Speaker.objects.create(first_name='Alan', last_name='Turing', mail='alan@test.com')
+
+        duplicates = find_duplicate_companies()
+        self.assertEqual([(d.record.id, d.other.id) for d in duplicates], [(acme.id, acme_sas.id)])
+        duplicates = find_duplicate_speakers()
+        self.assertEqual([(d.record.id, d.other.id) for d in duplicates], [(ada.id, ada_bis.id)])
+
+    def test_import_reports_duplicates(self):
+        user = User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password')
+        Company.objects.create(label='ACME')
+        Speaker.objects.create(first_name='Ada', last_name='Lovelace', mail='ada@test.com')
+
+        self.client.force_login(user)
+        response = self.client.post(reverse('speakers_list'), {'speakers_csv': speakers_workbook([
+            ['M.', 'Turing', 'Alan', None, 'acme ', None, 'alan@test.com'],
+            ['Mme', 'Lovelace', 'Ada', None, 'Acme SAS', None, 'ada.lovelace@test.com'],
+        ])}, follow=True)
+        self.assertMessagesContains(response, [
+            "Le fichier speakers.xlsx sera importé en arrière-plan, suivez sa progression sur cette page"
+        ])
+        self.assertEqual(Speaker.objects.count(), 1)
+
+        job = self.run_import_worker()
+        self.assertEqual(Company.objects.count(), 2)
+        self.assertEqual(Speaker.objects.get(last_name='Turing').company.label, 'ACME')
+        progress = self.client.get(reverse('import_job_progress', args=[job.id])).json()
+        keys = ('status', 'finished', 'rows', 'processed', 'imported', 'errors', 'message')
+        self.assertEqual(
+            {key: progress[key] for key in keys},
+            {
+                'status': ImportJob.DONE, 'finished': True, 'rows': 2, 'processed': 2, 'imported': 2, 'errors': 0,
+                'message': '2 doublons potentiels : Acme SAS ~ ACME, Ada Lovelace ~ Ada Lovelace'
+            }
+        )
+
+
+class ConstraintsTest(ContractDataMixin, TestCase):
+    def test_check_constraints(self):
+        today = datetime.date.today()
+        for kwargs in ({'hourly_volume': 0}, {'applied_rate': -1}):
+            with self.subTest(**kwargs), self.assertRaises(IntegrityError), transaction.atomic():
+                self.create_contract(today, today, **kwargs)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.create_contract(today, today - datetime.timedelta(days=1))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SchoolYear.objects.bulk_create([SchoolYear(school=self.school, year='M1')])
+
+        # The validation of the models shows the messages of the constraints
+        with self.assertRaisesMessage(ValidationError, 'Une classe doit possède au moins des initiaux'):
+            SchoolYear(school=self.school, year='M1').full_clean()
+
+    def test_discipline_school_trigger(self):
+        created = Discipline.objects.bulk_create([Discipline(school_year=self.school_year, label='Docker')])
+        self.assertEqual(Discipline.objects.get(id=created[0].id).school, self.school)
+
+        other_school = School.objects.create(label='EFREI')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Discipline.objects.create(school=other_school, school_year=self.school_year, label='Java')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SchoolYear.objects.filter(id=self.school_year.id).update(school=other_school)
+        Discipline.objects.create(school=other_school, label='Java')
+
+        # The form shows the error instead of failing on the trigger
+        self.client.force_login(self.rp)
+        response = self.client.post(reverse('discipline_list'), {
+            'simple-discipline-form-school': other_school.id,
+            'simple-discipline-form-school_year': self.school_year.id,
+            'simple-discipline-form-label': 'Docker'
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['form'].errors, {'school_year': ["La classe doit appartenir à l'école de la matière"]}
+        )
+
+
+class MergeTest(ContractDataMixin, TestCase):
+    def test_merge_speakers(self):
+        company = Company.objects.create(label='ACME')
+        duplicate = Speaker.objects.create(
+            first_name='Ada', last_name='Lovelase', mail='ada.lovelace@test.com', main_area_of_expertise='Python',
+            company=company
+        )
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2), speaker=duplicate)
+        Discipline.objects.filter(id=self.discipline.id).update(speaker=duplicate)
+
+        # The company is copied by its id, without loading it
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(merge_speakers(self.speaker, [duplicate]), 1)
+        self.assertFalse([query for query in queries.captured_queries if 'FROM "nifleur_company"' in query['sql']])
+        self.assertEqual(Speaker.objects.get(id=self.speaker.id).company, company)
+        self.assertFalse(Speaker.objects.filter(id=duplicate.id).exists())
+        self.assertEqual(ContractRequest.objects.get(id=contract.id).speaker, self.speaker)
+        self.assertEqual(Discipline.objects.get(id=self.discipline.id).speaker, self.speaker)
+        self.assertEqual(Speaker.objects.get(id=self.speaker.id).main_area_of_expertise, 'Python')
+        self.assertEqual(find_speakers_by_skills('python'), [self.speaker])
+
+    def test_merge_companies(self):
+        company = Company.objects.create(label='ACME')
+        duplicates = [
+            Company.objects.create(label='Acme SAS', relation_mail='acme@test.com'),
+            Company.objects.create(label='ACME Group')
+        ]
+        Speaker.objects.filter(id=self.speaker.id).update(company=duplicates[1])
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2), company=duplicates[0])
+
+        self.assertEqual(merge_companies(company, duplicates), 2)
+        self.assertQuerysetEqual(Company.objects.all(), [company])
+        self.assertEqual(Company.objects.get().relation_mail, 'acme@test.com')
+        self.assertEqual(ContractRequest.objects.get(id=contract.id).company, company)
+        self.assertEqual(Speaker.objects.get(id=self.speaker.id).company, company)
+
+
+class AdminTest(ContractDataMixin, TestCase):
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('admin:nifleur_contractrequest_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_contract_request_changelist_queries(self):
+        self.client.force_login(User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password'))
+        self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        queries = self.changelist_queries()
+        for day in range(2, 10):
+            self.create_contract(datetime.date(2022, 2, day), datetime.date(2022, 2, day))
+        self.assertEqual(self.changelist_queries(), queries)
+
+
+    def test_contract_request_status_readonly(self):
+        self.client.force_login(User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password'))
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        response = self.client.get(reverse('admin:nifleur_contractrequest_change', args=[contract.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('status', response.context['adminform'].form.fields)
+        response = self.client.get(reverse('admin:nifleur_contractrequest_add'))
+        self.assertEqual(response.context['adminform'].form['status'].initial, get_workflow().initial_status_id)
+
+    def test_status_history_append_only(self):
+        self.client.force_login(User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password'))
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        event = ContractStatusEvent.objects.create(contract=contract, to_status=self.status_open)
+        url = reverse('admin:nifleur_contractstatusevent_delete', args=[event.id])
+        self.assertEqual(self.client.post(url, {'post': 'yes'}).status_code, 403)
+        self.assertTrue(ContractStatusEvent.objects.filter(id=event.id).exists())
+
+class WorkflowTest(ContractDataMixin, TestMessageCase):
+    def test_bulk_transition(self):
+        first = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        second = self.create_contract(datetime.date(2022, 1, 3), datetime.date(2022, 1, 4), status=self.status_ongoing)
+        last = self.create_contract(datetime.date(2022, 1, 5), datetime.date(2022, 1, 6), status=self.status_cancel)
+
+        transitions = bulk_transition([first.id, second.id, last.id], NEXT)
+        self.assertEqual(len(transitions), 2)
+        self.assertEqual(ContractRequest.objects.get(id=first.id).status, self.status_sent)
+        self.assertEqual(ContractRequest.objects.get(id=second.id).status, self.status_finish)
+        self.assertEqual(ContractRequest.objects.get(id=last.id).status, self.status_cancel)
+
+        self.assertEqual(len(bulk_transition([first.id, second.id, last.id], CANCEL)), 2)
+        self.assertEqual(ContractRequest.objects.filter(status=self.status_cancel).count(), 3)
+        self.assertEqual(ContractStatusEvent.objects.filter(contract=first).count(), 2)
+        self.assertEqual(
+            list(ContractStatusEvent.objects.filter(contract=second).values_list('from_status', 'to_status')),
+            [(self.status_ongoing.id, self.status_finish.id), (self.status_finish.id, self.status_cancel.id)]
+        )
+
+    def test_transition_graph(self):
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        with self.assertRaises(TransitionError):
+            transition(contract, BACK)
+        self.assertEqual(transition(contract, NEXT, self.rp).to_status_id, self.status_sent.id)
+        self.assertEqual(contract.status, self.status_sent)
+        self.assertEqual(ContractRequest.objects.get(id=contract.id).status, self.status_sent)
+
+        # Gaps in the positions do not break the transitions once the graph is rebuilt
+        for status in (self.status_validated, self.status_ongoing, self.status_finish, self.status_cancel):
+            Status.objects.filter(id=status.id).update(position=status.position * 10)
+        create_position_transitions()
+        self.assertEqual(get_workflow().target(self.status_ongoing.id, NEXT), self.status_finish.id)
+        self.assertEqual(get_workflow().target(self.status_sent.id, NEXT), self.status_validated.id)
+
+        # The compiled graph is reused until a transition changes, only the versions of its tables are read
+        with self.assertNumQueries(1):
+            get_workflow().target(self.status_sent.id, RESET)
+        StatusTransition.objects.filter(from_status=self.status_sent, action=RESET).delete()
+        self.assertIsNone(get_workflow().target(self.status_sent.id, RESET))
+
+        self.client.force_login(self.rp)
+        response = self.client.get(reverse('contract_request_detail', args=[contract.id]))
+        self.assertEqual(response.context['available_actions'], {
+            'reset': False, 'back': True, 'next': True, 'finish': True, 'cancel': True
+        })
+        self.assertEqual(
+            [(step['title'], step['complete'], step['current']) for step in response.context['timeline']][:3],
+            [('Ouvert', True, False), ('Envoyé', False, True), ('Validé', False, False)]
+        )
+
+        # An action keeping the status is not offered
+        StatusTransition.objects.filter(from_status=self.status_sent, action=NEXT).update(to_status=self.status_sent)
+        invalidate_workflow()
+        self.assertFalse(get_workflow().available_actions(self.status_sent.id)[NEXT])
+
+    def test_position_transitions_keep_initial_status(self):
+        StatusTransition.objects.filter(action=CREATE).update(to_status=self.status_validated)
+        create_position_transitions()
+        self.assertEqual(get_workflow().initial_status_id, self.status_validated.id)
+
+    def test_contract_status_transition_view(self):
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        url = reverse('contract_status_transition', args=[contract.id])
+        self.client.force_login(self.rp)
+        self.assertEqual(self.client.get(url).status_code, 405)
+
+        response = self.client.post(url, {'action': NEXT})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], {'id': self.status_sent.id, 'label': 'Envoyé', 'color': '#eeeeee'})
+        self.assertTrue(data['available_actions']['back'])
+        self.assertEqual([step['current'] for step in data['timeline']][:2], [False, True])
+        self.assertEqual(ContractRequest.objects.get(id=contract.id).status, self.status_sent)
+
+        response = self.client.post(url, {'action': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+    def test_bulk_change_contract_status_view(self):
+        contracts = [
+            self.create_contract(datetime.date(2022, 1, day), datetime.date(2022, 1, day)) for day in range(1, 4)
+        ]
+        self.client.force_login(self.rp)
+        response = self.client.post(
+            reverse('bulk_change_contract_status'),
+            {'contracts': [contract.id for contract in contracts[:2]], 'action': NEXT},
+            follow=True
+        )
+        self.assertMessagesContains(response, ["2 demandes de contrat sur 2 ont changé de statut"])
+        self.assertEqual(ContractRequest.objects.filter(status=self.status_sent).count(), 2)
+        self.assertEqual(ContractRequest.objects.get(id=contracts[2].id).status, self.status_open)
+
+    def test_status_analytics(self):
+        now = timezone.now()
+        for days in (1, 2, 3, 4, 10):
+            contract = self.create_contract(datetime.date(2022, 1, days), datetime.date(2022, 1, days))
+            ContractStatusEvent.objects.bulk_create([
+                ContractStatusEvent(
+                    contract=contract, to_status=self.status_open, created_at=now - datetime.timedelta(days=40)
+                ),
+                ContractStatusEvent(
+                    contract=contract, from_status=self.status_open, to_status=self.status_sent,
+                    created_at=now - datetime.timedelta(days=40 - days)
+                )
+            ])
+
+        dwell_times = status_dwell_times()
+        self.assertEqual(len(dwell_times), 1)
+        self.assertEqual(dwell_times[0].status, self.status_open)
+        self.assertEqual(dwell_times[0].count, 5)
+        self.assertEqual(dwell_times[0].median_days, 3)
+        self.assertEqual(dwell_times[0].p90_days, 7.6)
+
+        self.assertEqual([stuck.days for stuck in stuck_contracts(35)], [39, 38, 37, 36])
+        self.create_contract(datetime.date(2022, 2, 1), datetime.date(2022, 2, 1))
+        self.assertEqual(len(stuck_contracts(0)), 6)
+
+        self.client.force_login(self.rp)
+        response = self.client.get(reverse('contract_status_analytics'), {'days': 35})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['stuck_contracts']), 4)
+
+
+class ContractRequestEditTest(ContractDataMixin, TestMessageCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.rp.groups.add(Group.objects.create(name='Equipe Pédagogique'))
+
+    def post_edit(self, contract, version, **changes):
+        data = {
+            'school': contract.school_id,
+            'legal_structure': contract.legal_structure_id,
+            'speaker': contract.speaker_id,
+            'performance': contract.performance_id,
+            'applied_rate': contract.applied_rate,
+            'rate_type': contract.rate_type_id,
+            'ttc': contract.ttc,
+            'hourly_volume': contract.hourly_volume,
+            'started_at': timezone.localtime(contract.started_at).strftime('%d/%m/%Y %H:%M'),
+            'ended_at': timezone.localtime(contract.ended_at).strftime('%d/%m/%Y %H:%M'),
+            'discipline': contract.discipline_id,
+            'school_year': contract.school_year_id,
+            'rp': contract.rp_id,
+            'period': contract.period,
+            'recruitment_type': contract.recruitment_type_id,
+            'version': version.isoformat(),
+            **changes
+        }
+        return self.client.post(reverse('edit_contract_request', args=[contract.id]), data, follow=True)
+
+    def test_edit_changed_fields(self):
+        contract = self.create_contract(datetime.date(2022, 1, 1), datetime.date(2022, 1, 2))
+        company = Company.objects.create(label='ACME')
+        speaker = Speaker.objects.create(first_name='Alan', last_name='Turing', mail='alan@test.com', company=company)
+        self.client.force_login(self.rp)
+        self.assertEqual(self.client.get(reverse('edit_contract_request', args=[contract.id])).status_code, 200)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.post_edit(contract, contract.updated_at, speaker=speaker.id, hourly_volume=20)
+        self.assertMessagesContains(response, ["La demande de contrat a bien été modifiée"])
+        update = next(query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE'))
+        self.assertNotIn('"comment"', update)
+        self.assertIn('"updated_at" = ', update.split('WHERE')[1])
+
+        edited = ContractRequest.objects.get(id=contract.id)
+        self.assertEqual((edited.speaker, edited.company, edited.hourly_volume), (speaker, company, 20))
+        self.assertEqual(Discipline.objects.get(id=self.discipline.id).speaker, speaker)
+
+        response = self.post_edit(contract, contract.updated_at, hourly_volume=30)
+        self.assertIn('modifiée par un autre utilisateur', response.context['form'].non_field_errors()[0])
+        self.assertEqual(ContractRequest.objects.get(id=contract.id).hourly_volume, 20)
+
+
+class ContractRequestBatchTest(ContractDataMixin, TestMessageCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.rp.groups.add(Group.objects.create(name='Equipe Pédagogique'))
+        cls.other_speaker = Speaker.objects.create(first_name='Alan', last_name='Turing', mail='alan@test.com')
+        cls.other_discipline = Discipline.objects.create(school=cls.school, school_year=cls.school_year, label='Java')
+
+    def post_batch(self, rows):
+        data = {
+            'school': self.school.id,
+            'legal_structure': self.legal_structure.id,
+            'school_year': self.school_year.id,
+            'performance': self.performance.id,
+            'rate_type': self.hourly_rate.id,
+            'ttc': False,
+            'period': 'S1',
+            'rp': self.rp.id,
+            'recruitment_type': self.recruitment_type.id,
+            'form-TOTAL_FORMS': len(rows) + 1,
+            'form-INITIAL_FORMS': 0
+        }
+        for index, (speaker, discipline, started_at, ended_at) in enumerate(rows):
+            data.update({
+                f'form-{index}-speaker': speaker.id,
+                f'form-{index}-discipline': discipline.id,
+                f'form-{index}-started_at': started_at,
+                f'form-{index}-ended_at': ended_at,
+                f'form-{index}-hourly_volume': 10,
+                f'form-{index}-applied_rate': 50
+            })
+        self.client.force_login(self.rp)
+        return self.client.post(reverse('create_contract_requests_batch'), data, follow=True)
+
+    def test_create_batch(self):
+        response = self.post_batch([
+            (self.speaker, self.discipline, '01/02/2022', '10/02/2022'),
+            (self.speaker, self.discipline, '11/02/2022', '20/02/2022'),
+            (self.other_speaker, self.other_discipline, '01/02/2022', '10/02/2022')
+        ])
+        self.assertMessagesContains(response, ["3 demandes de contrat ont été créées"])
+        self.assertEqual(ContractRequest.objects.filter(school=self.school, status=self.status_open).count(), 3)
+        self.assertEqual(ContractStatusEvent.objects.count(), 3)
+        self.assertEqual(Discipline.objects.get(id=self.other_discipline.id).speaker, self.other_speaker)
+        self.assertEqual(Discipline.objects.get(id=self.discipline.id).speaker, self.speaker)
+
+    def test_overlapping_rows(self):
+        self.create_contract(datetime.date(2022, 3, 1), datetime.date(2022, 3, 5), speaker=self.other_speaker)
+        for rows in (
+            [(self.speaker, self.discipline, '01/02/2022', '10/02/2022'),
+             (self.speaker, self.other_discipline, '05/02/2022', '15/02/2022')],
+            [(self.other_speaker, self.discipline, '03/03/2022', '10/03/2022')]
+        ):
+            response = self.post_batch(rows)
+            self.assertEqual(response.context['formset'].non_form_errors().as_data()[0].code, 'overlap')
+        self.assertEqual(ContractRequest.objects.count(), 1)
+
+
+class RolloverTest(ContractDataMixin, TestMessageCase):
+    def test_rollover_school_year(self):
+        target = SchoolYear.objects.create(school=self.school, year='B3', label='2023', initial=True)
+        Discipline.objects.create(school=self.school, school_year=self.school_year, label='Java', speaker=self.speaker)
+        contract = self.create_contract(
+            datetime.date(2022, 9, 5), datetime.date(2022, 9, 9), status=self.status_finish, comment='Cours du soir'
+        )
+        self.create_contract(datetime.date(2022, 6, 1), datetime.date(2022, 6, 2))
+        # Cancelled contracts are not rolled over, nor contracts overlapping a contract of their speaker
+        self.create_contract(datetime.date(2022, 10, 3), datetime.date(2022, 10, 7), status=self.status_cancel)
+        self.create_contract(datetime.date(2022, 11, 7), datetime.date(2022, 11, 10))
+        self.create_contract(datetime.date(2023, 11, 7), datetime.date(2023, 11, 8), school_year=target)
+
+        self.client.force_login(self.rp)
+        data = {
+            'source': self.school_year.id,
+            'target': target.id,
+            'started_at': '01/09/2022',
+            'ended_at': '01/09/2023',
+            'target_started_at': '31/08/2023',
+            'contracts': True
+        }
+        response = self.client.post(reverse('school_year_rollover'), data, follow=True)
+        self.assertMessagesContains(response, [
+            f"2 matières et 1 demandes de contrat ont été reconduites dans {target}",
+            "1 demandes de contrat n'ont pas été reconduites, leur intervenant a déjà un contrat sur la nouvelle "
+            "période"
+        ])
+
+        self.assertQuerysetEqual(
+            Discipline.objects.filter(school_year=target).order_by('label').values_list('label', 'speaker'),
+            [('Java', self.speaker.id), ('Python', None)],
+            transform=tuple
+        )
+        clone = ContractRequest.objects.get(school_year=target, comment='Cours du soir')
+        self.assertEqual(clone.status, self.status_open)
+        self.assertEqual(clone.discipline, Discipline.objects.get(school_year=target, label='Python'))
+        self.assertEqual(clone.started_at - contract.started_at, datetime.timedelta(days=364))
+        self.assertEqual((clone.comment, clone.speaker, clone.rp), (contract.comment, contract.speaker, contract.rp))
+        self.assertEqual(ContractStatusEvent.objects.get(contract=clone).user, self.rp)
+
+        # A second rollover does not clone the same rows again
+        call_command('rollover_school_year', self.school_year.id, target.id, '2022-09-01', '2023-09-01', '2023-08-31',
+                     stdout=io.StringIO())
+        self.assertEqual(Discipline.objects.filter(school_year=target).count(), 2)
+        self.assertEqual(ContractRequest.objects.filter(school_year=target).count(), 2)
+
+
+class ContractRequestImportTest(SpoolDirMixin, ContractDataMixin, TestMessageCase):
+    def test_import_export_layout(self):
+        self.create_contract(datetime.date(2022, 2, 1), datetime.date(2022, 2, 10), comment='Cours du soir')
+        self.create_contract(datetime.date(2022, 3, 1), datetime.date(2022, 3, 10), rate_type=self.flat_rate)
+        self.client.force_login(self.rp)
+        exported = pandas.read_csv(io.BytesIO(self.client.get(reverse('export_contract_requests')).content), dtype=str)
+        ContractRequest.objects.all().delete()
+        # Imported disciplines have no school year, they are found by school
+        Discipline.objects.create(school=self.school, label='Ruby')
+        invalid = exported.iloc[[0]].assign(**{'Mail': 'inconnu@test.com', 'Date fin': '01/01/2022 09:00'})
+        exported = pandas.concat([
+            exported, invalid, exported.iloc[[1]].assign(Matière='Java'), exported.iloc[[0]],
+            exported.iloc[[1]].assign(
+                **{'Matière': 'Ruby', 'Date début': '01/04/2022 09:00', 'Date fin': '10/04/2022 18:00'}
+            )
+        ], ignore_index=True)
+        file = SimpleUploadedFile('demandes.csv', exported.to_csv(index=False, sep=';').encode())
+
+        # One query by referenced table, the workflow and the contracts of the speakers, whatever the number of rows
+        with self.assertNumQueries(23):
+            self.client.post(reverse('contract_requests_list'), {'contract_requests_file': file})
+        response = self.client.get(reverse('contract_requests_list'))
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages[0], "3 demandes de contrat ont été importées sur 6")
+        self.assertTrue(messages[1].startswith('4 erreurs sur 3 lignes invalides : <a href="/imports/'))
+        # The report is not kept in the memory of the process which imported the file
+        cache.clear()
+        report = self.client.get(messages[1].split('"')[1])
+        self.assertEqual(list(csv.reader(io.StringIO(report.content.decode()))), [
+            ['Ligne', 'Colonne', 'Valeur', 'Erreur'],
+            ['4', 'Mail', 'inconnu@test.com', 'Valeur inconnue'],
+            ['4', 'Date fin', '01/01/2022 09:00', 'La fin du contrat est avant son début'],
+            ['5', 'Matière', 'Java', 'Matière inconnue pour la promotion'],
+            ['6', 'Date début', exported.at[0, 'Date début'], "L'intervenant a déjà un contrat sur cette période"]
+        ])
+        imported = ContractRequest.objects.order_by('-id')[:3]
+        self.assertEqual(
+            [(contract.comment, contract.rate_type, contract.discipline.label) for contract in imported],
+            [(None, self.flat_rate, 'Ruby'), (None, self.flat_rate, 'Python'),
+             ('Cours du soir', self.hourly_rate, 'Python')]
+        )
+        self.assertEqual(imported[2].started_at, timezone.make_aware(datetime.datetime(2022, 2, 1, 9)))
+        self.assertEqual(ContractStatusEvent.objects.filter(contract__in=imported, user=self.rp).count(), 3)
+
+
+class ImportValidationTest(ImportJobMixin, TestMessageCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('super_user', 'superuser@test.com', 'admin_password')
+        cls.school = School.objects.create(label='ESGI')
+        SchoolYear.objects.create(school=cls.school, year='B3', initial=True)
+
+    def post_school_years(self, rows, dry_run):
+        data = {'school_year_csv': SimpleUploadedFile('promotions.csv', '\n'.join(rows).encode())}
+        if dry_run:
+            data['dry_run'] = '1'
+        return self.client.post(reverse('school_list'), data)
+
+    def test_dry_run(self):
+        self.client.force_login(self.user)
+        rows = [
+            'ESGI;B3;Bachelor 3;oui;0', 'ESGI;M1;;1;0', 'ESGI;m1;;0;1', 'EFREI;B1;;oui;non', 'ESGI;M2;Master 2;0;1',
+            'ESGI;M3;;non;0'
+        ]
+        # The school years are checked against two queries, whatever the number of rows. The form of the page is
+        # bound by the dry run field and checks its constraints with one more query.
+        with self.assertNumQueries(9):
+            self.post_school_years(rows, dry_run=True)
+        response = self.client.get(reverse('school_list'))
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages[0], "Vérification : 2 lignes valides sur 6, aucune donnée n'a été importée")
+        self.assertTrue(messages[1].startswith('4 erreurs sur 4 lignes invalides'))
+        self.assertEqual(SchoolYear.objects.count(), 1)
+
+        report = self.client.get(messages[1].split('"')[1])
+        self.assertEqual(list(csv.reader(io.StringIO(report.content.decode())))[1:], [
+            ['4', 'Ecole', 'EFREI', 'Valeur inconnue'],
+            ['3', 'Promotion', 'm1', 'Promotion en double dans le fichier'],
+            ['1', 'Promotion', 'B3', "La promotion existe déjà dans l'école"],
+            ['6', 'Alternant', '0', 'Une classe doit possède au moins des initiaux ou des alternants ou les deux']
+        ])
+        self.client.force_login(User.objects.create_user('user', 'user@test.com', 'user_password'))
+        self.assertEqual(self.client.get(messages[1].split('"')[1]).status_code, 404)
+
+        self.client.force_login(self.user)
+        # A single INSERT for the valid rows
+        with self.assertNumQueries(9):
+            response = self.post_school_years(rows, dry_run=False)
+        response = self.client.get(response.url)
+        self.assertEqual(str(list(response.context['messages'])[0]), "2 promotions ont été importées sur 6")
+        self.assertQuerysetEqual(
+            SchoolYear.objects.order_by('year').values_list('year', 'label', 'initial', 'alternating'),
+            [('B3', None, True, False), ('M1', None, True, False), ('M2', 'Master 2', False, True)],
+            transform=tuple
+        )
+
+    def test_school_year_unique_by_school(self):
+        School.objects.create(label='EFREI')
+        self.client.force_login(self.user)
+        self.post_school_years(['EFREI;B3;;1;0', 'EFREI;M1;;1;0', 'ESGI;M1;;0;1', 'ESGI;m1;;1;0'], dry_run=False)
+        self.assertQuerysetEqual(
+            SchoolYear.objects.order_by('school__label', 'year').values_list('school__label', 'year'),
+            [('EFREI', 'B3'), ('EFREI', 'M1'), ('ESGI', 'B3'), ('ESGI', 'M1')],
+            transform=tuple
+        )
+
+    def test_upload_limits(self):
+        self.client.force_login(self.user)
+
+        def upload(url, field, file):
+            response = self.client.post(reverse(url), {field: file}, follow=True)
+            return [str(message) for message in response.context['messages']]
+
+        csv_file = SimpleUploadedFile('speakers.csv', b'M.;Turing;Alan')
+        self.assertEqual(upload('speakers_list', 'speakers_csv', csv_file), [
+            "Le fichier speakers.csv n'a pas été importé : le format attendu est Excel (.xlsx)"
+        ])
+        limits = {
+            'speakers_csv': UploadLimit(('xlsx',), MB, 1),
+            'school_year_csv': UploadLimit(('csv',), MB, 1),
+            'school_csv': UploadLimit(('csv',), 10, 100),
+        }
+        with mock.patch.dict(IMPORT_UPLOAD_LIMITS, limits):
+            workbook = speakers_workbook([['M.', 'Turing', 'Alan'], ['Mme', 'Lovelace', 'Ada']])
+            self.assertEqual(upload('speakers_list', 'speakers_csv', workbook), [
+                "Le fichier speakers.xlsx n'a pas été importé : le nombre maximal de lignes est de 1"
+            ])
+            school_years = SimpleUploadedFile('promotions.csv', b'ESGI;M1;;1;0\nESGI;M2;;1;0\n')
+            self.assertEqual(upload('school_list', 'school_year_csv', school_years), [
+                "Le fichier promotions.csv n'a pas été importé : le nombre maximal de lignes est de 1"
+            ])
+            schools = SimpleUploadedFile('ecoles.csv', b'EFREI;Ecole EFREI')
+            self.assertEqual(upload('school_list', 'school_csv', schools), [
+                "Le fichier ecoles.csv n'a pas été importé : la taille maximale est de 10\xa0octets"
+            ])
+        self.assertEqual((ImportJob.objects.count(), SchoolYear.objects.count(), School.objects.count()), (0, 1, 1))
+        self.assertEqual(os.listdir(settings.IMPORT_SPOOL_DIR), [])
+
+    def test_import_statuses(self):
+        self.client.force_login(self.user)
+        rows = ['Ouvert;1;ffffff;ouvert', 'Fermé;2;#000000;3', 'Autre;x;#000000;inconnu']
+        file = SimpleUploadedFile('statuts.csv', '\n'.join(rows).encode())
+        response = self.client.post(reverse('parameters'), {'status_csv': file}, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages[0], "2 données ont été importées sur 3")
+        self.assertTrue(messages[1].startswith('3 erreurs sur 1 lignes invalides'))
+        self.assertQuerysetEqual(
+            Status.objects.order_by('position').values_list('label', 'position', 'color', 'type'),
+            [('Ouvert', 1, '#ffffff', OPEN), ('Fermé', 2, '#000000', CLOSE)],
+            transform=tuple
+        )
+        self.assertEqual(get_workflow().status_by_id.keys(), set(Status.objects.values_list('id', flat=True)))
+
+    def test_import_speakers_by_chunks(self):
+        file = speakers_workbook([
+            ['M.', 'Turing', 'Alan', 'SAS', 'Globex', None, 'alan@test.com', None, 'Mathématiques'],
+            ['Mme', 'Lovelace', 'Ada', 'sas', 'globex', '612345678', 'ada@test.com', None, 'Python'],
+            [],
+            ['M.', 'Turing', 'Alan', None, None, None, 'ALAN@test.com'],
+            ['M.', 'Babbage', 'Charles', None, None, None, 'charles@test.com', 'x' * 256],
+        ])
+        progress = []
+        report, duplicates = import_speakers(
+            file, chunk_size=2, progress=lambda *args: progress.append((args[0], args[1], args[2].imported))
+        )
+        self.assertEqual(progress, [(2, 5, 2), (4, 5, 2), (5, 5, 2)])
+        self.assertEqual((report.total, report.valid, report.imported), (4, 2, 2))
+        self.assertEqual([(error.line, error.message) for error in report.errors], [
+            (5, "Valeur en double dans le fichier"), (6, "Valeur trop longue")
+        ])
+        self.assertEqual(duplicates, [])
+        self.assertQuerysetEqual(
+            Speaker.objects.order_by('mail').values_list('mail', 'company__label', 'company__company_type__label'),
+            [('ada@test.com', 'Globex', 'SAS'), ('alan@test.com', 'Globex', 'SAS')],
+            transform=tuple
+        )
+        self.assertEqual(str(Speaker.objects.get(mail='ada@test.com').phone_number), '+33612345678')
+        self.assertEqual(find_speakers_by_skills('python'), [Speaker.objects.get(mail='ada@test.com')])
+
+    def test_import_disciplines(self):
+        file = io.BytesIO()
+        with pandas.ExcelWriter(file) as writer:
+            pandas.DataFrame([['ESGI', None, None, 'Python'], ['EFREI', None, None, 'Java']]).to_excel(
+                writer, sheet_name='B3', index=False
+            )
+            pandas.DataFrame([['ESGI', None, None, 'Docker']]).to_excel(writer, sheet_name='M1', index=False)
+        self.client.force_login(self.user)
+        for dry_run in (True, False):
+            data = {'disciplines_csv': SimpleUploadedFile('matieres.xlsx', file.getvalue())}
+            if dry_run:
+                data['dry_run'] = '1'
+            self.client.post(reverse('discipline_list'), data)
+            job = self.run_import_worker()
+            self.assertEqual(
+                (job.status, job.rows, job.valid, job.imported), (ImportJob.DONE, 3, 2, 0 if dry_run else 2)
+            )
+            self.assertEqual(Discipline.objects.count(), 0 if dry_run else 2)
+
+        # Other users can not follow the import
+        self.client.force_login(User.objects.create_user('user', 'user@test.com', 'user_password'))
+        self.assertEqual(self.client.get(reverse('import_job_progress', args=[job.id])).status_code, 404)
+        self.client.force_login(self.user)
+        report = self.client.get(self.client.get(reverse('import_job_progress', args=[job.id])).json()['report_url'])
+        self.assertEqual(
+            list(csv.reader(io.StringIO(report.content.decode())))[1:], [['3', 'B3 - 0', 'EFREI', 'Valeur inconnue']]
+        )
+        self.assertQuerysetEqual(
+            Discipline.objects.order_by('label').values_list('school__label', 'label'),
+            [('ESGI', 'Docker'), ('ESGI', 'Python')],
+            transform=tuple
+        )
+
+    def test_stale_import_job(self):
+        file = io.BytesIO()
+        pandas.DataFrame([['ESGI', None, None, 'Python']]).to_excel(file, sheet_name='B3', index=False)
+        self.client.force_login(self.user)
+        self.client.post(reverse('discipline_list'), {
+            'disciplines_csv': SimpleUploadedFile('matieres.xlsx', file.getvalue())
+        })
+        # The worker stopped while it imported the file
+        job = claim_import_job()
+        self.assertEqual(job.status, ImportJob.RUNNING)
+        ImportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - STALE_JOB_TIMEOUT / 2)
+        self.assertEqual(fail_stale_import_jobs(), 0)
+
+        ImportJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - STALE_JOB_TIMEOUT)
+        job = self.run_import_worker()
+        self.assertEqual((job.status, job.message), (ImportJob.FAILED, INTERRUPTED_MESSAGE))
+        self.assertEqual(Discipline.objects.count(), 0)
+
+    def test_slow_worker_keeps_stale_failure(self):
+        file = io.BytesIO()
+        pandas.DataFrame([['ESGI', None, None, 'Python']]).to_excel(file, sheet_name='B3', index=False)
+        self.client.force_login(self.user)
+        self.client.post(reverse('discipline_list'), {
+            'disciplines_csv': SimpleUploadedFile('matieres.xlsx', file.getvalue())
+        })
+
+        def slow_import(*args, **kwargs):
+            # The job is failed as stale while the worker finishes it
+            report = import_disciplines(*args, **kwargs)
+            ImportJob.objects.update(heartbeat_at=timezone.now() - STALE_JOB_TIMEOUT)
+            self.assertEqual(fail_stale_import_jobs(), 1)
+            return report
+
+        with mock.patch('nifleur.jobs.import_disciplines', slow_import):
+            job = self.run_import_worker()
+        self.assertEqual((job.status, job.message), (ImportJob.FAILED, INTERRUPTED_MESSAGE))
+        run = ImportRun.objects.get()
+        self.assertEqual((run.committed, run.interrupted), (1, True))
+
+    def test_resume_interrupted_import(self):
+        file = io.BytesIO()
+        pandas.DataFrame([['ESGI', None, None, 'Python'], ['ESGI', None, None, 'Java']]) \
+            .to_excel(file, sheet_name='B3', index=False)
+        self.client.force_login(self.user)
+
+        def upload():
+            response = self.client.post(reverse('discipline_list'), {
+                'disciplines_csv': SimpleUploadedFile('matieres.xlsx', file.getvalue())
+            }, follow=True)
+            return [str(message) for message in response.context['messages']]
+
+        # The second chunk of disciplines fails once the first one is committed
+        bulk_create = Discipline.objects.bulk_create
+        calls = []
+
+        def failing_bulk_create(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 2:
+                raise OperationalError('connexion perdue')
+            return bulk_create(objs, *args, **kwargs)
+
+        upload()
+        with mock.patch('nifleur.jobs.import_disciplines', functools.partial(import_disciplines, chunk_size=1)), \
+                mock.patch.object(Discipline.objects, 'bulk_create', failing_bulk_create):
+            job = self.run_import_worker()
+        self.assertEqual((job.status, job.message), (ImportJob.FAILED, 'connexion perdue'))
+        run = ImportRun.objects.get()
+        self.assertEqual((run.committed, run.imported, run.interrupted), (1, 1, True))
+        self.assertEqual(Discipline.objects.count(), 1)
+
+        self.assertTrue(upload()[0].startswith("L'import du fichier matieres.xlsx avait été interrompu"))
+        job = self.run_import_worker()
+        self.assertEqual(job.status, ImportJob.DONE)
+        self.assertTrue(job.message.startswith('Import repris après une interruption'))
+        run.refresh_from_db()
+        self.assertEqual((run.job, run.committed, run.imported, run.finished), (job, 2, 2, True))
+        self.assertQuerysetEqual(
+            Discipline.objects.order_by('label').values_list('label', flat=True), ['Java', 'Python']
+        )
+
+    def test_import_same_file_once(self):
+        file = io.BytesIO()
+        pandas.DataFrame([['ESGI', None, None, 'Python']]).to_excel(file, sheet_name='B3', index=False)
+        self.client.force_login(self.user)
+
+        def upload(**data):
+            data['disciplines_csv'] = SimpleUploadedFile('matieres.xlsx', file.getvalue())
+            response = self.client.post(reverse('discipline_list'), data, follow=True)
+            return [str(message) for message in response.context['messages']]
+
+        upload()
+        run = ImportRun.objects.get()
+        self.assertFalse(run.finished)
+        self.assertTrue(upload(dry_run='1')[0].startswith('Le fichier matieres.xlsx sera importé'))
+        self.assertTrue(upload()[0].startswith("Un fichier identique à matieres.xlsx est en cours d'import"))
+        self.assertTrue(upload(force='1')[0].startswith("Un fichier identique à matieres.xlsx est en cours d'import"))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ImportRun.objects.create(kind=run.kind, sha256=run.sha256, name='copie.xlsx')
+        self.assertEqual(ImportJob.objects.count(), 2)
+
+        self.run_import_worker()
+        self.run_import_worker()
+        run.refresh_from_db()
+        self.assertEqual((run.rows, run.imported, run.errors), (1, 1, 0))
+        self.assertEqual(run.sha256, hashlib.sha256(file.getvalue()).hexdigest())
+        messages = upload()
+        self.assertTrue(messages[0].startswith('Un fichier identique à matieres.xlsx a déjà été importé le'))
+        self.assertTrue(messages[0].endswith('1 lignes importées sur 1, 0 erreurs. Cochez « Importer à nouveau » '
+                                             'pour forcer son import'))
+        self.assertEqual((ImportJob.objects.count(), os.listdir(settings.IMPORT_SPOOL_DIR)), (2, []))
+
+        upload(force='1')
+        self.run_import_worker()
+        self.assertEqual((Discipline.objects.count(), ImportRun.objects.count()), (2, 2))
+
+
+class StaticFilesTest(TestCase):
+    def test_bundles(self):
+        source = FileSystemStorage(settings.STATICFILES_DIRS[0])
+        paths = {path: (source, path) for files in BUNDLES.values() for path in files}
+        with tempfile.TemporaryDirectory() as root:
+            storage = CompressedManifestStaticFilesStorage(location=root, base_url='/static/')
+            for path in paths:
+                with source.open(path) as file:
+                    storage.save(path, file)
+            list(storage.post_process(paths))
+
+            hashed_name = storage.hashed_files['css/base.bundle.css']
+            self.assertRegex(hashed_name, r'^css/base\.bundle\.[0-9a-f]{12}\.css$')
+            with storage.open(hashed_name) as file:
+                content = file.read()
+            self.assertIn(b'/* css/main.css */', content)
+            with open(storage.path(f'{hashed_name}.gz'), 'rb') as file:
+                self.assertEqual(gzip.decompress(file.read()), content)
+
+            self.assertEqual(bundle_files('js/base.bundle.js', storage), ['js/base.bundle.js'])
+            with self.settings(DEBUG=True):
+                self.assertEqual(bundle_files('js/base.bundle.js', storage), ['js/notification.js', 'js/main.js'])
+
+            # A file missing from a loaded manifest is an error, unless debugging
+            with self.assertRaises(ValueError):
+                storage.stored_name('js/missing.js')
+            with self.settings(DEBUG=True):
+                self.assertEqual(storage.stored_name('js/missing.js'), 'js/missing.js')
+            with tempfile.TemporaryDirectory() as empty:
+                storage = CompressedManifestStaticFilesStorage(location=empty)
+                self.assertEqual(storage.stored_name('js/missing.js'), 'js/missing.js')
@@ -0,0 +1,139 @@
+import codecs
+import hashlib
+import os
+import tempfile
+import zipfile
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from django.template.defaultfilters import filesizeformat
+
+from nifleur.imports import open_workbook, estimated_rows
+
+MB = 1024 * 1024
+UploadLimit = namedtuple('UploadLimit', ['formats', 'max_size', 'max_rows'])
+LABELS_LIMIT = UploadLimit(('csv',), 1 * MB, 10000)
+# Accepted formats, maximum size in bytes and maximum number of rows of the file of each import field
+IMPORT_UPLOAD_LIMITS = {
+    'speakers_csv': UploadLimit(('xlsx',), 20 * MB, 100000),
+    'disciplines_csv': UploadLimit(('xlsx',), 20 * MB, 100000),
+    'contract_requests_file': UploadLimit(('csv', 'xlsx'), 20 * MB, 100000),
+    'school_csv': LABELS_LIMIT,
+    'school_year_csv': LABELS_LIMIT,
+    'performance_csv': LABELS_LIMIT,
+    'recruitment_type_csv': LABELS_LIMIT,
+    'rate_type_csv': LABELS_LIMIT,
+    'company_type_csv': LABELS_LIMIT,
+    'unit_csv': LABELS_LIMIT,
+    'legal_structure_csv': LABELS_LIMIT,
+    'status_csv': LABELS_LIMIT,
+}
+FORMAT_LABELS = {'csv': 'CSV', 'xlsx': 'Excel (.xlsx)'}
+
+
+def sniff_format(head):
+    """ Format of a file from its first bytes: xlsx (zip archive), xls (OLE2 document), csv (UTF-8 text) or None """
+    if head.startswith(b'PK\x03\x04'):
+        return 'xlsx'
+    if head.startswith(b'\xd0\xcf\x11\xe0'):
+        return 'xls'
+    if b'\x00' in head:
+        return None
+    try:
+        # The chunk may end in the middle of a character
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except UnicodeDecodeError:
+        return None
+    return 'csv'
+
+
+class ImportUploadedFile(TemporaryUploadedFile):
+    """
+    Import file written by chunks in the spool directory so the jobs can move it instead of copying it
+
+    Attributes:
+
+    - :class:`str` format -> format sniffed from the first bytes of the file
+    - :class:`str` sha256 -> hexadecimal SHA-256 of the content of the file
+    - :class:`int` lines -> number of lines of a CSV file
+    - :class:`str` error -> reason why the file is refused, its content is not kept
+    """
+    def __init__(self, name, content_type, size, charset, content_type_extra=None):
+        os.makedirs(settings.IMPORT_SPOOL_DIR, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(
+            prefix='upload-', suffix=os.path.splitext(name)[1].lower(), dir=settings.IMPORT_SPOOL_DIR
+        )
+        super(TemporaryUploadedFile, self).__init__(file, name, content_type, size, charset, content_type_extra)
+        self.format, self.sha256, self.lines, self.error = None, None, 0, None
+
+
+class ImportUploadHandler(FileUploadHandler):
+    """
+    Stream the files of the import fields to the disk, they are hashed, sniffed and checked against the limits of
+    their field while they are received so the memory used does not depend on their size. The other files are passed
+    to the next handlers.
+    """
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.limit = IMPORT_UPLOAD_LIMITS.get(field_name)
+        if self.limit is None:
+            return
+        self.file = ImportUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.digest = hashlib.sha256()
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.limit is None:
+            return raw_data
+        if self.file.error:
+            return None
+
+        if start == 0:
+            self.file.format = sniff_format(raw_data)
+            if self.file.format not in self.limit.formats:
+                return self.refuse("le format attendu est {}".format(
+                    ' ou '.join(FORMAT_LABELS[file_format] for file_format in self.limit.formats)
+                ))
+        if start + len(raw_data) > self.limit.max_size:
+            return self.refuse(f"la taille maximale est de {filesizeformat(self.limit.max_size)}")
+        if self.file.format == 'csv':
+            self.file.lines += raw_data.count(b'\n')
+            if self.file.lines > self.limit.max_rows:
+                return self.refuse(f"le nombre maximal de lignes est de {self.limit.max_rows}")
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+        return None
+
+    def refuse(self, error):
+        """ Stop writing a refused file and drop what is already written """
+        self.file.error = error
+        self.file.seek(0)
+        self.file.truncate()
+        return None
+
+    def file_complete(self, file_size):
+        if self.limit is None:
+            return None
+        self.file.flush()
+        if self.file.format == 'xlsx' and not self.file.error:
+            self.check_workbook()
+        self.file.seek(0)
+        self.file.size = 0 if self.file.error else file_size
+        self.file.sha256 = self.digest.hexdigest()
+        return self.file
+
+    def check_workbook(self):
+        """ The number of rows of a workbook is read from the dimensions of its sheets, without reading the rows """
+        try:
+            workbook = open_workbook(self.file.temporary_file_path())
+        except (zipfile.BadZipFile, KeyError, OSError):
+            self.refuse("le fichier n'est pas un classeur Excel valide")
+            return
+        try:
+            if sum(estimated_rows(sheet) for sheet in workbook.worksheets) > self.limit.max_rows:
+                self.refuse(f"le nombre maximal de lignes est de {self.limit.max_rows}")
+        finally:
+            workbook.close()
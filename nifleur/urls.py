@@ -11,10 +11,24 @@ urlpatterns = [
     path('parameters/<str:model>/<int:object_id>/edit', views.edit_simple_form, name='edit_simple_form'),
     path('parameters/<str:model>/<int:object_id>/delete', views.delete_model_object, name='delete_model_object'),
 
+    path('imports/<str:token>/report', views.import_error_report, name='import_error_report'),
+    path('imports/jobs/<int:job_id>/progress', views.import_job_progress, name='import_job_progress'),
+    path('imports/jobs/<int:job_id>/report', views.import_job_report, name='import_job_report'),
+
     path('contract_requests', views.contract_requests_list, name='contract_requests_list'),
     path('contract_requests/new', views.create_contract_request, name='create_contract_request'),
+    path('contract_requests/batch', views.create_contract_requests_batch, name='create_contract_requests_batch'),
+    path('contract_requests/status', views.bulk_change_contract_status, name='bulk_change_contract_status'),
+    path('contract_requests/analytics', views.contract_status_analytics, name='contract_status_analytics'),
+    path('contract_requests/forecast', views.contract_requests_forecast, name='contract_requests_forecast'),
     path('contract_requests/download', views.export_contract_requests, name='export_contract_requests'),
     path('contract_requests/<int:contract_id>/details', views.contract_request_detail, name='contract_request_detail'),
+    path('contract_requests/<int:contract_id>/edit', views.edit_contract_request, name='edit_contract_request'),
+    path(
+        'contract_requests/<int:contract_id>/status',
+        views.contract_status_transition,
+        name='contract_status_transition'
+    ),
     path(
         'contract_requests/<int:contract_id>/details/<str:action>/',
         views.change_contract_status,
@@ -22,12 +36,15 @@ urlpatterns = [
     ),
 
     path('speakers', views.speakers_list, name='speakers_list'),
+    path('speakers/search', views.search_speakers, name='search_speakers'),
     path('speakers/<int:speaker_id>/details', views.speaker_details, name='speaker_details'),
     path('speakers/new', views.speaker_form, name='speaker_form'),
 
     path('disciplines', views.discipline_list, name='discipline_list'),
+    path('disciplines/assignment', views.discipline_assignment, name='discipline_assignment'),
 
     path('schools', views.school_list, name='school_list'),
+    path('schools/rollover', views.school_year_rollover, name='school_year_rollover'),
     path('schools/<int:school_id>/details', views.school_details, name='school_details'),
 
     path('companies', views.company_list, name='company_list'),
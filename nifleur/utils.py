@@ -1,7 +1,10 @@
 import csv
+import re
+import unicodedata
 
 import xlwt as xlwt
 from django.http import HttpResponse
+from django.utils import timezone
 from django.utils.formats import date_format
 
 
@@ -43,4 +46,24 @@ def export_csv(filename: str, data: list, excel: bool = False):
 
 
 def short_datetime(date):
-    return date_format(date, "SHORT_DATETIME_FORMAT")
+    return date_format(timezone.localtime(date), "SHORT_DATETIME_FORMAT")
+
+
+# Words ignored when comparing free texts (disciplines, areas of expertise...)
+STOP_WORDS = {
+    'de', 'du', 'des', 'la', 'le', 'les', 'et', 'en', 'un', 'une', 'au', 'aux', 'a', 'l', 'd', 'pour', 'sur', 'par',
+    'avec', 'the', 'of', 'and', 'to', 'in'
+}
+
+
+def normalize_text(value):
+    """ Lowercase a text and remove its accents: 'Économie' -> 'economie' """
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    return ''.join(char for char in value if not unicodedata.combining(char)).lower().strip()
+
+
+def tokenize(value):
+    """ Split a text into its normalized words, without the stop words """
+    return [word for word in re.findall(r'[a-z0-9+#]+', normalize_text(value)) if word not in STOP_WORDS]
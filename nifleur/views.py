@@ -1,25 +1,38 @@
-import codecs
-import csv
 import datetime
 
-import pandas as pandas
 from django.apps import apps
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User, Permission
-from django.db import IntegrityError
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.utils.datastructures import MultiValueDictKeyError
-
+from django.utils.html import format_html
+from django.views.decorators.http import require_POST
+
+from nifleur.analytics import status_dwell_times, stuck_contracts, STUCK_DAYS
+from nifleur.assignment import propose_assignments, apply_assignments
+from nifleur.conditional import versioned_page
+from nifleur.contracts import speaker_choices, discipline_choices, assign_discipline_speakers, \
+    create_contract_requests
+from nifleur.forecast import get_forecast
 from nifleur.forms import DisciplineForm, SpeakerForm, ContractRequestForm, PerformanceForm, SchoolYearForm, \
     SchoolForm, RecruitmentTypeForm, RateTypeForm, CompanyTypeForm, UnitForm, RegisterForm, LegalStructureForm, \
-    SchoolYearDetailForm, CompanyForm
-from nifleur.models import ContractRequest, Speaker, Discipline, School, Performance, SchoolYear, Status, \
-    RecruitmentType, RateType, CompanyType, Unit, LegalStructure, Company, STATUS_CHOICES, CLOSE, BEGINNER, \
-    INTERMEDIATE, EXPERT
+    SchoolYearDetailForm, CompanyForm, AssignmentFilterForm, AssignmentForm, ContractRequestEditForm, \
+    ContractRequestBatchForm, ContractRequestRowFormSet, RolloverForm
+from nifleur.imports import import_contract_requests, import_labels, import_schools, import_school_years, \
+    store_error_report, get_error_report, ERROR_REPORT_HEADER
+from nifleur.jobs import spool_import_job, recent_import_jobs, import_job_progress_data
+from nifleur.models import ContractRequest, Speaker, Discipline, School, Performance, Status, RecruitmentType, \
+    RateType, CompanyType, Unit, LegalStructure, Company, ImportJob, SchoolYear
+from nifleur.rollover import rollover_school_year
+from nifleur.skills import find_speakers_by_skills
 from nifleur.utils import export_csv, short_datetime
+from nifleur.workflow import ACTIONS, Transition, TransitionError, get_workflow, transition, bulk_transition, \
+    record_transitions
 
 
 @login_required
@@ -61,36 +74,96 @@ def logout_user(request):
     return redirect(login_user)
 
 
+def import_report_messages(request, report, imported_message):
+    """
+    Summary of an import or of its dry run, the invalid rows are listed in a downloadable CSV report instead of a
+    message by row
+    """
+    if request.POST.get('dry_run'):
+        messages.info(
+            request, f"Vérification : {report.valid} lignes valides sur {report.total}, aucune donnée n'a été importée"
+        )
+    else:
+        messages.success(request, imported_message)
+    if report.errors:
+        token = store_error_report(report.errors, request.user)
+        messages.warning(request, format_html(
+            '{} erreurs sur {} lignes invalides : <a href="{}">télécharger le rapport</a>',
+            len(report.errors), report.total - report.valid, reverse('import_error_report', args=[token])
+        ))
+
+
+@login_required
+def import_error_report(request, token):
+    report = get_error_report(token, request.user)
+    if report is None:
+        raise Http404("Le rapport d'import n'existe plus")
+    return export_csv('rapport_import', report)
+
+
+def upload_refused(request, file):
+    """ Error message of an import file refused by ImportUploadHandler: wrong format, too large or too many rows """
+    if getattr(file, 'error', None):
+        messages.error(request, f"Le fichier {file.name} n'a pas été importé : {file.error}")
+        return True
+    return False
+
+
+def queue_import_job(request, file, kind):
+    """
+    Queue the import of an uploaded file, a file already imported is short-circuited with its previous result and an
+    interrupted import is resumed
+    """
+    if upload_refused(request, file):
+        return None
+    job, previous = spool_import_job(
+        file, kind, request.user, dry_run=bool(request.POST.get('dry_run')), force=bool(request.POST.get('force'))
+    )
+    if job is not None and previous is not None:
+        messages.info(
+            request,
+            f"L'import du fichier {job.name} avait été interrompu, il reprendra en arrière-plan là où il s'était "
+            f"arrêté, suivez sa progression sur cette page"
+        )
+    elif job is not None:
+        messages.info(
+            request, f"Le fichier {job.name} sera importé en arrière-plan, suivez sa progression sur cette page"
+        )
+    elif not previous.finished:
+        messages.warning(
+            request,
+            f"Un fichier identique à {file.name} est en cours d'import depuis le {short_datetime(previous.created_at)}"
+            f", il n'a pas été importé à nouveau"
+        )
+    else:
+        messages.warning(
+            request,
+            f"Un fichier identique à {file.name} a déjà été importé le {short_datetime(previous.finished_at)} : "
+            f"{previous.imported} lignes importées sur {previous.rows}, {previous.errors} erreurs. Cochez « Importer "
+            f"à nouveau » pour forcer son import"
+        )
+    return job
+
+
+@login_required
+def import_job_progress(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    return JsonResponse(import_job_progress_data(job))
+
+
+@login_required
+def import_job_report(request, job_id):
+    job = get_object_or_404(ImportJob, id=job_id, user=request.user)
+    return export_csv(f'rapport_import_{job.id}', [ERROR_REPORT_HEADER, *job.errors])
+
+
 @login_required
-def import_data(request, file, model, status=False):
+def import_data(request, file, model):
+    if upload_refused(request, file):
+        return None
     django_model = apps.get_model(app_label='nifleur', model_name=model)
-    csv_reader = csv.reader(codecs.iterdecode(file, 'utf-8'), delimiter=';')
-    for row in csv_reader:
-        try:
-            name = row[0]
-            if status:
-                color = row[2] if row[2][0] == '#' else f'#{row[2]}'
-                s_type = row[3]
-                status_type = None
-                for index, l_type in enumerate(STATUS_CHOICES):
-                    if s_type == l_type[0]:
-                        status_type = s_type
-                        break
-                    elif s_type == l_type[1]:
-                        status_type = STATUS_CHOICES[index][0]
-                        break
-                if not s_type:
-                    messages.error(request, f"Le statut {name} contient un type erroné : {s_type}")
-                    continue
-                django_model.objects.create(label=name, position=row[1], color=color, type=status_type)
-            else:
-                django_model.objects.create(label=name)
-        except IntegrityError as e:
-            if request.user.is_superuser:
-                messages.error(request, e)
-            else:
-                messages.error(request, f"La donnée nommée {row[0]} existe déjà")
-    return messages.info(request, f"Des données on été importées")
+    report = import_labels(file, django_model, dry_run=bool(request.POST.get('dry_run')))
+    return import_report_messages(request, report, f"{report.imported} données ont été importées sur {report.total}")
 
 
 @login_required
@@ -204,7 +277,7 @@ def parameters(request):
             import_data(request, legal_structure_csv, 'LegalStructure')
             return redirect(parameters)
         elif status_csv:
-            import_data(request, status_csv, 'Status', True)
+            import_data(request, status_csv, 'Status')
             return redirect(parameters)
 
     return render(request, 'nifleur/parameters.html', {
@@ -257,65 +330,174 @@ def edit_simple_form(request, model, object_id):
 
 
 @login_required
+@versioned_page(
+    ContractRequest, Speaker, Company, School, SchoolYear, Discipline, Status, Performance, RecruitmentType, RateType,
+    Unit, LegalStructure
+)
 def contract_requests_list(request):
     contract_requests = ContractRequest.objects.all()
-    return render(request, 'nifleur/contract_requests.html', {'contract_requests': contract_requests})
+    if request.method == 'POST':
+        try:
+            contract_requests_file = request.FILES['contract_requests_file']
+        except MultiValueDictKeyError:
+            pass
+        else:
+            if upload_refused(request, contract_requests_file):
+                return redirect(contract_requests_list)
+            report = import_contract_requests(
+                contract_requests_file, request.user, dry_run=bool(request.POST.get('dry_run'))
+            )
+            import_report_messages(
+                request, report, f"{report.imported} demandes de contrat ont été importées sur {report.total}"
+            )
+            return redirect(contract_requests_list)
+
+    return render(request, 'nifleur/contract_requests.html', {
+        'contract_requests': contract_requests,
+        'actions': ACTIONS
+    })
 
 
 @login_required
 def contract_request_detail(request, contract_id):
     contract = get_object_or_404(ContractRequest, id=contract_id)
-    status = Status.objects.all().order_by('position')
+    workflow = get_workflow()
     return render(request, 'nifleur/contract_request_details.html', {
         'contract': contract,
-        'status': status
+        'timeline': workflow.timeline(contract.status_id),
+        'available_actions': workflow.available_actions(contract.status_id)
     })
 
 
 @login_required
 def change_contract_status(request, contract_id, action):
     contract = get_object_or_404(ContractRequest, id=contract_id)
-    if action == 'reset':
-        status = Status.objects.get(position=1)
-        contract.status = status
-        contract.save()
-    elif action == 'back' and contract.status.can_back:
-        status = Status.objects.get(position=contract.status.position - 1)
-        contract.status = status
-        contract.save()
-    elif action == 'next' and contract.status.can_next:
-        status = Status.objects.get(position=contract.status.position + 1)
-        contract.status = status
-        contract.save()
-    elif action == 'finish':
-        status = Status.objects.filter(type=CLOSE).first()
-        contract.status = status
-        contract.save()
-    elif action == 'cancel':
-        status = Status.objects.filter(type=CLOSE).last()
-        contract.status = status
-        contract.save()
-    else:
+    try:
+        transition(contract, action, request.user)
+    except TransitionError:
         messages.error(request, "Une erreur est survenue")
     return redirect(contract_request_detail, contract_id)
 
 
+@login_required
+@require_POST
+def contract_status_transition(request, contract_id):
+    contract = get_object_or_404(ContractRequest.objects.only('id', 'status_id'), id=contract_id)
+    try:
+        transition(contract, request.POST.get('action'), request.user)
+    except TransitionError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    workflow = get_workflow()
+    status = workflow.status_by_id[contract.status_id]
+    return JsonResponse({
+        'status': {'id': status.id, 'label': status.label, 'color': status.color},
+        'available_actions': workflow.available_actions(status.id),
+        'timeline': workflow.timeline(status.id)
+    })
+
+
+@login_required
+@require_POST
+def bulk_change_contract_status(request):
+    contract_ids = [int(contract_id) for contract_id in request.POST.getlist('contracts') if contract_id.isdigit()]
+    try:
+        transitions = bulk_transition(contract_ids, request.POST.get('action'), request.user)
+    except TransitionError:
+        messages.error(request, "Une erreur est survenue")
+    else:
+        messages.success(
+            request,
+            f"{len(transitions)} demandes de contrat sur {len(contract_ids)} ont changé de statut"
+        )
+    return redirect(contract_requests_list)
+
+
+@login_required
+def contract_status_analytics(request):
+    try:
+        days = max(int(request.GET.get('days', STUCK_DAYS)), 0)
+    except ValueError:
+        days = STUCK_DAYS
+    return render(request, 'nifleur/contract_status_analytics.html', {
+        'dwell_times': status_dwell_times(),
+        'stuck_contracts': stuck_contracts(days),
+        'days': days
+    })
+
+
 @login_required
 def create_contract_request(request):
-    default_state = Status.objects.get(position=4)
-    form = ContractRequestForm(request.POST or None, initial={'status': default_state})
+    form = ContractRequestForm(request.POST or None, initial={'status': get_workflow().initial_status_id})
     if form.is_valid():
         contract_request = form.save(commit=False)
         contract_request.company = contract_request.speaker.company
         contract_request.save()
-        discipline = get_object_or_404(Discipline, id=contract_request.discipline.id)
-        discipline.speaker = contract_request.speaker
-        discipline.save()
+        record_transitions([Transition(contract_request.id, None, contract_request.status_id)], request.user)
+        assign_discipline_speakers({contract_request.discipline_id: contract_request.speaker_id})
         messages.success(request, "La demande de contrat a bien été créée")
         return redirect(contract_request_detail, contract_request.id)
     return render(request, 'nifleur/contract_request_form.html', {'form': form})
 
 
+@login_required
+def edit_contract_request(request, contract_id):
+    contract_request = get_object_or_404(ContractRequest, id=contract_id)
+    form = ContractRequestEditForm(request.POST or None, instance=contract_request)
+    if form.is_valid():
+        changed_fields = [field for field in form.changed_data if field != 'version']
+        if not changed_fields:
+            messages.info(request, "La demande de contrat n'a pas été modifiée")
+            return redirect(contract_request_detail, contract_id)
+
+        contract_request = form.save(commit=False)
+        if 'speaker' in changed_fields:
+            contract_request.company = contract_request.speaker.company
+            changed_fields.append('company')
+        contract_request.updated_at = timezone.now()
+        # Only the changed fields are written, and only if nobody saved the contract request since it was loaded
+        updated = ContractRequest.objects.filter(id=contract_id, updated_at=form.cleaned_data['version']).update(
+            updated_at=contract_request.updated_at,
+            **{field: getattr(contract_request, field) for field in changed_fields}
+        )
+        if updated:
+            if 'speaker' in changed_fields or 'discipline' in changed_fields:
+                assign_discipline_speakers({contract_request.discipline_id: contract_request.speaker_id})
+            messages.success(request, "La demande de contrat a bien été modifiée")
+            return redirect(contract_request_detail, contract_id)
+        form.add_error(
+            None,
+            "La demande de contrat a été modifiée par un autre utilisateur, rechargez la page pour la modifier"
+        )
+    return render(request, 'nifleur/contract_request_form.html', {
+        'form': form,
+        'title': 'Modifier la demande de contrat'
+    })
+
+
+@login_required
+def create_contract_requests_batch(request):
+    form = ContractRequestBatchForm(request.POST or None)
+    formset = ContractRequestRowFormSet(request.POST or None, form_kwargs={
+        'speaker_choices': speaker_choices(),
+        'discipline_choices': discipline_choices()
+    })
+    form_valid = form.is_valid()
+    if formset.is_valid() and form_valid:
+        rows = [row for row in formset.cleaned_data if row]
+        if rows:
+            contract_requests = create_contract_requests(form.cleaned_data, rows, request.user)
+            messages.success(request, f"{len(contract_requests)} demandes de contrat ont été créées")
+            return redirect(contract_requests_list)
+        form.add_error(None, "Saisissez au moins une demande de contrat")
+    return render(request, 'nifleur/contract_requests_batch.html', {'form': form, 'formset': formset})
+
+
+@login_required
+def contract_requests_forecast(request):
+    return JsonResponse(get_forecast())
+
+
 @login_required
 def export_contract_requests(request):
     contract_requests = ContractRequest.objects.all()
@@ -325,11 +507,12 @@ def export_contract_requests(request):
         'Unité', 'Date début', 'Date fin', 'Matière', 'Promotion', 'Initial', 'alternant', 'Période', 'RP', 'Téléphone',
         'Mail', 'Type de recrutement', 'Intitulé du diplôme le plus élevé', 'Domaine de compétence principal',
         'Domaine de compétence 2', 'Domaine de compétence 3', "Niveau d'expertise en pédagogie",
-        "Niveau d'expertise matière professionnelle"
+        "Niveau d'expertise matière professionnelle", 'Structure juridique'
     ]]
     for contract in contract_requests:
         ttc = 'TTC' if contract.ttc else 'SST'
         unit = contract.unit.label if contract.unit else ''
+        phone_number = contract.speaker.phone_number.as_national if contract.speaker.phone_number else ''
         if contract.speaker.company:
             company = contract.speaker.company.label
             company_type = contract.speaker.company.company_type
@@ -343,17 +526,18 @@ def export_contract_requests(request):
             contract.hourly_volume, unit, short_datetime(contract.started_at),
             short_datetime(contract.ended_at), contract.discipline.label, contract.school_year.year,
             contract.school_year.initial, contract.school_year.alternating, contract.get_period_display(),
-            contract.rp.get_full_name(), contract.speaker.phone_number.as_national,
+            contract.rp.get_full_name(), phone_number,
             contract.speaker.mail, contract.recruitment_type.label, contract.speaker.highest_degree,
             contract.speaker.main_area_of_expertise, contract.speaker.second_area_of_expertise,
             contract.speaker.third_area_of_expertise, contract.speaker.get_teaching_expertise_level_display(),
-            contract.speaker.get_professional_expertise_level_display()
+            contract.speaker.get_professional_expertise_level_display(), contract.legal_structure.label
         ])
     xls = request.GET.get('xls')
     return export_csv('demandes_de_contrat', data, True if xls else False)
 
 
 @login_required
+@versioned_page(Speaker, Company, CompanyType, ImportJob)
 def speakers_list(request):
     speakers = Speaker.objects.all()
     edit_instance = request.GET.get('edit_instance', None)
@@ -374,95 +558,32 @@ def speakers_list(request):
         except MultiValueDictKeyError:
             pass
         else:
-            df = pandas.read_excel(speakers_csv)
-            columns = df.columns
-
-            total = 0
-            total_error = 0
-            beginner_level = ['Débutant', 'D']
-            intermediate_level = ['Confirmé', 'C']
-            expert_level = ['Expert', 'E']
-
-            for index, row in df.iterrows():
-                get_civility = row[columns[0]]
-                last_name = row[columns[1]]
-                first_name = row[columns[2]]
-                get_company_type = row[columns[3]] if not str(row[columns[3]]) == 'nan' else None
-                get_company = row[columns[4]] if not str(row[columns[4]]) == 'nan' else None
-                phone_number = row[columns[5]] if not str(row[columns[5]]) == 'nan' else None
-                mail = row[columns[6]]
-                diploma = row[columns[7]] if not str(row[columns[7]]) == 'nan' else None
-                skills1 = row[columns[8]] if not str(row[columns[8]]) == 'nan' else None
-                skills2 = row[columns[9]] if not str(row[columns[9]]) == 'nan' else None
-                skills3 = row[columns[10]] if not str(row[columns[10]]) == 'nan' else None
-                get_teaching = row[columns[11]] if not str(row[columns[11]]) == 'nan' else None
-                get_pro = row[columns[12]] if not str(row[columns[12]]) == 'nan' else None
-
-                if len(str(phone_number)) == 9:
-                    phone_number = f'0{phone_number}'
-
-                if get_civility == 'M.':
-                    civility = Speaker.MEN
-                else:
-                    civility = Speaker.WOMEN
-
-                if get_company:
-                    if get_company_type:
-                        company = CompanyType.objects.get_or_create(label=get_company_type)
-                    else:
-                        company = None
-                    company = Company.objects.get_or_create(label=get_company, company_type=company)
-                else:
-                    company = None
-
-                if get_teaching in beginner_level:
-                    teaching = BEGINNER
-                elif get_teaching in intermediate_level:
-                    teaching = INTERMEDIATE
-                elif get_teaching in expert_level:
-                    teaching = EXPERT
-                else:
-                    teaching = None
-
-                if get_pro in beginner_level:
-                    pro = BEGINNER
-                elif get_pro in intermediate_level:
-                    pro = INTERMEDIATE
-                elif get_pro in expert_level:
-                    pro = EXPERT
-                else:
-                    pro = None
-
-                try:
-                    Speaker.objects.create(
-                        first_name=first_name,
-                        last_name=last_name,
-                        civility=civility,
-                        company=company,
-                        mail=mail,
-                        phone_number=phone_number,
-                        highest_degree=diploma,
-                        main_area_of_expertise=skills1,
-                        second_area_of_expertise=skills2,
-                        third_area_of_expertise=skills3,
-                        teaching_expertise_level=teaching,
-                        professional_expertise_level=pro
-                    )
-                except:
-                    total_error += 1
-                else:
-                    total += 1
-            messages.success(request, f"{total} intervenants ont été ajoutés")
-            messages.success(request, f"Il y a eu {total_error} erreurs")
+            queue_import_job(request, speakers_csv, ImportJob.SPEAKERS)
             return redirect(speakers_list)
 
     return render(request, 'nifleur/speakers.html', {
         'speakers': speakers,
         'form': form,
-        'edit_instance': edit_instance
+        'edit_instance': edit_instance,
+        'import_jobs': recent_import_jobs(request.user, ImportJob.SPEAKERS)
     })
 
 
+@login_required
+def search_speakers(request):
+    speakers = find_speakers_by_skills(request.GET.get('skills', ''))
+    return JsonResponse({'speakers': [{
+        'id': speaker.id,
+        'name': speaker.get_full_name(),
+        'url': speaker.get_absolute_url(),
+        'main_area_of_expertise': speaker.main_area_of_expertise,
+        'second_area_of_expertise': speaker.second_area_of_expertise,
+        'third_area_of_expertise': speaker.third_area_of_expertise,
+        'teaching_expertise_level': speaker.get_teaching_expertise_level_display(),
+        'professional_expertise_level': speaker.get_professional_expertise_level_display()
+    } for speaker in speakers]})
+
+
 @login_required
 def speaker_details(request, speaker_id):
     speaker = get_object_or_404(Speaker, id=speaker_id)
@@ -503,6 +624,7 @@ def speaker_form(request):
 
 
 @login_required
+@versioned_page(Discipline, School, SchoolYear, Speaker, ImportJob)
 def discipline_list(request):
     disciplines = Discipline.objects.all().order_by('school_year')
     form = DisciplineForm(request.POST or None, prefix='simple-discipline-form')
@@ -513,30 +635,7 @@ def discipline_list(request):
         except MultiValueDictKeyError:
             pass
         else:
-            xls = pandas.ExcelFile(disciplines_csv)
-            total = 0
-            for sheet in xls.sheet_names:
-                df = pandas.read_excel(disciplines_csv, sheet_name=sheet)
-                columns = df.columns
-                schools = []
-                disciplines = []
-                for index, row in df.iterrows():
-                    if not str(row[columns[0]]) == 'nan':
-                        schools.append(row[columns[0]])
-                    if not str(row[columns[3]]) == 'nan':
-                        disciplines.append(row[columns[3]])
-
-                for s in schools:
-                    try:
-                        school = School.objects.get(label=s)
-                    except:
-                        messages.error(request, f"L'école {s} n'existe pas")
-                    else:
-                        for discipline in disciplines:
-                            Discipline.objects.create(school=school, label=discipline)
-                            total += 1
-
-            messages.success(request, f"{total} matières ont été ajoutées")
+            queue_import_job(request, disciplines_csv, ImportJob.DISCIPLINES)
             return redirect(discipline_list)
 
     if form.is_valid():
@@ -549,10 +648,68 @@ def discipline_list(request):
 
     return render(request, 'nifleur/disciplines.html', {
         'disciplines': disciplines,
-        'form': form
+        'form': form,
+        'import_jobs': recent_import_jobs(request.user, ImportJob.DISCIPLINES)
     })
 
 
+@login_required
+def discipline_assignment(request):
+    if request.method == 'POST':
+        form = AssignmentForm(request.POST)
+        if not form.is_valid():
+            return render(request, 'nifleur/discipline_assignment.html', {'form': form, 'proposals': None}, status=400)
+        total = apply_assignments(form.cleaned_data['assignment'])
+        messages.success(request, f"{total} matières ont été attribuées")
+        return redirect(discipline_list)
+
+    form = AssignmentFilterForm(request.GET or None)
+    proposals = None
+    if form.is_valid() and (form.cleaned_data['school'] or form.cleaned_data['school_year']):
+        proposals = propose_assignments(
+            school=form.cleaned_data['school'],
+            school_year=form.cleaned_data['school_year'],
+            max_disciplines_per_speaker=form.cleaned_data['max_disciplines_per_speaker'] or 3
+        )
+
+    return render(request, 'nifleur/discipline_assignment.html', {
+        'form': form,
+        'proposals': proposals
+    })
+
+
+@login_required
+def school_year_rollover(request):
+    form = RolloverForm(request.POST or None)
+    if form.is_valid():
+        try:
+            rollover = rollover_school_year(
+                form.cleaned_data['source'],
+                form.cleaned_data['target'],
+                form.cleaned_data['started_at'],
+                form.cleaned_data['ended_at'],
+                form.cleaned_data['target_started_at'],
+                contracts=form.cleaned_data['contracts'],
+                user=request.user
+            )
+        except TransitionError as error:
+            messages.error(request, str(error))
+        else:
+            messages.success(
+                request,
+                f"{rollover.disciplines} matières et {rollover.contracts} demandes de contrat ont été reconduites "
+                f"dans {form.cleaned_data['target']}"
+            )
+            if rollover.overlapping:
+                messages.warning(
+                    request,
+                    f"{rollover.overlapping} demandes de contrat n'ont pas été reconduites, leur intervenant a déjà un "
+                    f"contrat sur la nouvelle période"
+                )
+            return redirect(school_details, form.cleaned_data['target'].school_id)
+    return render(request, 'nifleur/school_year_rollover.html', {'form': form})
+
+
 @login_required
 def school_list(request):
     schools = School.objects.all()
@@ -582,16 +739,10 @@ def school_list(request):
         except MultiValueDictKeyError:
             pass
         else:
-            csv_reader = csv.reader(codecs.iterdecode(school_csv, 'utf-8'), delimiter=';')
-            for row in csv_reader:
-                try:
-                    School.objects.create(label=row[0], full_name=row[1])
-                except IntegrityError as e:
-                    if request.user.is_superuser:
-                        messages.error(request, e)
-                    else:
-                        messages.error(request, f"L'école {row[0]} existe déjà")
-            messages.info(request, f"Des écoles ont été importées")
+            if upload_refused(request, school_csv):
+                return redirect(school_list)
+            report = import_schools(school_csv, dry_run=bool(request.POST.get('dry_run')))
+            import_report_messages(request, report, f"{report.imported} écoles ont été importées sur {report.total}")
             return redirect(school_list)
 
         try:
@@ -599,40 +750,12 @@ def school_list(request):
         except MultiValueDictKeyError:
             pass
         else:
-            csv_reader = csv.reader(codecs.iterdecode(school_year_csv, 'utf-8'), delimiter=';')
-            total_school_year = 0
-            total_school_year_imported = 0
-            for row in csv_reader:
-                try:
-                    school = get_object_or_404(School, label=row[0])
-                    initial = True if row[3] in ('oui', '1') else False
-                    alternating = True if row[4] in ('oui', '1') else False
-
-                    if SchoolYear.objects.filter(year=row[1]).exists():
-                        messages.error(request, f"La promotion {row[1]} existe déjà dans l'école {row[0]}")
-                        continue
-
-                    SchoolYear.objects.create(
-                        school=school,
-                        year=row[1],
-                        label=row[2],
-                        initial=initial,
-                        alternating=alternating
-                    )
-                except IntegrityError as e:
-                    if request.user.is_superuser:
-                        messages.error(request, e)
-                    else:
-                        messages.error(
-                            request,
-                            f"Une erreur est survenue sur l'import de la promotion {row[1]} ({row[0]})"
-                        )
-                else:
-                    total_school_year_imported += 1
-                finally:
-                    total_school_year += 1
-
-            messages.info(request, f"{total_school_year_imported} promotions on été importée sur {total_school_year}")
+            if upload_refused(request, school_year_csv):
+                return redirect(school_list)
+            report = import_school_years(school_year_csv, dry_run=bool(request.POST.get('dry_run')))
+            import_report_messages(
+                request, report, f"{report.imported} promotions ont été importées sur {report.total}"
+            )
             return redirect(school_list)
 
     return render(request, 'nifleur/schools.html', {
@@ -661,6 +784,7 @@ def school_details(request, school_id):
 
 
 @login_required
+@versioned_page(Company, CompanyType)
 def company_list(request):
     companies = Company.objects.all()
     form = CompanyForm(request.POST or None)
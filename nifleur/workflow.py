@@ -0,0 +1,227 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Case, When, Value
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from nifleur.models import ContractRequest, ContractStatusEvent, Status, StatusTransition, TableVersion, CLOSE, \
+    CREATE, RESET, BACK, NEXT, FINISH, CANCEL, TRANSITION_ACTIONS
+
+# Actions available on an existing contract request
+ACTIONS = tuple((action, label) for action, label in TRANSITION_ACTIONS if action != CREATE)
+# Tables of the transition graph, the compiled graph of each process is reloaded when their versions change
+WORKFLOW_TABLES = (Status._meta.db_table, StatusTransition._meta.db_table)
+
+Transition = namedtuple('Transition', ['contract_id', 'from_status_id', 'to_status_id'])
+
+
+class TransitionError(Exception):
+    pass
+
+
+class Workflow:
+    """
+    Compiled graph of the status transitions: every target is found with a dict lookup, without query
+
+    :param list statuses: every :class:`Status`
+    :param list transitions: list of tuple (from status id, action, to status id)
+    """
+    def __init__(self, statuses, transitions):
+        self.statuses = sorted(statuses, key=lambda status: (status.position, status.id))
+        self.status_by_id = {status.id: status for status in self.statuses}
+        self.targets = {action: {} for action, _ in TRANSITION_ACTIONS}
+        for from_status_id, action, to_status_id in transitions:
+            self.targets[action][from_status_id] = to_status_id
+        self.initial_status_id = self.targets[CREATE].get(None)
+        # The contract requests in these statuses are cancelled: they are not counted in the hours, the conflicts...
+        self.cancelled_status_ids = frozenset(self.targets[CANCEL].values())
+
+    @classmethod
+    def load(cls):
+        return cls(
+            list(Status.objects.all()),
+            list(StatusTransition.objects.values_list('from_status_id', 'action', 'to_status_id'))
+        )
+
+    def action_targets(self, action):
+        """
+        Target status of each status for an action, a status without target can not do the action
+
+        :param str action: one of ACTIONS
+        :return: dict status id -> target status id
+        """
+        if action == CREATE or action not in self.targets:
+            raise TransitionError(f"Action inconnue : {action}")
+        return self.targets[action]
+
+    def target(self, status_id, action):
+        """ Target status id of the action from the status, None if the action is not allowed """
+        return self.action_targets(action).get(status_id)
+
+    def available_actions(self, status_id):
+        """ Whether each action can be done from the status, an action keeping the status is refused by transition() """
+        return {
+            action: self.targets[action].get(status_id, status_id) != status_id for action, _ in ACTIONS
+        }
+
+    def timeline(self, status_id):
+        """ Steps of the timeline of a contract request in the given status, ordered by position """
+        current = self.status_by_id.get(status_id)
+        return [
+            {
+                'number': status.position,
+                'title': status.label,
+                'complete': current is not None and (status.position, status.id) < (current.position, current.id),
+                'current': status.id == status_id
+            }
+            for status in self.statuses
+        ]
+
+
+_workflow = None
+_workflow_version = None
+
+
+def workflow_version():
+    """ Versions of the statuses and of the transitions in the database, incremented by each committed change """
+    return dict(TableVersion.objects.filter(name__in=WORKFLOW_TABLES).values_list('name', 'version'))
+
+
+def get_workflow():
+    """
+    Compiled transition graph, kept in memory until a status or a transition changes: the versions of their tables are
+    read from the database so the changes made by the other processes are seen too
+    """
+    global _workflow, _workflow_version
+    version = workflow_version()
+    if _workflow is None or version != _workflow_version:
+        _workflow, _workflow_version = Workflow.load(), version
+    return _workflow
+
+
+@receiver(post_save, sender=Status)
+@receiver(post_delete, sender=Status)
+@receiver(post_save, sender=StatusTransition)
+@receiver(post_delete, sender=StatusTransition)
+def invalidate_workflow(**kwargs):
+    """ Reload the graph in this process before the change is committed, the versions only change at commit """
+    global _workflow
+    _workflow = None
+
+
+def cancelled_status_ids():
+    """ Statuses reached by the cancel action, a contract request in one of them is not active """
+    return get_workflow().cancelled_status_ids
+
+
+def transition_targets(action):
+    """
+    Target status of each status for an action, a status without target can not do the action
+
+    :param str action: one of ACTIONS
+    :return: dict status id -> target status id
+    """
+    return get_workflow().action_targets(action)
+
+
+@transaction.atomic
+def create_position_transitions():
+    """
+    Replace the transitions by the ones given by the positions of the statuses: back and next go to the previous and
+    next positions, finish and cancel to the first and last CLOSE statuses. New contracts keep their initial status,
+    the first status is only used when there is none.
+
+    :return: number of created transitions
+    """
+    statuses = list(Status.objects.order_by('position', 'id'))
+    if not statuses:
+        return 0
+    close_statuses = sorted((status for status in statuses if status.type == CLOSE), key=lambda status: status.id)
+    initial_status_id = StatusTransition.objects.filter(action=CREATE, from_status__isnull=True) \
+        .values_list('to_status_id', flat=True).first()
+
+    transitions = [StatusTransition(action=CREATE, to_status_id=initial_status_id or statuses[0].id)]
+    for index, status in enumerate(statuses):
+        if index > 0:
+            transitions.append(StatusTransition(from_status=status, action=RESET, to_status=statuses[0]))
+            transitions.append(StatusTransition(from_status=status, action=BACK, to_status=statuses[index - 1]))
+        if index < len(statuses) - 1:
+            transitions.append(StatusTransition(from_status=status, action=NEXT, to_status=statuses[index + 1]))
+        for action, target in ((FINISH, close_statuses[:1]), (CANCEL, close_statuses[-1:])):
+            if target and target[0] != status:
+                transitions.append(StatusTransition(from_status=status, action=action, to_status=target[0]))
+
+    StatusTransition.objects.all().delete()
+    StatusTransition.objects.bulk_create(transitions)
+    invalidate_workflow()
+    return len(transitions)
+
+
+def record_transitions(transitions, user=None, created_at=None):
+    """ Append the transitions to the status history of the contract requests """
+    created_at = created_at or timezone.now()
+    ContractStatusEvent.objects.bulk_create([
+        ContractStatusEvent(
+            contract_id=change.contract_id,
+            from_status_id=change.from_status_id,
+            to_status_id=change.to_status_id,
+            user=user,
+            created_at=created_at
+        )
+        for change in transitions
+    ])
+
+
+@transaction.atomic
+def transition(contract, action, user=None):
+    """
+    Apply an allowed action on a contract request, the contract request is locked to avoid concurrent transitions
+
+    :param ContractRequest contract: updated with its new status
+    :param str action: one of ACTIONS
+    :param User user: user recorded in the status history
+    :return: :class:`Transition` applied
+    :raise TransitionError: if the action is not allowed from the status of the contract request
+    """
+    status_id = ContractRequest.objects.select_for_update().values_list('status_id', flat=True).get(id=contract.id)
+    to_status_id = get_workflow().target(status_id, action)
+    if to_status_id is None or to_status_id == status_id:
+        raise TransitionError(f"L'action {action} n'est pas possible depuis ce statut")
+
+    now = timezone.now()
+    ContractRequest.objects.filter(id=contract.id).update(status_id=to_status_id, updated_at=now)
+    applied = Transition(contract.id, status_id, to_status_id)
+    record_transitions([applied], user, now)
+    contract.status_id, contract.updated_at = to_status_id, now
+    return applied
+
+
+@transaction.atomic
+def bulk_transition(contract_ids, action, user=None):
+    """
+    Apply an action on contract requests with a single UPDATE, contracts which can not do the action are skipped.
+    The contracts are locked until the end of the transaction to avoid concurrent transitions.
+
+    :param list contract_ids:
+    :param str action: one of ACTIONS
+    :param User user: user recorded in the status history
+    :return: list of :class:`Transition` applied
+    """
+    targets = transition_targets(action)
+    contracts = ContractRequest.objects.select_for_update().filter(id__in=contract_ids, status_id__in=targets.keys())
+    transitions = [
+        Transition(contract_id, status_id, targets[status_id])
+        for contract_id, status_id in contracts.values_list('id', 'status_id')
+        if targets[status_id] != status_id
+    ]
+    if transitions:
+        now = timezone.now()
+        moved_statuses = {change.from_status_id for change in transitions}
+        ContractRequest.objects.filter(id__in=[change.contract_id for change in transitions]).update(
+            status_id=Case(*[When(status_id=status, then=Value(targets[status])) for status in moved_statuses]),
+            updated_at=now
+        )
+        record_transitions(transitions, user, now)
+    return transitions
@@ -0,0 +1,42 @@
+// Follow the imports processed in background: each job is polled until the worker finishes it
+const IMPORT_JOB_POLL_DELAY = 2000
+
+function importJobSummary(job) {
+    if (job.status === 'failed') {
+        return `Erreur : ${escapeHtml(job.message)}`
+    }
+    if (job.rows === null) {
+        return ''
+    }
+    let summary = job.dry_run
+        ? `${job.valid} lignes valides sur ${job.rows}`
+        : `${job.processed} / ${job.rows} lignes lues, ${job.valid} valides, ${job.imported} données importées`
+    if (job.errors) {
+        summary += `, ${job.errors} erreurs : <a href="${job.report_url}">télécharger le rapport</a>`
+    }
+    if (job.message) {
+        summary += `<br>${escapeHtml(job.message)}`
+    }
+    return summary
+}
+
+function pollImportJob(element, notify) {
+    fetch(element.dataset.url)
+        .then(response => response.json())
+        .then(function (job) {
+            let percent = job.finished ? 100 : (job.rows ? Math.round(100 * job.processed / job.rows) : 0)
+            let bar = element.querySelector('.progress-bar')
+            bar.style.width = `${percent}%`
+            bar.classList.toggle('bg-danger', job.status === 'failed')
+            element.querySelector('.import-job-status').textContent = job.status_label
+            element.querySelector('.import-job-summary').innerHTML = importJobSummary(job)
+
+            if (!job.finished) {
+                setTimeout(() => pollImportJob(element, true), IMPORT_JOB_POLL_DELAY)
+            } else if (notify) {
+                notification(`Import terminé : ${importJobSummary(job)}`, job.status === 'failed' ? 'error' : 'success')
+            }
+        })
+}
+
+document.querySelectorAll('.import-job').forEach(element => pollImportJob(element, false))
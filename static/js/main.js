@@ -26,4 +26,14 @@ function notification(text, type = 'success') {
     <span>${text}</span>
 </div>
     `
+}
+
+/**
+* Escape a text before inserting it in HTML
+* @param text the text to escape
+*/
+function escapeHtml(text) {
+    let element = document.createElement('div')
+    element.textContent = text
+    return element.innerHTML
 }
\ No newline at end of file
@@ -5,18 +5,56 @@ let tickIcon = `
 </svg>
 `
 
-steps.innerHTML = wizards
-    .map(function (wizard) {
-        return (
-            `<div class='step'>` +
-                `<div class='number ${wizard.complete && 'completed'}'>` +
-                    (wizard.complete ? tickIcon : wizard.number) +
-                `</div>` +
-                `<div class='info'>` +
-                    `<p class='title'>${wizard.title}</p>` +
-                    `<p class='text'>${wizard.text ? wizard.text : ''}</p>` +
-                "</div>" +
-            "</div>"
-        )
+function renderTimeline(wizards) {
+    steps.innerHTML = wizards
+        .map(function (wizard) {
+            return (
+                `<div class='step'>` +
+                    `<div class='number ${wizard.complete && 'completed'}'>` +
+                        (wizard.complete ? tickIcon : wizard.number) +
+                    `</div>` +
+                    `<div class='info'>` +
+                        `<p class='title'>${escapeHtml(wizard.title)}</p>` +
+                        `<p class='text'>${wizard.current ? 'Statut actuel' : ''}</p>` +
+                    "</div>" +
+                "</div>"
+            )
+        })
+        .join("")
+}
+
+renderTimeline(wizards)
+
+// Change the status without reloading the page, the links stay usable without javascript
+let statusActions = document.querySelector("#status-actions")
+if (statusActions) {
+    statusActions.querySelectorAll("[data-action]").forEach(function (button) {
+        button.addEventListener("click", function (event) {
+            event.preventDefault()
+            if (button.classList.contains("btn-disabled")) {
+                return
+            }
+
+            let data = new FormData()
+            data.append("action", button.dataset.action)
+            fetch(statusActions.dataset.url, {
+                method: "POST",
+                headers: {"X-CSRFToken": statusActions.querySelector("[name=csrfmiddlewaretoken]").value},
+                body: data
+            })
+                .then(response => response.json())
+                .then(function (result) {
+                    if (result.error) {
+                        notification(escapeHtml(result.error), "error")
+                        return
+                    }
+                    renderTimeline(result.timeline)
+                    statusActions.querySelectorAll("[data-action]").forEach(function (other) {
+                        other.classList.toggle("btn-disabled", !result.available_actions[other.dataset.action])
+                    })
+                    notification(`Le contrat est passé au statut ${escapeHtml(result.status.label)}`)
+                })
+                .catch(() => notification(undefined, "error"))
+        })
     })
-    .join("")
+}